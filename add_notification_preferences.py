@@ -1,39 +1,15 @@
-from app import db
-from models import User
-from sqlalchemy import text
-from db_utils import execute_sql
+#!/usr/bin/env python3
+"""
+Deprecated: users.notification_preferences is now handled by the versioned
+migration registry in schema_migrations.py. This script is kept so existing
+deploy instructions keep working; it simply applies any pending migrations.
+"""
 
-def add_notification_preferences():
-    """Add notification_preferences column to users table"""
-    try:
-        execute_sql('ALTER TABLE users ADD COLUMN IF NOT EXISTS notification_preferences JSON')
-        print("Added notification_preferences column to users table")
-        return True
-    except Exception as e:
-        print(f"Error adding notification_preferences column: {e}")
-        return False
+import sys
+from schema_migrations import main
 
-def set_default_notification_preferences():
-    try:
-        # Set default notification preferences for users who don't have them
-        users = User.query.all()
-        default_preferences = {
-            'enable_email': True,
-            'email_frequency': 'weekly',
-            'notification_types': ['overdue', 'due_soon']
-        }
-        
-        for user in users:
-            if not hasattr(user, 'notification_preferences') or user.notification_preferences is None:
-                user.notification_preferences = default_preferences
-        
-        db.session.commit()
-        print("Successfully added notification preferences to all users.")
-        
-    except Exception as e:
-        print(f"Error adding notification preferences: {str(e)}")
-        db.session.rollback()
+def add_notification_preferences():
+    return main() == 0
 
-if __name__ == '__main__':
-    if add_notification_preferences():
-        set_default_notification_preferences()
+if __name__ == "__main__":
+    sys.exit(0 if add_notification_preferences() else 1)
@@ -0,0 +1,79 @@
+"""
+Conditional and compressed JSON responses for the desktop API.
+
+The Electron client polls list endpoints (``/api/sites``, ``/api/machines``,
+``/api/parts``) that rarely change between polls. Each response carries a
+weak ETag built from the collection's version - the latest ``change_log``
+seq of every entity type the payload is read from - plus the caller's
+scope, so a poll with a matching ``If-None-Match`` is answered with 304
+after one indexed lookup, before the main query runs.
+
+Large JSON bodies are compressed with brotli when the client accepts it
+and the ``brotli`` package is installed, otherwise with gzip. ETags are
+weak, so they stay valid whichever encoding the body was sent in. Streamed
+bodies are gzipped chunk by chunk with ``gzip_stream``.
+"""
+
+import gzip
+import json
+import zlib
+import hashlib
+
+from sqlalchemy import func, select
+
+from models import ChangeLog
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Bodies smaller than this are sent as-is
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = ('application/json',)
+
+
+def collection_versions(session, entities):
+    """Latest change_log seq of each of ``entities`` (0 if none), in one statement."""
+    return tuple(version or 0 for version in session.execute(select(*[
+        select(func.max(ChangeLog.seq)).where(ChangeLog.entity == entity).scalar_subquery()
+        for entity in entities
+    ])).one())
+
+
+def collection_etag(session, entities, scope=()):
+    """Weak ETag value for a payload read from ``entities``, as seen by ``scope``."""
+    raw = json.dumps([collection_versions(session, entities), list(scope)], default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def compress_response(response, accept_encodings, min_size=COMPRESS_MIN_SIZE):
+    """Compress a JSON ``response`` in place with the best encoding the client accepts."""
+    if response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=6, mtime=0))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a stream of str or bytes ``chunks`` incrementally, in bounded memory."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
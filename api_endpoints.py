@@ -2,14 +2,18 @@
 API endpoints for the maintenance tracker application.
 These enable the desktop client to interact with the system via HTTP requests.
 """
-from flask import jsonify, request, Blueprint, abort
+from flask import jsonify, request, Blueprint, abort, make_response, url_for, Response, stream_with_context
 from functools import wraps
 import jwt
 import datetime
 from flask_login import current_user, login_required
+from sqlalchemy import select
 import os
 from app import app, db
-from app import User, Site, Machine, Part, MaintenanceLog
+from models import User, Site, Machine, Part, MaintenanceRecord, hash_value
+from token_auth import TokenUser, user_claims, version_cache
+from api_caching import COMPRESS_MIN_SIZE, collection_etag, compress_response, gzip_stream
+from maintenance_schedule import status_case
 
 # Create blueprint for API routes
 api_bp = Blueprint('api', __name__)
@@ -20,8 +24,21 @@ JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', app.config['SECRET_KEY'])
 # Token expiration time (in minutes)
 TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+# Largest page for ?limit= on list endpoints
+MAX_PAGE_SIZE = 5000
+
+def create_token(user):
+    """Signed API token for ``user``, with the claims token_required reads"""
+    claims = user_claims(user, version_cache.get(db.session, user.id))
+    claims['exp'] = datetime.datetime.utcnow() + datetime.timedelta(minutes=TOKEN_EXPIRE_MINUTES)
+    return jwt.encode(claims, JWT_SECRET_KEY)
+
 def token_required(f):
-    """Decorator for routes that require a valid JWT token"""
+    """Decorator for routes that require a valid JWT token
+    
+    The caller is passed on as a TokenUser built from the token's claims; only
+    the token version is checked against the database (through a TTL cache).
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -37,9 +54,16 @@ def token_required(f):
         try:
             # Decode token
             data = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
-            if not current_user:
-                return jsonify({'error': 'Invalid user'}), 401
+            if 'ver' in data:
+                if version_cache.get(db.session, data['user_id']) != data['ver']:
+                    return jsonify({'error': 'Token has been revoked'}), 401
+                current_user = TokenUser(data)
+            else:
+                # Tokens issued before claims were added carry only the user id
+                user = db.session.get(User, data['user_id'])
+                if not user:
+                    return jsonify({'error': 'Invalid user'}), 401
+                current_user = TokenUser.from_user(user)
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
         except jwt.InvalidTokenError:
@@ -48,6 +72,59 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+def conditional(*entities, daily=False):
+    """Decorator (inside token_required) answering If-None-Match with 304 while ``entities`` are unchanged.
+
+    The ETag covers the change_log version of ``entities``, the URL and the
+    caller's site access; ``daily`` adds the date for payloads with
+    day-granular fields such as ``days_until``.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            scope = [request.full_path, current_user.id, current_user.is_admin, current_user.site_ids]
+            if daily:
+                scope.append(datetime.datetime.utcnow().date())
+            etag = collection_etag(db.session, entities, scope)
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            return response
+        return decorated
+    return decorator
+
+def _keyset_page(query, id_column):
+    """Run ``query`` in ``id_column`` order, paged by ``?after=<id>&limit=<n>`` when given.
+
+    Returns ``(rows, next_after)``; ``next_after`` is the ``after`` value for
+    the next page, or None on the last page (and when no limit was asked for).
+    """
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+    query = query.order_by(id_column)
+    if after is not None:
+        query = query.where(id_column > after)
+    if limit is None:
+        return db.session.execute(query).all(), None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+def _page_response(data, next_after):
+    """JSON list response, with a ``Link: <...>; rel="next"`` header if there are more pages"""
+    response = jsonify(data)
+    if next_after is not None:
+        args = request.args.to_dict()
+        args['after'] = next_after
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
 @api_bp.route('/login', methods=['POST'])
 def login():
     """API endpoint for user authentication"""
@@ -59,16 +136,13 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    # Authenticate user
-    user = User.query.filter_by(username=username).first()
+    # Authenticate user (username is encrypted at rest, look it up by hash)
+    user = User.query.filter_by(username_hash=hash_value(username)).first()
     if not user or not user.check_password(password):
         return jsonify({'error': 'Invalid credentials'}), 401
     
     # Generate JWT token
-    token = jwt.encode({
-        'user_id': user.id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=TOKEN_EXPIRE_MINUTES)
-    }, JWT_SECRET_KEY)
+    token = create_token(user)
     
     # Return token and user info
     return jsonify({
@@ -111,15 +185,14 @@ def get_dashboard(current_user):
 
 @api_bp.route('/sites', methods=['GET'])
 @token_required
+@conditional('sites')
 def get_sites(current_user):
     """API endpoint to get sites list"""
     # Filter sites based on user permissions
     if current_user.is_admin:
         sites = Site.query.all()
-    elif hasattr(current_user, 'sites'):
-        sites = current_user.sites
     else:
-        sites = []
+        sites = Site.query.filter(Site.id.in_(current_user.site_ids)).all()
     
     sites_data = []
     for site in sites:
@@ -140,7 +213,7 @@ def get_site(current_user, site_id):
         abort(404)
     
     # Check if user has access to this site
-    if not current_user.is_admin and site not in current_user.sites:
+    if not current_user.is_admin and site.id not in current_user.site_ids:
         return jsonify({'error': 'Access denied'}), 403
     
     # Get all machines for this site
@@ -165,39 +238,38 @@ def get_site(current_user, site_id):
 
 @api_bp.route('/machines', methods=['GET'])
 @token_required
+@conditional('machines', 'sites')
 def get_machines(current_user):
     """API endpoint to get machines list"""
     site_id = request.args.get('site_id', type=int)
     
+    # One query projecting the machine columns and its site's name
+    query = (select(Machine.id, Machine.name, Machine.model, Machine.site_id, Site.name.label('site_name'),
+                    Machine.machine_number, Machine.serial_number)
+             .outerjoin(Site, Machine.site_id == Site.id))
+    
+    # Restrict to sites the user has access to
+    if not current_user.is_admin:
+        query = query.where(Machine.site_id.in_(current_user.site_ids))
+    
     # Filter machines by site if provided
     if site_id:
-        machines = Machine.query.filter_by(site_id=site_id).all()
-    else:
-        # Filter based on user permissions
-        if current_user.is_admin:
-            machines = Machine.query.all()
-        else:
-            # Get machines from sites user has access to
-            site_ids = [site.id for site in current_user.sites]
-            machines = Machine.query.filter(Machine.site_id.in_(site_ids)).all()
+        query = query.where(Machine.site_id == site_id)
     
+    rows, next_after = _keyset_page(query, Machine.id)
     machines_data = []
-    for machine in machines:
-        # Get site name
-        site = Site.query.get(machine.site_id)
-        site_name = site.name if site else 'Unknown Site'
-        
+    for row in rows:
         machines_data.append({
-            'id': machine.id,
-            'name': machine.name,
-            'model': machine.model,
-            'site_id': machine.site_id,
-            'site_name': site_name,
-            'machine_number': machine.machine_number,
-            'serial_number': machine.serial_number
+            'id': row.id,
+            'name': row.name,
+            'model': row.model,
+            'site_id': row.site_id,
+            'site_name': row.site_name or 'Unknown Site',
+            'machine_number': row.machine_number,
+            'serial_number': row.serial_number
         })
     
-    return jsonify(machines_data)
+    return _page_response(machines_data, next_after)
 
 @api_bp.route('/machines/<int:machine_id>', methods=['GET'])
 @token_required
@@ -206,28 +278,23 @@ def get_machine(current_user, machine_id):
     machine = db.session.get(Machine, machine_id)
     if not machine:
         abort(404)
-    site = Site.query.get(machine.site_id)
+    site = machine.site
     
     # Check if user has access to this machine's site
-    if not current_user.is_admin and site not in current_user.sites:
+    if not current_user.is_admin and machine.site_id not in current_user.site_ids:
         return jsonify({'error': 'Access denied'}), 403
     
-    # Get all parts for this machine
-    parts = Part.query.filter_by(machine_id=machine.id).all()
-    now = datetime.datetime.utcnow()
+    # Get all parts for this machine, with the status /api/parts reports
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    status = status_case(Part.next_maintenance, Site.notification_threshold, now).label('status')
+    rows = db.session.execute(select(Part, status)
+                              .join(Machine, Part.machine_id == Machine.id)
+                              .outerjoin(Site, Machine.site_id == Site.id)
+                              .where(Part.machine_id == machine.id)).all()
     parts_data = []
     
-    for part in parts:
+    for part, status in rows:
         days_until = (part.next_maintenance - now).days
-        
-        # Determine status
-        if days_until < 0:
-            status = 'overdue'
-        elif days_until <= 30:  # Using 30 days as default threshold
-            status = 'due_soon'
-        else:
-            status = 'ok'
-            
         parts_data.append({
             'id': part.id,
             'name': part.name,
@@ -237,8 +304,7 @@ def get_machine(current_user, machine_id):
             'days_until': days_until,
             'status': status,
             'maintenance_frequency': part.maintenance_frequency,
-            'maintenance_unit': part.maintenance_unit,
-            'last_maintained_by': part.last_maintained_by
+            'maintenance_unit': part.maintenance_unit
         })
     
     return jsonify({
@@ -254,64 +320,54 @@ def get_machine(current_user, machine_id):
 
 @api_bp.route('/parts', methods=['GET'])
 @token_required
+@conditional('parts', 'machines', 'sites', daily=True)
 def get_parts(current_user):
     """API endpoint to get parts list"""
     machine_id = request.args.get('machine_id', type=int)
     status_filter = request.args.get('status')
     
-    # Start with base query
-    query = Part.query
+    # Whole seconds, so Python days_until agrees with the SQL status
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    status = status_case(Part.next_maintenance, Site.notification_threshold, now).label('status')
+    
+    # One query projecting the part columns, machine and site names and the status
+    query = (select(Part.id, Part.name, Part.description, Part.machine_id, Machine.name.label('machine_name'),
+                    Machine.site_id, Site.name.label('site_name'), Part.last_maintenance, Part.next_maintenance,
+                    Part.maintenance_frequency, status)
+             .outerjoin(Machine, Part.machine_id == Machine.id)
+             .outerjoin(Site, Machine.site_id == Site.id))
+    
+    # Restrict to machines at sites the user has access to
+    if not current_user.is_admin:
+        query = query.where(Machine.site_id.in_(current_user.site_ids))
     
     # Filter by machine if provided
     if machine_id:
-        query = query.filter_by(machine_id=machine_id)
-    else:
-        # Filter based on user permissions
-        if not current_user.is_admin:
-            # Get machines from sites user has access to
-            site_ids = [site.id for site in current_user.sites]
-            machine_ids = [m.id for m in Machine.query.filter(Machine.site_id.in_(site_ids)).all()]
-            query = query.filter(Part.machine_id.in_(machine_ids))
-    
-    parts = query.all()
-    now = datetime.datetime.utcnow()
-    parts_data = []
+        query = query.where(Part.machine_id == machine_id)
     
-    for part in parts:
-        machine = Machine.query.get(part.machine_id)
-        site = Site.query.get(machine.site_id) if machine else None
-        
-        days_until = (part.next_maintenance - now).days
-        
-        # Determine status
-        if days_until < 0:
-            status = 'overdue'
-        elif site and days_until <= site.notification_threshold:
-            status = 'due_soon'
-        else:
-            status = 'ok'
-        
-        # Apply status filter if provided
-        if status_filter and status != status_filter:
-            continue
-            
+    # Apply status filter if provided
+    if status_filter:
+        query = query.where(status == status_filter)
+    
+    rows, next_after = _keyset_page(query, Part.id)
+    parts_data = []
+    for row in rows:
         parts_data.append({
-            'id': part.id,
-            'name': part.name,
-            'description': part.description,
-            'machine_id': part.machine_id,
-            'machine_name': machine.name if machine else 'Unknown Machine',
-            'site_id': machine.site_id if machine else None,
-            'site_name': site.name if site else 'Unknown Site',
-            'last_maintenance': part.last_maintenance.isoformat(),
-            'next_maintenance': part.next_maintenance.isoformat(),
-            'days_until': days_until,
-            'status': status,
-            'maintenance_frequency': part.maintenance_frequency,
-            'last_maintained_by': part.last_maintained_by if hasattr(part, 'last_maintained_by') else None
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'machine_id': row.machine_id,
+            'machine_name': row.machine_name or 'Unknown Machine',
+            'site_id': row.site_id,
+            'site_name': row.site_name or 'Unknown Site',
+            'last_maintenance': row.last_maintenance.isoformat(),
+            'next_maintenance': row.next_maintenance.isoformat(),
+            'days_until': (row.next_maintenance - now).days,
+            'status': row.status,
+            'maintenance_frequency': row.maintenance_frequency
         })
     
-    return jsonify(parts_data)
+    return _page_response(parts_data, next_after)
 
 @api_bp.route('/maintenance/record', methods=['POST'])
 @token_required
@@ -328,32 +384,30 @@ def record_maintenance(current_user):
     part = db.session.get(Part, part_id)
     if not part:
         abort(404)
-    machine = Machine.query.get(part.machine_id)
+    machine = part.machine
     
     # Check if user has access to this machine's site
-    site = Site.query.get(machine.site_id)
-    if not current_user.is_admin and site not in current_user.sites:
+    if not current_user.is_admin and machine.site_id not in current_user.site_ids:
         return jsonify({'error': 'Access denied'}), 403
     
     # Update part maintenance information
     maintenance_date = datetime.datetime.utcnow()
-    performed_by = current_user.full_name or current_user.username
+    performed_by = current_user.display_name
     
     # Update part
     part.last_maintenance = maintenance_date
-    part.last_maintained_by = performed_by
     part.update_next_maintenance()
-    db.session.commit()
     
-    # Create maintenance log entry
-    log = MaintenanceLog(
+    # Create maintenance record
+    record = MaintenanceRecord(
         machine_id=machine.id,
         part_id=part.id,
+        user_id=current_user.id,
         performed_by=performed_by,
-        maintenance_date=maintenance_date,
+        date=maintenance_date,
         notes=notes
     )
-    db.session.add(log)
+    db.session.add(record)
     db.session.commit()
     
     return jsonify({
@@ -363,6 +417,65 @@ def record_maintenance(current_user):
         'next_maintenance': part.next_maintenance.isoformat()
     })
 
+@api_bp.route('/maintenance/batch', methods=['POST'])
+@token_required
+def record_maintenance_batch(current_user):
+    """API endpoint to record maintenance for many parts in one transaction"""
+    from maintenance_batch import batch_items, record_batch, summarize
+    try:
+        items = batch_items(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    site_ids = None if current_user.is_admin else current_user.site_ids
+    try:
+        results = record_batch(db.session, items, current_user, site_ids=site_ids,
+                               performed_by=current_user.display_name)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error recording maintenance batch: {e}")
+        return jsonify({'error': 'Could not record maintenance'}), 500
+
+    created, duplicate, failed = summarize(results)
+    return jsonify({
+        'success': failed == 0,
+        'created': created,
+        'duplicate': duplicate,
+        'failed': failed,
+        'results': results
+    })
+
+@api_bp.route('/snapshot', methods=['GET'])
+@token_required
+def get_snapshot(current_user):
+    """API endpoint streaming everything the desktop app stores, as NDJSON, for its first load
+    
+    Pass the last ``cursor`` line received as ``?cursor=`` to resume an
+    interrupted snapshot; ``history_days`` (default 365) bounds the history.
+    """
+    from snapshot import HISTORY_DAYS, open_snapshot, stream_snapshot
+    from data_export import EXPORT_BATCH_SIZE
+    try:
+        state = open_snapshot(db.session, request.args.get('cursor'),
+                              request.args.get('history_days', HISTORY_DAYS, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    site_ids = None if current_user.is_admin else current_user.site_ids
+    chunks = stream_snapshot(state, site_ids, app.config.get('SNAPSHOT_BATCH_SIZE', EXPORT_BATCH_SIZE))
+    headers = {'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson', headers=headers)
+
+@api_bp.after_request
+def compress(response):
+    """Compress large JSON responses for clients that accept gzip or brotli"""
+    return compress_response(response, request.accept_encodings,
+                             app.config.get('API_COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE))
+
 # Add a health check endpoint
 @api_bp.route('/health', methods=['GET'])
 def health_check():
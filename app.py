@@ -15,22 +15,35 @@ from io import BytesIO
 if any('pytest' in arg for arg in sys.argv):
     os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
 
+# --- Startup timeline: named phases with wall time and query counts ---
+from startup_profile import StartupTimeline, profiling_requested
+startup_timeline = StartupTimeline(profile=profiling_requested())
+
 # Third-party imports
+import click
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, abort, current_app, send_file
 from flask_login import LoginManager, login_required, login_user, logout_user, current_user
 from flask_mail import Mail, Message
-from sqlalchemy import or_, text
+from sqlalchemy import or_, text, func, select
 from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import secrets
 from sqlalchemy import inspect
 import smtplib
 from jinja2 import Environment, FileSystemLoader
+startup_timeline.mark('third_party_imports')
 
 # Local imports
 from models import db, User, Role, Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion, encrypt_value, hash_value
-from auto_migrate import run_auto_migration
+from db_health import DatabaseHealthMonitor
+from query_instrumentation import QueryInstrumentation
+from maintenance_stats import install_stats_hook
+from change_log import install_change_log_hook, record_changes
+from token_auth import install_token_version_hook
+from schema_migrations import SCHEMA_VERSION, schema_is_current, run_migrations, rebuild_derived_data
+startup_timeline.mark('local_imports')
 
 # Patch is_admin property to User class immediately after import
 @property
@@ -234,10 +247,26 @@ except Exception as e:
     # Set a fallback configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = POSTGRESQL_DATABASE_URI
 
+startup_timeline.mark('config')
+
 # Initialize database
 print("[APP] Initializing SQLAlchemy...")
 db.init_app(app)
 
+# Background connection-health monitor and circuit breaker (replaces per-request SELECT 1)
+db_health = DatabaseHealthMonitor(app, db)
+
+# Per-request query counts, DB time and slow-query log (X-DB-Queries / Server-Timing headers outside production)
+query_instrumentation = QueryInstrumentation(app, db)
+
+# Per-site/machine/part maintenance summaries, updated as records are inserted
+install_stats_hook(db.session)
+# Append-only change_log (tombstones and a seq cursor for sync clients and caches)
+install_change_log_hook(db.session)
+# Revoke API tokens whose claims (name, role, sites, password) went stale
+install_token_version_hook(db.session)
+startup_timeline.mark('db_init')
+
 # Initialize Flask-Login
 print("[APP] Initializing Flask-Login...")
 login_manager = LoginManager()
@@ -292,166 +321,27 @@ def user_can_see_all_sites(user):
 
 # Database connection checker
 def check_db_connection():
-    """Check if database connection is working and reconnect if needed."""
-    try:
-        with db.engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        return True
-    except Exception as e:
-        app.logger.error(f"Database connection error: {e}")
-        return False
-
-# Whitelist allowed table and column names for schema changes
-ALLOWED_TABLES = {'users', 'roles', 'sites', 'machines', 'parts', 'maintenance_records', 'audit_tasks', 'audit_task_completions'}
-ALLOWED_COLUMNS = {
-    'users': {'last_login', 'reset_token', 'reset_token_expiration', 'created_at', 'updated_at'},
-    'roles': {'created_at', 'updated_at'},
-    'sites': {'created_at', 'updated_at'},
-    'machines': {'created_at', 'updated_at'},
-    'parts': {'created_at', 'updated_at'},
-    'maintenance_records': {'created_at', 'updated_at', 'client_id', 'machine_id', 'maintenance_type', 'description', 'performed_by', 'status', 'notes'},
-    'audit_tasks': {'created_at', 'updated_at', 'interval', 'custom_interval_days'},
-    'audit_task_completions': {'created_at', 'updated_at'}
-}
+    """Check if database connection is working and update the circuit breaker."""
+    return db_health.check_now()
 
 # Function to ensure database schema matches models
 def ensure_db_schema():
-    """Ensure database schema matches the models by adding missing columns and fixing column types."""
+    """Bring the database schema up to date via the versioned migration registry.
+
+    Kept for existing callers; a current database costs a single query.
+    """
     try:
-        print("[APP] Checking database schema...")
-        inspector = inspect(db.engine)
-        table_schemas = {
-            'users': {
-                'last_login': 'TIMESTAMP',
-                'reset_token': 'VARCHAR(100)',
-                'reset_token_expiration': 'TIMESTAMP',
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            },
-            'roles': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            },
-            'sites': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            },
-            'machines': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            },
-            'parts': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            },
-            'maintenance_records': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP',
-                'client_id': 'VARCHAR(36)',
-                'machine_id': 'INTEGER',
-                'maintenance_type': 'VARCHAR(50)',
-                'description': 'TEXT',
-                'performed_by': 'VARCHAR(100)',
-                'status': 'VARCHAR(50)',
-                'notes': 'TEXT'
-            },
-            'audit_tasks': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP',
-                'interval': 'VARCHAR(50)',
-                'custom_interval_days': 'INTEGER'
-            },
-            'audit_task_completions': {
-                'created_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP'
-            }
-        }
-        with db.engine.connect() as conn:
-            for table, columns in table_schemas.items():
-                if table not in ALLOWED_TABLES:
-                    continue
-                if inspector.has_table(table):
-                    print(f"[APP] Checking {table} table schema...")
-                    existing_columns = {column['name']: column for column in inspector.get_columns(table)}
-                    for column_name, column_type in columns.items():
-                        if column_name not in ALLOWED_COLUMNS.get(table, set()):
-                            continue
-                        if column_name not in existing_columns:
-                            print(f"[APP] Adding missing column {column_name} to {table} table")
-                            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column_name} {column_type}"))
-                            conn.commit()
-                        else:
-                            # Check and fix type for client_id in maintenance_records
-                            if table == 'maintenance_records' and column_name == 'client_id':
-                                db_type = existing_columns[column_name]['type']
-                                # Only fix if not already VARCHAR/CHAR/TEXT
-                                if not (hasattr(db_type, 'length') and db_type.length == 36) and 'char' not in str(db_type).lower() and 'text' not in str(db_type).lower():
-                                    print("[APP] Altering client_id column type to VARCHAR(36) in maintenance_records table")
-                                    try:
-                                        conn.execute(text("ALTER TABLE maintenance_records ALTER COLUMN client_id TYPE VARCHAR(36) USING client_id::text"))
-                                        conn.commit()
-                                    except Exception as e:
-                                        print(f"[APP] Could not alter client_id column type: {e}")
-                    if 'created_at' in columns and 'created_at' not in existing_columns:
-                        conn.execute(text(f"UPDATE {table} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
-                        conn.commit()
-                    
-                    if 'updated_at' in columns and 'updated_at' not in existing_columns:
-                        conn.execute(text(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
-                        conn.commit()
-                else:
-                    print(f"[APP] Table {table} does not exist - will be created by db.create_all()")
-        
-        print("[APP] Database schema check completed")
+        applied = run_migrations(db.engine)
+        if applied:
+            print(f"[APP] Applied schema migrations: {applied}")
+            rebuild_derived_data(db.engine, applied)
     except Exception as e:
-        print(f"[APP] Error checking database schema: {e}")
+        print(f"[APP] Error migrating database schema: {e}")
 
 # Ensure maintenance_records table has necessary columns
 def ensure_maintenance_records_schema():
-    """Ensure maintenance_records table has necessary columns."""
-    try:
-        inspector = inspect(db.engine)
-        if inspector.has_table('maintenance_records'):
-            columns = [column['name'] for column in inspector.get_columns('maintenance_records')]
-            
-            # Add client_id column if missing
-            if 'client_id' not in columns:
-                with db.engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE maintenance_records ADD COLUMN IF NOT EXISTS client_id VARCHAR(36)"))
-                    conn.commit()
-                print("[APP] Added client_id column to maintenance_records table")
-            
-            # Add machine_id column if missing (to fix delete machine error)
-            if 'machine_id' not in columns:
-                print("[APP] Adding missing machine_id column to maintenance_records table")
-                with db.engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE maintenance_records ADD COLUMN IF NOT EXISTS machine_id INTEGER"))
-                    conn.commit()
-                
-                # Populate machine_id from associated part's machine_id
-                maintenance_records = MaintenanceRecord.query.all()
-                for record in maintenance_records:
-                    if record.part:
-                        record.machine_id = record.part.machine_id
-                
-                db.session.commit()
-                print("[APP] Populated machine_id values in maintenance_records table")
-                
-                # Try to add foreign key constraint but don't fail if it doesn't work
-                try:
-                    with db.engine.connect() as conn:
-                        conn.execute(text("""
-                            ALTER TABLE maintenance_records 
-                            ADD CONSTRAINT fk_maintenance_records_machine_id 
-                            FOREIGN KEY (machine_id) REFERENCES machines (id)
-                        """))
-                        conn.commit()
-                    print("[APP] Added foreign key constraint to machine_id column")
-                except Exception as e:
-                    print(f"[APP] Note: Could not add foreign key constraint: {str(e)}")
-                    print("[APP] This is not critical, the column is still usable.")
-    except Exception as e:
-        print(f"[APP] Error ensuring maintenance_records schema: {e}")
+    """Ensure maintenance_records table has necessary columns (see schema_migrations)."""
+    ensure_db_schema()
 
 def initialize_db_connection():
     """Initialize database connection."""
@@ -612,31 +502,15 @@ def assign_colors_to_audit_tasks():
         import traceback
         print(traceback.format_exc())
 
-# --- Move all startup DB logic inside a single app context ---
-with app.app_context():
-    try:
-        run_auto_migration()  # Ensure columns exist before any queries
-    except Exception as e:
-        print(f'[AUTO_MIGRATE ERROR] {e}')
-    try:
-        # --- Ensure audit_tasks.color column exists ---
-        from sqlalchemy import text
-        engine = db.engine
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name='audit_tasks' AND column_name='color'
-            """))
-            if not result.fetchone():
-                print("[APP] Adding 'color' column to 'audit_tasks' table...")
-                conn.execute(text("ALTER TABLE audit_tasks ADD COLUMN color VARCHAR(32)"))
-                print("[APP] Column 'color' added to 'audit_tasks'.")
-            else:
-                print("[APP] 'color' column already exists in 'audit_tasks'.")
-        # ...existing code...
-        import expand_user_fields
-    except Exception as e:
-        print(f"[STARTUP] User field length expansion migration failed: {e}")
+# --- One-shot startup DB logic (run via `flask db-prepare`) ---
+def prepare_database():
+    """Run all schema migrations and data fixups, then record the schema version.
+
+    Must be called inside an application context. Normal imports skip this
+    entirely once the schema_version marker is current.
+    """
+    # Schema changes (tables, columns, type fixes, SQL backfills)
+    ensure_db_schema()
     
     # Fix admin role first to ensure it exists with proper permissions
     try:
@@ -727,22 +601,67 @@ with app.app_context():
     except Exception as e:
         print(f"[STARTUP] Healthcheck error: {e}")
     initialize_db_connection()
-    ensure_db_schema()
-    ensure_maintenance_records_schema()
     assign_colors_to_audit_tasks()  # Add colors to any audit tasks that don't have them yet
-    db.create_all()
+    try:
+        # Fix audit completions with missing machine IDs (previously done on every import)
+        from fix_audit_history_v2 import fix_audit_task_machine_ids
+        fix_audit_task_machine_ids(db.session)
+    except Exception as e:
+        print(f"[APP] Error fixing audit machine IDs: {e}")
+
+@app.cli.command('db-prepare')
+def db_prepare_command():
+    """Run one-shot migrations and data fixups and record the schema version."""
+    prepare_database()
+    print(f"[APP] Database prepared (schema version {SCHEMA_VERSION})")
+
+@app.cli.command('recompute-next-maintenance')
+@click.option('--batch-size', default=5000, show_default=True, help='Parts per UPDATE batch')
+def recompute_next_maintenance_command(batch_size):
+    """Recompute next_maintenance for every part from its last service, frequency and unit."""
+    from maintenance_schedule import recompute_all
+    updated = recompute_all(db.session, batch_size=batch_size)
+    print(f"[APP] Recomputed next maintenance for {updated} parts")
+
+@app.cli.command('rebuild-maintenance-stats')
+def rebuild_maintenance_stats_command():
+    """Recompute the site/machine/part maintenance summaries from the full history."""
+    from maintenance_stats import rebuild_stats
+    rows = rebuild_stats(db.session.connection())
+    db.session.commit()
+    print(f"[APP] Rebuilt {rows} maintenance summaries")
+
+# Startup fast path: a single query on the schema marker. Only fall back to the
+# full preparation when the database has never been prepared (e.g. first run of
+# the desktop app) and AUTO_DB_PREPARE has not been disabled.
+with app.app_context():
+    if schema_is_current(db.engine):
+        print(f"[APP] Database schema is current (version {SCHEMA_VERSION}), skipping startup migrations")
+    elif os.environ.get('AUTO_DB_PREPARE', 'true').lower() == 'true':
+        print("[APP] Database schema marker missing or outdated, running prepare_database()...")
+        prepare_database()
+    else:
+        print("[APP] WARNING: Database schema is not current. Run `flask db-prepare` before serving traffic.")
+startup_timeline.mark('schema_check')
 
-# Add database connection check before requests
+# Fail fast when the database is known to be down (no per-request round trip)
 @app.before_request
 def ensure_db_connection():
-    """Ensure database connection is working before each request."""
+    """Reject requests early while the database circuit breaker is open."""
     # Skip for static files and health checks
     if request.path.startswith('/static/') or request.path == '/health-check':
         return
-        
-    # Check DB connection for routes that need it
-    if request.endpoint not in ['static', 'health_check'] and not check_db_connection():
-        return jsonify({'error': 'Database connection failure'}), 500
+    
+    # Start this worker's background monitor on its first request
+    db_health.ensure_started()
+    
+    if request.endpoint not in ['static', 'health_check'] and not db_health.allow_request():
+        status = db_health.status()
+        response = jsonify({'error': 'Database connection failure', 'database': status})
+        response.status_code = 503
+        if status['retry_after'] is not None:
+            response.headers['Retry-After'] = str(status['retry_after'])
+        return response
 
 # Helper: Always allow admins to access any page
 @app.before_request
@@ -764,23 +683,19 @@ def inject_site_helpers():
     def get_site_parts_status(site):
         """Get status of parts for a site's machines."""
         try:
-            # Get all machines at this site
-            machines = Machine.query.filter_by(site_id=site.id).all()
+            # All parts for the site's machines in one query
+            parts = Part.query.join(Machine).filter(Machine.site_id == site.id).all()
             
             # Count parts
-            total_parts = 0
+            total_parts = len(parts)
             low_stock = 0
             out_of_stock = 0
             
-            for machine in machines:
-                parts = Part.query.filter_by(machine_id=machine.id).all()
-                total_parts += len(parts)
-                
-                for part in parts:
-                    if part.quantity == 0:
-                        out_of_stock += 1
-                    elif part.quantity < 5:  # Assume 5 is the low stock threshold
-                        low_stock += 1
+            for part in parts:
+                if part.quantity == 0:
+                    out_of_stock += 1
+                elif part.quantity < 5:  # Assume 5 is the low stock threshold
+                    low_stock += 1
             
             return {
                 'total': total_parts,
@@ -927,18 +842,9 @@ def dashboard():
                 .all()
             )
         
-        # Get all machines across accessible sites
-        machines = []
-        site_ids = [site.id for site in sites]
-        if site_ids:
-            machines = Machine.query.filter(Machine.site_id.in_(site_ids)).all()
-        
-        # Get all parts that need maintenance soon or are overdue
-        parts = []
-        machine_ids = [machine.id for machine in machines]
-        if machine_ids:
-            # Get all parts for these machines
-            parts = Part.query.filter(Part.machine_id.in_(machine_ids)).all()
+        # Machines and parts are already eager loaded with the sites
+        machines = [machine for site in sites for machine in site.machines]
+        parts = [part for machine in machines for part in machine.parts]
         
         # Get statistics
         stats = {
@@ -1056,7 +962,7 @@ def admin_excel_import():
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('dashboard'))
     # You can render a template or just show a simple message for now
-    return render_template('admin/excel_import.html') if os.path.exists(os.path.join('templates', 'admin', 'excel_import.html')) else "<h1>Excel Import Page</h1>"
+    return render_template('admin/excel_import.html', job_id=request.args.get('job')) if os.path.exists(os.path.join('templates', 'admin', 'excel_import.html')) else "<h1>Excel Import Page</h1>"
 
 @app.route('/test-email', methods=['GET', 'POST'])
 @login_required
@@ -1104,32 +1010,39 @@ def audits_page():
                 can_delete_audits = 'audits.delete' in permissions
                 can_complete_audits = 'audits.complete' in permissions
 
-    # Restrict sites for non-admins
+    # Restrict sites for non-admins. Machines are joined in so the template's
+    # site.machines / task.machines loops do not query per site or task.
+    task_query = AuditTask.query.options(joinedload(AuditTask.machines))
+    site_query = Site.query.options(joinedload(Site.machines))
     if current_user.is_admin:
-        audit_tasks = AuditTask.query.all()
-        sites = Site.query.all()
+        audit_tasks = task_query.all()
+        sites = site_query.all()
     else:
         user_site_ids = [site.id for site in current_user.sites]
-        audit_tasks = AuditTask.query.filter(AuditTask.site_id.in_(user_site_ids)).all()
-        sites = current_user.sites
+        audit_tasks = task_query.filter(AuditTask.site_id.in_(user_site_ids)).all()
+        sites = site_query.filter(Site.id.in_(user_site_ids)).all()
 
     today = date.today()
-    completions = {(c.audit_task_id, c.machine_id): c for c in AuditTaskCompletion.query.filter_by(date=today).all()}
+    # Last completed date per (task, machine) in one grouped query
+    last_completed = {}
+    task_ids = [task.id for task in audit_tasks]
+    if task_ids:
+        rows = (
+            db.session.query(AuditTaskCompletion.audit_task_id, AuditTaskCompletion.machine_id,
+                             func.max(AuditTaskCompletion.date))
+            .filter(AuditTaskCompletion.audit_task_id.in_(task_ids), AuditTaskCompletion.completed == True)
+            .group_by(AuditTaskCompletion.audit_task_id, AuditTaskCompletion.machine_id)
+            .all()
+        )
+        last_completed = {(task_id, machine_id): last_date for task_id, machine_id, last_date in rows}
+    # Pairs already completed today
+    completed_today = {key for key, last_date in last_completed.items() if last_date == today}
     
     # Build a dict: (task_id, machine_id) -> next_eligible_date
     eligibility = {}
     for task in audit_tasks:
         for machine in task.machines:
-            last_completion = (
-                AuditTaskCompletion.query
-                .filter_by(audit_task_id=task.id, machine_id=machine.id, completed=True)
-                .order_by(AuditTaskCompletion.date.desc())
-                .first()
-            )
-            if last_completion:
-                last_date = last_completion.date
-            else:
-                last_date = None
+            last_date = last_completed.get((task.id, machine.id))
             # Determine interval in days
             if task.interval == 'daily':
                 interval_days = 1
@@ -1180,10 +1093,9 @@ def audits_page():
                 custom_interval_days=custom_interval_days,
                 color=color
             )
-            for machine_id in machine_ids:
-                machine = Machine.query.get(int(machine_id))
-                if machine:
-                    audit_task.machines.append(machine)
+            audit_task.machines.extend(
+                Machine.query.filter(Machine.id.in_([int(machine_id) for machine_id in machine_ids])).all()
+            )
             db.session.add(audit_task)
             db.session.commit()
             flash('Audit task created successfully.', 'success')
@@ -1200,7 +1112,7 @@ def audits_page():
                 key = f'complete_{task.id}_{machine.id}'
                 if key in request.form:
                     # Check if already completed today
-                    if completions.get((task.id, machine.id)) and completions.get((task.id, machine.id)).completed:
+                    if (task.id, machine.id) in completed_today:
                         continue
                     # Strictly enforce interval: only allow if no previous completion or today >= next eligible date
                     next_eligible = eligibility.get((task.id, machine.id))
@@ -1224,7 +1136,7 @@ def audits_page():
             flash('No eligible audit tasks were checked off. Some checkoffs are not yet eligible.', 'warning')
         return redirect(url_for('audits_page'))
     
-    return render_template('audits.html', audit_tasks=audit_tasks, sites=sites, completions=completions, today=today, can_delete_audits=can_delete_audits, can_complete_audits=can_complete_audits, eligibility=eligibility)
+    return render_template('audits.html', audit_tasks=audit_tasks, sites=sites, completed_today=completed_today, today=today, can_delete_audits=can_delete_audits, can_complete_audits=can_complete_audits, eligibility=eligibility)
 
 @app.route('/audit-history', methods=['GET'])
 @login_required
@@ -1908,6 +1820,17 @@ def delete_site(site_id):
         flash('An error occurred while deleting the site.', 'danger')
         return redirect(url_for('manage_sites'))
 
+def _history_view_context(entity_type, entity_id, filters):
+    """Summary stats plus one page of maintenance history for a history view."""
+    from maintenance_history import history_page, page_users
+    from maintenance_stats import get_stats
+    try:
+        records, next_cursor = history_page(None, filters, cursor=request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    return {'maintenance_records': records, 'next_cursor': next_cursor, 'users': page_users(records),
+            'stats': get_stats(db.session, entity_type, entity_id), 'now': datetime.now()}
+
 @app.route('/part/<int:part_id>/history')
 @login_required
 def part_history_route(part_id):
@@ -1916,20 +1839,10 @@ def part_history_route(part_id):
         abort(404)
     machine = part.machine
     site = part.machine.site if part.machine else None
-    maintenance_records = MaintenanceRecord.query.filter_by(part_id=part_id).order_by(MaintenanceRecord.date.desc()).all()
-    return render_template('part_history.html', part=part, machine=machine, site=site, maintenance_records=maintenance_records, now=datetime.now())
+    return render_template('part_history.html', part=part, machine=machine, site=site,
+                           **_history_view_context('part', part_id, {'part_id': part_id}))
 
 # --- MAINTENANCE DATE UPDATE AND HISTORY FIXES ---
-@login_required
-def part_history(part_id):
-    part = db.session.get(Part, part_id)
-    if not part:
-        abort(404)
-    machine = part.machine
-    site = part.machine.site if part.machine else None
-    maintenance_records = MaintenanceRecord.query.filter_by(part_id=part_id).order_by(MaintenanceRecord.date.desc()).all()
-    return render_template('part_history.html', part=part, machine=machine, site=site, maintenance_records=maintenance_records, now=datetime.now())
-
 @app.route('/machine/<int:machine_id>/history')
 @login_required
 def machine_history_view(machine_id):
@@ -1938,9 +1851,8 @@ def machine_history_view(machine_id):
         abort(404)
     site = machine.site
     parts = Part.query.filter_by(machine_id=machine_id).all()
-    # Gather all maintenance records for all parts in this machine
-    maintenance_records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_([p.id for p in parts])).order_by(MaintenanceRecord.date.desc()).all()
-    return render_template('machine_history.html', machine=machine, site=site, parts=parts, maintenance_records=maintenance_records, now=datetime.now())
+    return render_template('machine_history.html', machine=machine, site=site, parts=parts,
+                           **_history_view_context('machine', machine_id, {'machine_id': machine_id}))
 
 @app.route('/site/<int:site_id>/history')
 @login_required
@@ -1948,13 +1860,11 @@ def site_history(site_id):
     site = db.session.get(Site, site_id)
     if not site:
         abort(404)
-    machines = Machine.query.filter_by(site_id=site_id).all()
-    parts = []
-    for machine in machines:
-        parts.extend(Part.query.filter_by(machine_id=machine.id).all())
-    # Gather all maintenance records for all parts in this site
-    maintenance_records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_([p.id for p in parts])).order_by(MaintenanceRecord.date.desc()).all()
-    return render_template('site_history.html', site=site, machines=machines, parts=parts, maintenance_records=maintenance_records, now=datetime.now())
+    machine_count, part_count = db.session.query(
+        func.count(func.distinct(Machine.id)), func.count(Part.id)
+    ).select_from(Machine).outerjoin(Part, Part.machine_id == Machine.id).filter(Machine.site_id == site_id).one()
+    return render_template('site_history.html', site=site, machine_count=machine_count, part_count=part_count,
+                           **_history_view_context('site', site_id, {'site_id': site_id}))
 # --- END MAINTENANCE HISTORY FIXES ---
 
 @app.route('/role/delete/<int:role_id>', methods=['POST'])
@@ -2028,19 +1938,13 @@ def delete_user(user_id):
 @login_required
 def maintenance_page():
     try:
-        # Restrict sites for non-admins
-        if current_user.is_admin:
+        # Restrict sites for users who cannot see every site
+        all_sites = user_can_see_all_sites(current_user)
+        if all_sites:
             sites = Site.query.all()
         else:
             sites = current_user.sites
 
-        # Get all machines, parts, and sites for the form
-        machines = Machine.query.filter(Machine.site_id.in_([site.id for site in sites])).all()
-        parts = Part.query.filter(Part.machine_id.in_([machine.id for machine in machines])).all()
-        
-        # Get all maintenance records with related data
-        maintenance_records = MaintenanceRecord.query.filter(MaintenanceRecord.machine_id.in_([machine.id for machine in machines])).order_by(MaintenanceRecord.date.desc()).all()
-        
         # Handle form submission for adding new maintenance records
         if request.method == 'POST':
             machine_id = request.form.get('machine_id')
@@ -2068,6 +1972,10 @@ def maintenance_page():
             if not machine_id or not part_id or not user_id or not maintenance_type or not description or not date_str:
                 flash('Machine, part, user, maintenance type, description, and date are required!', 'danger')
                 return redirect(url_for('maintenance_page'))
+            elif client_id and MaintenanceRecord.query.filter_by(client_id=client_id).first():
+                # Resubmitted form; client_id is unique, the record is already stored
+                flash('This maintenance record was already added.', 'info')
+                return redirect(url_for('maintenance_page'))
             else:
                 try:
                     maintenance_date = datetime.strptime(date_str, '%Y-%m-%d')
@@ -2088,26 +1996,32 @@ def maintenance_page():
                     part = Part.query.get(part_id)
                     if part:
                         part.last_maintenance = maintenance_date
-                        freq = part.maintenance_frequency or 1
-                        unit = part.maintenance_unit or 'day'
-                        if unit == 'week':
-                            delta = timedelta(weeks=freq)
-                        elif unit == 'month':
-                            delta = timedelta(days=freq * 30)
-                        elif unit == 'year':
-                            delta = timedelta(days=freq * 365)
-                        else:
-                            delta = timedelta(days=freq)
-                        part.next_maintenance = maintenance_date + delta
+                        part.update_next_maintenance()
                         db.session.add(part)
                     db.session.commit()
                     flash('Maintenance record added successfully!', 'success')
                     return redirect(url_for('maintenance_page'))
                 except ValueError:
                     flash('Invalid date format! Use YYYY-MM-DD.', 'danger')
-        
-        return render_template('maintenance.html', 
+
+        # Get all machines, parts, and sites for the form
+        machines = Machine.query.filter(Machine.site_id.in_([site.id for site in sites])).all()
+        parts = Part.query.filter(Part.machine_id.in_([machine.id for machine in machines])).all()
+
+        # Only the first page of history; the rest is fetched from /api/maintenance/history
+        from maintenance_history import parse_filters, history_page
+        try:
+            filters = parse_filters(request.args)
+        except ValueError:
+            flash('Invalid maintenance history filter.', 'warning')
+            filters = {}
+        site_ids = None if all_sites else [site.id for site in sites]
+        maintenance_records, next_cursor = history_page(site_ids, filters)
+
+        return render_template('maintenance.html',
                               maintenance_records=maintenance_records,
+                              next_cursor=next_cursor,
+                              history_filters=request.args,
                               machines=machines,
                               parts=parts,
                               sites=sites)
@@ -2132,17 +2046,7 @@ def update_maintenance_alt():
         # Update the last maintenance date
         part.last_maintenance = now
         # Calculate next maintenance date based on frequency and unit
-        freq = part.maintenance_frequency or 1
-        unit = part.maintenance_unit or 'day'
-        if unit == 'week':
-            delta = timedelta(weeks=freq)
-        elif unit == 'month':
-            delta = timedelta(days=freq * 30)
-        elif unit == 'year':
-            delta = timedelta(days=freq * 365)
-        else:
-            delta = timedelta(days=freq)
-        part.next_maintenance = now + delta
+        part.update_next_maintenance()
         # Create a maintenance record
         maintenance_record = MaintenanceRecord(
             part_id=part.id,
@@ -2174,19 +2078,7 @@ def update_maintenance(part_id):
         part.last_maintenance = now
         
         # Calculate next_maintenance based on part.maintenance_frequency and part.maintenance_unit
-        freq = part.maintenance_frequency or 1
-        unit = part.maintenance_unit or 'day'
-        if unit == 'week':
-            delta = timedelta(weeks=freq)
-        elif unit == 'month':
-            delta = timedelta(days=freq * 30)
-        elif unit == 'year':
-            delta = timedelta(days=freq * 365)
-        else:
-            delta = timedelta(days=freq)
-            
-        # Set the next maintenance date
-        part.next_maintenance = now + delta
+        part.update_next_maintenance()
         
         # Create a maintenance record
         maintenance_record = MaintenanceRecord(
@@ -2210,6 +2102,48 @@ def update_maintenance(part_id):
         flash(f'Error updating maintenance: {str(e)}', 'error')
         return redirect(url_for('manage_parts'))
 
+@app.route('/maintenance/batch', methods=['POST'])
+@login_required
+def record_maintenance_batch():
+    """Record maintenance for several parts in one transaction.
+
+    Takes a JSON body (``{"items": [...]}``, see maintenance_batch) and
+    returns per-item results, or the machine history form's ``part_ids``
+    with a shared date, description and notes.
+    """
+    from maintenance_batch import batch_items, record_batch, summarize
+    if request.is_json:
+        try:
+            items = batch_items(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        shared = {name: request.form.get(name) for name in ('date', 'description', 'notes', 'maintenance_type')}
+        items = [dict(shared, part_id=part_id) for part_id in request.form.getlist('part_ids')]
+        if not items:
+            flash('Select at least one part to record.', 'warning')
+            return redirect(request.referrer or url_for('maintenance_page'))
+    site_ids = None if user_can_see_all_sites(current_user) else [site.id for site in current_user.sites]
+    try:
+        results = record_batch(db.session, items, current_user, site_ids=site_ids, default_date=datetime.now())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error recording maintenance batch: {e}")
+        if request.is_json:
+            return jsonify({'error': 'Could not record maintenance'}), 500
+        flash(f'Error recording maintenance: {str(e)}', 'error')
+        return redirect(request.referrer or url_for('maintenance_page'))
+    created, duplicate, failed = summarize(results)
+    if request.is_json:
+        return jsonify({'success': failed == 0, 'created': created, 'duplicate': duplicate, 'failed': failed,
+                        'results': results})
+    if created:
+        flash(f'Maintenance recorded for {created} part{"s" if created != 1 else ""}.', 'success')
+    if failed:
+        flash(f'{failed} part{"s" if failed != 1 else ""} could not be recorded.', 'warning')
+    return redirect(request.referrer or url_for('maintenance_page'))
+
 @app.route('/machine-history/<int:machine_id>')
 @login_required
 def machine_history(machine_id):
@@ -2567,46 +2501,84 @@ def sync_status():
 @app.route('/api/sync/data', methods=['POST'])
 @login_required
 def sync_data():
-    """Handle data synchronization requests from desktop clients."""
+    """Delta synchronization for desktop clients (see delta_sync).
+
+    ``{"type": "pull", "last_sync": <cursor>, "entity_type": ..., "limit": ...}``
+    returns the rows changed since ``last_sync`` plus the next cursor;
+    ``{"type": "push", "items": [...]}`` upserts maintenance records by client_id.
+    """
+    from delta_sync import pull, push, SYNC_PAGE_SIZE
+    from maintenance_batch import batch_items, summarize
+    data = request.get_json(silent=True) or {}
+    sync_type = data.get('type')
+    site_ids = None if user_can_see_all_sites(current_user) else [site.id for site in current_user.sites]
     try:
-        data = request.json
-        sync_type = data.get('type')
         if sync_type == 'push':
-            # Handle data being pushed from client to server
-            # Process items from the client
-            return jsonify({'status': 'success', 'message': 'Data received successfully'})
-            
+            entity_type = data.get('entity_type', 'maintenance_records')
+            if entity_type != 'maintenance_records':
+                return jsonify({'status': 'error', 'message': 'Only maintenance_records can be pushed'}), 400
+            results = push(db.session, batch_items(data), current_user, site_ids=site_ids,
+                           performed_by=current_user.full_name or current_user.username)
+            db.session.commit()
+            statuses = [result['status'] for result in results]
+            created, _, failed = summarize(results)
+            return jsonify({'status': 'success', 'created': created, 'updated': statuses.count('updated'),
+                            'unchanged': statuses.count('unchanged') + statuses.count('duplicate'),
+                            'failed': failed, 'results': results})
+
         elif sync_type == 'pull':
-            # Handle client requesting data from server
-            # Return requested data based on parameters
             entity_type = data.get('entity_type')
-            timestamp = data.get('last_sync')
-            
-            # This is simplified - in a real implementation you would fetch actual data
-            return jsonify({
-                'status': 'success',
-                'data': {
-                    'type': entity_type,
-                    'items': []  # Actual data would go here
-                }
-            })
+            entities = [entity_type] if isinstance(entity_type, str) else entity_type
+            changes, deleted, cursor, has_more = pull(db.session, site_ids, data.get('last_sync'), entities,
+                                                      data.get('limit') or SYNC_PAGE_SIZE)
+            return jsonify({'status': 'success', 'data': changes, 'deleted': deleted, 'cursor': cursor,
+                            'has_more': has_more, 'server_time': datetime.utcnow().isoformat()})
         else:
             return jsonify({'status': 'error', 'message': 'Invalid sync type'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error in sync_data: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/changes', methods=['GET'])
+@login_required
+def change_log_api():
+    """Tail the change_log: entries after ``since`` (a seq), ``limit`` at a time.
+
+    Admin only, since entries are not restricted by site. Pass the returned
+    ``next_seq`` as ``since`` to continue.
+    """
+    if not is_admin_user(current_user):
+        return jsonify({'error': 'Admin access required'}), 403
+    from change_log import changes_query, CHANGE_PAGE_SIZE
+    since = request.args.get('since', 0, type=int)
+    limit = max(1, min(request.args.get('limit', CHANGE_PAGE_SIZE, type=int), CHANGE_PAGE_SIZE))
+    entity = request.args.get('entity')
+    changes = db.session.scalars(changes_query(since, limit, entities=[entity] if entity else None)).all()
+    return jsonify({'changes': [change.to_dict() for change in changes],
+                    'next_seq': changes[-1].seq if changes else since})
+
+@app.route('/admin/diagnostics/startup')
+@login_required
+def admin_startup_diagnostics():
+    """Startup timeline of this worker process (phases, wall time, query counts)."""
+    if not is_admin_user(current_user):
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(startup_timeline.to_dict())
+
 @app.route('/health-check')
 def health_check():
-
-    """Basic healthcheck endpoint."""
-    try:
-        # Update to use connection-based execute pattern
-        with db.engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        return jsonify({'status': 'ok'}), 200
-    except Exception as e:
-        app.logger.error(f"Health check failed: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    """Healthcheck endpoint reporting the database monitor and circuit breaker state."""
+    # Only probe when the monitor has no fresh result (e.g. first call or no monitor thread)
+    if db_health.is_stale():
+        db_health.check_now()
+    database = db_health.status()
+    if database['healthy']:
+        return jsonify({'status': 'ok', 'database': database}), 200
+    app.logger.error(f"Health check failed: {database['last_error']}")
+    return jsonify({'status': 'error', 'message': database['last_error'], 'database': database}), 503
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -3061,28 +3033,53 @@ def import_excel_route():
             flash('Import complete', 'info')
             return redirect(request.referrer or url_for('admin_excel_import'))
             
-        if file and '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in ['xlsx', 'xls']:
+        extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+        if file and extension in ['xlsx', 'xls', 'csv', 'json']:
             try:
-                # Save the uploaded file temporarily
                 import tempfile
-                from excel_importer import import_excel
-                
-                # Create a temporary file
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-                file.save(temp_file.name)
-                temp_file.close()
-                
-                # Import data from the Excel file
-                try:
-                    stats = import_excel(temp_file.name)
-                    # Remove the temporary file
-                    import os
-                    os.unlink(temp_file.name)
-                    # Display import results
-                    success_message = f"Data imported successfully! Added {stats['sites_added']} sites, {stats['machines_added']} machines, and {stats['parts_added']} parts."
+                from excel_importer import create_import_job, run_import_job
+
+                if request.form.get('dry_run'):
+                    # Preview: report what would change without writing anything
+                    from excel_importer import ExcelImporter
+                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{extension}')
+                    file.save(temp_file.name)
+                    temp_file.close()
+                    try:
+                        diff = ExcelImporter(temp_file.name).dry_run()
+                        summary = '; '.join(f"{kind}: {d['insert']} new, {d['update']} changed, {d['skip']} unchanged/skipped, {d['errors']} invalid"
+                                            for kind, d in diff.items())
+                        flash(f'Dry run - nothing was imported. {summary or "No sheets found."}', 'info')
+                    except Exception as e:
+                        flash(f'Error reading import file: {str(e)}', 'danger')
+                    finally:
+                        os.unlink(temp_file.name)
+                    return redirect(url_for('admin_excel_import'))
+
+                # Keep the upload until the job completes so it can be resumed
+                upload_dir = (app.config.get('IMPORT_UPLOAD_DIR') or os.environ.get('IMPORT_UPLOAD_DIR')
+                              or os.path.join(app.instance_path, 'imports'))
+                os.makedirs(upload_dir, exist_ok=True)
+                fd, upload_path = tempfile.mkstemp(suffix=f'.{extension}', dir=upload_dir)
+                os.close(fd)
+                file.save(upload_path)
+
+                job = create_import_job(upload_path, filename=secure_filename(file.filename), user_id=current_user.id)
+                inline_limit = int(os.environ.get('IMPORT_INLINE_MAX_BYTES', 1024 * 1024))
+                if os.path.getsize(upload_path) > inline_limit:
+                    # Large file: run on the import worker so this request returns now
+                    from import_worker import get_import_worker
+                    get_import_worker(app).submit(job.id)
+                    flash(f'Import started in the background (job {job.id}).', 'info')
+                    return redirect(url_for('admin_excel_import', job=job.id))
+                job = run_import_job(job.id)
+                if job.status == 'completed':
+                    os.unlink(upload_path)
+                    stats = job.stats or {}
+                    success_message = f"Data imported successfully! Added {stats.get('sites_added', 0)} sites, {stats.get('machines_added', 0)} machines, and {stats.get('parts_added', 0)} parts."
                     flash(success_message, 'success')
-                except Exception as e:
-                    flash(f'Error importing data: {str(e)}', 'danger')
+                else:
+                    flash(f'Error importing data: {job.error} (import job {job.id} can be resumed)', 'danger')
                 flash('Import complete', 'info')
                 return redirect(url_for('admin_excel_import'))
             except Exception as e:
@@ -3091,13 +3088,35 @@ def import_excel_route():
                 flash('Import complete', 'info')
                 return redirect(url_for('admin_excel_import'))
         else:
-            flash('Invalid file type. Please upload an Excel file (.xlsx, .xls)', 'danger')
+            flash('Invalid file type. Please upload an Excel, CSV or JSON file (.xlsx, .xls, .csv, .json)', 'danger')
             flash('Import complete', 'info')
             return redirect(url_for('admin_excel_import'))
             
     # GET request - redirect to the Excel import page
     return redirect(url_for('admin_excel_import'))
 
+@app.route('/export/<entity>', methods=['GET'])
+@login_required
+def export_data(entity):
+    """Download sites, machines, parts, maintenance_records or audit_completions.
+
+    Query parameters: format (csv, xlsx or parquet; default csv), site_id, and
+    start_date/end_date (YYYY-MM-DD, inclusive) for the history exports.
+    Users without access to all sites only get rows for their assigned sites.
+    """
+    from data_export import export_response
+    try:
+        start = end = None
+        if request.args.get('start_date'):
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d')
+        if request.args.get('end_date'):
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    site_ids = None if user_can_see_all_sites(current_user) else [site.id for site in current_user.sites]
+    return export_response(entity, request.args.get('format', 'csv').lower(), site_ids=site_ids,
+                           site_id=request.args.get('site_id', type=int), start=start, end=end)
+
 @app.route('/part/edit/<int:part_id>', methods=['GET', 'POST'])
 @login_required
 def edit_part(part_id):
@@ -3112,6 +3131,8 @@ def edit_part(part_id):
         # Update maintenance_frequency and maintenance_unit from form
         part.maintenance_frequency = request.form.get('maintenance_frequency', part.maintenance_frequency)
         part.maintenance_unit = request.form.get('maintenance_unit', part.maintenance_unit)
+        # Reschedule from the last service with the new frequency
+        part.update_next_maintenance()
         db.session.commit()
         flash('Part updated successfully.', 'success')
         return redirect(url_for('manage_parts'))
@@ -3168,80 +3189,108 @@ def edit_role(role_id):
         flash(f'Error editing role: {str(e)}', 'danger')
         return redirect(url_for('admin_roles'))
 
+@app.route('/api/import/<job_id>', methods=['GET'])
+@login_required
+def import_job_status(job_id):
+    """Progress of an import job: rows processed/skipped/errored and throughput."""
+    if not is_admin_user(current_user):
+        return jsonify({'error': 'Admin access required'}), 403
+    from models import ImportJob
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/import/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_import_job_route(job_id):
+    """Cancel a pending or running import job (committed batches are kept)."""
+    if not is_admin_user(current_user):
+        return jsonify({'error': 'Admin access required'}), 403
+    from excel_importer import cancel_import_job
+    job = cancel_import_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/maintenance/history', methods=['GET'])
+@login_required
+def maintenance_history_api():
+    """Next page of maintenance history for the maintenance page's infinite scroll.
+
+    Accepts the maintenance page filters plus ``cursor`` (from the previous
+    page's ``next_cursor``) and ``limit``.
+    """
+    from maintenance_history import parse_filters, history_page, HISTORY_PAGE_SIZE
+    try:
+        filters = parse_filters(request.args)
+        site_ids = None if user_can_see_all_sites(current_user) else [site.id for site in current_user.sites]
+        records, next_cursor = history_page(site_ids, filters, cursor=request.args.get('cursor'),
+                                            limit=request.args.get('limit', HISTORY_PAGE_SIZE, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'records': records, 'next_cursor': next_cursor})
+
 @app.route('/api/maintenance/records', methods=['GET'])
 @login_required
 def maintenance_records_page():
+    """Maintenance records filtered by site, machine and part, newest first.
+
+    Records come from one query joining parts and machines, restricted to the
+    user's sites and paged with the maintenance history cursor (``?cursor=``),
+    so no id lists are built in Python.
+    """
+    from maintenance_history import history_page, page_users
     # Get all sites user can access
     if user_can_see_all_sites(current_user):
         sites = Site.query.all()
+        site_ids = None
     else:
         sites = current_user.sites
-        
+        site_ids = [site.id for site in sites]
+
     site_id = request.args.get('site_id', type=int)
     machine_id = request.args.get('machine_id', type=int)
     part_id = request.args.get('part_id', type=int)
 
-    # Get site IDs the user has access to
-    site_ids = [site.id for site in sites]
-    
-    machines = []
-    parts = []
-    records = []
-
-    if site_id:
-        # Verify user can access this site
-        if not user_can_see_all_sites(current_user) and site_id not in site_ids:
-            flash('You do not have access to this site.', 'danger')
-            return redirect(url_for('maintenance_records_page'))
-            
-        # Filter machines by selected site
-        machines = Machine.query.filter_by(site_id=site_id).all()
-    else:
-        # Show machines from all available sites
-        site_ids = [s.id for s in sites]
-        machines = Machine.query.filter(Machine.site_id.in_(site_ids)).all() if site_ids else []
-    
-    machine_ids = [machine.id for machine in machines]
-    
+    # Verify user can access this site
+    if site_id and site_ids is not None and site_id not in site_ids:
+        flash('You do not have access to this site.', 'danger')
+        return redirect(url_for('maintenance_records_page'))
+
+    # Dropdown options: machines at the selected (or any accessible) site
+    machine_query = Machine.query.filter_by(site_id=site_id) if site_id else Machine.query
+    if site_ids is not None:
+        machine_query = machine_query.filter(Machine.site_id.in_(site_ids))
+    machines = machine_query.all()
+    if machine_id and machine_id not in {machine.id for machine in machines}:
+        flash('You do not have access to this machine.', 'danger')
+        return redirect(url_for('maintenance_records_page'))
+
+    # Parts of the selected machine, or of every listed machine
     if machine_id:
-        # Verify user can access this machine
-        machine = Machine.query.get(machine_id)
-        if not machine or (not user_can_see_all_sites(current_user) and machine.site_id not in site_ids):
-            flash('You do not have access to this machine.', 'danger')
-            return redirect(url_for('maintenance_records_page'))
-            
-        # Filter parts by selected machine
         parts = Part.query.filter_by(machine_id=machine_id).all()
     else:
-        # Get all parts for machines the user has access to
-        parts = Part.query.filter(Part.machine_id.in_(machine_ids)).all() if machine_ids else []
-    
-    part_ids = [part.id for part in parts]
-    
-    if part_id:
-        # Verify user can access this part
-        part = Part.query.get(part_id)
-        if not part or not part.machine or (not user_can_see_all_sites(current_user) and part.machine.site_id not in site_ids):
-            flash('You do not have access to this part.', 'danger')
-            return redirect(url_for('maintenance_records_page'))
-            
-        # Filter records by selected part
-        records = MaintenanceRecord.query.filter_by(part_id=part_id).order_by(MaintenanceRecord.date.desc()).all()
-    elif machine_id:
-        # If a machine is selected but no part, show records for all parts of that machine
-        parts_for_machine = Part.query.filter_by(machine_id=machine_id).all()
-        part_ids_for_machine = [part.id for part in parts_for_machine]
-        records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids_for_machine)).order_by(MaintenanceRecord.date.desc()).all()
-    elif site_id:
-        # If a site is selected but no machine/part, show records for all parts of all machines at that site
-        machines_for_site = Machine.query.filter_by(site_id=site_id).all()
-        machine_ids_for_site = [machine.id for machine in machines_for_site]
-        parts_for_site = Part.query.filter(Part.machine_id.in_(machine_ids_for_site)).all()
-        part_ids_for_site = [part.id for part in parts_for_site]
-        records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids_for_site)).order_by(MaintenanceRecord.date.desc()).all()
-    else:
-        # No filters selected - show all records for parts the user has access to
-        records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids)).order_by(MaintenanceRecord.date.desc()).all() if part_ids else []
+        part_query = Part.query.join(Machine, Part.machine_id == Machine.id)
+        if site_id:
+            part_query = part_query.filter(Machine.site_id == site_id)
+        if site_ids is not None:
+            part_query = part_query.filter(Machine.site_id.in_(site_ids))
+        parts = part_query.all()
+    if part_id and part_id not in {part.id for part in parts}:
+        flash('You do not have access to this part.', 'danger')
+        return redirect(url_for('maintenance_records_page'))
+
+    filters = {name: value for name, value in
+               (('site_id', site_id), ('machine_id', machine_id), ('part_id', part_id)) if value}
+    try:
+        records, next_cursor = history_page(site_ids, filters, cursor=request.args.get('cursor'))
+    except ValueError:
+        flash('Invalid page cursor.', 'warning')
+        return redirect(url_for('maintenance_records_page', **filters))
+
+    # Names for records without performed_by, in one query for the page
+    users = page_users(records)
 
     return render_template(
         'maintenance_records.html',
@@ -3249,6 +3298,9 @@ def maintenance_records_page():
         machines=machines,
         parts=parts,
         records=records,
+        users=users,
+        next_cursor=next_cursor,
+        filters=filters,
         selected_site=site_id,
         selected_machine=machine_id,
         selected_part=part_id
@@ -3387,7 +3439,12 @@ def delete_audit_task(audit_task_id):
         
         # Delete all completions first (to avoid foreign key constraint violations)
         # The cascade should handle this but we'll do it explicitly to be safe
+        completion_ids = db.session.scalars(
+            select(AuditTaskCompletion.id).where(AuditTaskCompletion.audit_task_id == audit_task_id)).all()
         AuditTaskCompletion.query.filter_by(audit_task_id=audit_task_id).delete()
+        # Bulk deletes skip the session's change_log hook
+        record_changes(db.session.connection(),
+                       [('audit_task_completions', completion_id, 'delete') for completion_id in completion_ids])
         
         # Delete the audit task
         db.session.delete(audit_task)
@@ -3402,16 +3459,23 @@ def delete_audit_task(audit_task_id):
     
     return redirect(url_for('audits_page'))
 
+startup_timeline.mark('routes')
 import app_debug_helper  # Register debug routes
+# Token-authenticated JSON API used by the desktop client (/api/login, /api/parts, ...)
+from api_endpoints import register_api
+register_api()
+startup_timeline.mark('debug_helpers')
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='AMRS Maintenance Tracker Server')
     parser.add_argument('--port', type=int, default=10000, help='Port to run the server on')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode')
+    parser.add_argument('--profile-startup', action='store_true', help='Emit cProfile output for app startup')
     args = parser.parse_args()
     port = args.port or int(os.environ.get('PORT', 10000))
     debug = args.debug or os.environ.get('FLASK_DEBUG', 'false').lower() == 'true'
     
+    startup_timeline.finish()
     print(f"[APP] Starting Flask server on port {port}")
     app.run(host='0.0.0.0', port=port, debug=debug)
 
@@ -3419,7 +3483,7 @@ if __name__ == '__main__':
 try:
     import fix_audit_history_v2
     print("[APP] Running enhanced audit history fix...")
-    success = fix_audit_history_v2.setup_enhanced_audit_history()
+    success = fix_audit_history_v2.setup_enhanced_audit_history(fix_data=False)
     print(f"[APP] Enhanced audit history fix applied: {'Successfully' if success else 'Failed'}")
 except Exception as e:
     print(f"[APP] Warning: Could not apply enhanced audit history fix: {str(e)}")
@@ -3429,6 +3493,8 @@ except Exception as e:
         print("[APP] Falling back to basic audit history fix")
     except Exception as e2:
         print(f"[APP] Warning: Could not import audit history fix at end of app.py: {str(e2)}")
+startup_timeline.mark('audit_history_patch')
+startup_timeline.finish()
 
 
 
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the AMRS Maintenance Tracker.
+
+Drives the main pages and API endpoints and records p50/p95 latency, SQL
+statement counts and RSS into a JSON baseline that can be compared between
+releases.
+
+In-process (Flask test client, no server needed):
+    DATABASE_URL=sqlite:///bench.db python generate_fleet_data.py --sites 20
+    DATABASE_URL=sqlite:///bench.db python benchmark_app.py --output benchmarks/baseline.json
+
+Against a running gunicorn with a local thread-pool load generator:
+    python benchmark_app.py --base-url http://localhost:10000 --concurrency 8 \\
+        --session-cookie "session=..." --api-token "..." --server-pid <gunicorn worker pid>
+
+Compare with a previous run (exits 1 when p95 regresses past the limit):
+    python benchmark_app.py --compare benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import resource
+import urllib.request
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ENDPOINTS = [
+    '/dashboard',
+    '/maintenance',
+    '/audits',
+    '/audit-history',
+    '/api/parts',
+    '/api/machines',
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (pct in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rss_mb(pid=None):
+    """Current resident set size in MB (Linux /proc), falling back to peak RSS for this process."""
+    status_path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(status_path) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is not None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def summarize(timings, errors, queries):
+    return {
+        'count': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 2) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 2) if timings else None,
+        'mean_ms': round(sum(timings) / len(timings), 2) if timings else None,
+        'max_ms': round(max(timings), 2) if timings else None,
+        'db_queries': max(queries) if queries else None,
+    }
+
+
+class InProcessRunner:
+    """Issue requests through the Flask test client as an admin user."""
+
+    def __init__(self):
+        from app import app, db
+        from models import User, Role
+        import jwt
+        from api_endpoints import JWT_SECRET_KEY
+
+        self.app = app
+        self.client = app.test_client()
+        with app.app_context():
+            admin = User.query.join(Role).filter(Role.name == 'admin').order_by(User.id).first()
+            if admin is None:
+                raise SystemExit("[BENCH] No admin user found; run `flask db-prepare` with DEFAULT_ADMIN_* set first")
+            admin_id = admin.id
+            self.dataset = {
+                'sites': db.session.execute(db.text('SELECT COUNT(*) FROM sites')).scalar(),
+                'machines': db.session.execute(db.text('SELECT COUNT(*) FROM machines')).scalar(),
+                'parts': db.session.execute(db.text('SELECT COUNT(*) FROM parts')).scalar(),
+                'audit_task_completions': db.session.execute(db.text('SELECT COUNT(*) FROM audit_task_completions')).scalar(),
+            }
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+        token = jwt.encode({'user_id': admin_id, 'exp': datetime.utcnow() + timedelta(hours=1)}, JWT_SECRET_KEY)
+        self.api_headers = {'Authorization': f'Bearer {token}'}
+
+    def request(self, path):
+        headers = self.api_headers if path.startswith('/api/') else {}
+        started = time.perf_counter()
+        response = self.client.get(path, headers=headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        queries = response.headers.get('X-DB-Queries')
+        return elapsed, response.status_code, int(queries) if queries else None
+
+    def rss(self):
+        return rss_mb()
+
+
+class HttpRunner:
+    """Issue requests against a running server with urllib."""
+
+    def __init__(self, base_url, session_cookie=None, api_token=None, server_pid=None):
+        self.base_url = base_url.rstrip('/')
+        self.session_cookie = session_cookie
+        self.api_token = api_token
+        self.server_pid = server_pid
+        self.dataset = None
+
+    def request(self, path):
+        headers = {}
+        if path.startswith('/api/') and self.api_token:
+            headers['Authorization'] = f'Bearer {self.api_token}'
+        elif self.session_cookie:
+            headers['Cookie'] = self.session_cookie
+        req = urllib.request.Request(self.base_url + path, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                status = response.status
+                queries = response.headers.get('X-DB-Queries')
+        except urllib.error.HTTPError as e:
+            status, queries = e.code, None
+        except OSError:
+            status, queries = 0, None
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, status, int(queries) if queries else None
+
+    def rss(self):
+        return rss_mb(self.server_pid) if self.server_pid else None
+
+
+def run_benchmark(runner, endpoints, iterations, warmup, concurrency):
+    results = {}
+    rss_before = runner.rss()
+    for path in endpoints:
+        for _ in range(warmup):
+            runner.request(path)
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(lambda _: runner.request(path), range(iterations)))
+        else:
+            samples = [runner.request(path) for _ in range(iterations)]
+        timings = [elapsed for elapsed, status, _ in samples if 200 <= status < 400]
+        errors = sum(1 for _, status, _ in samples if not 200 <= status < 400)
+        queries = [q for _, _, q in samples if q is not None]
+        results[path] = summarize(timings, errors, queries)
+        print(f"[BENCH] {path:<20} p50={results[path]['p50_ms']}ms p95={results[path]['p95_ms']}ms "
+              f"queries={results[path]['db_queries']} errors={errors}")
+    return {
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'dataset': runner.dataset,
+        'rss_mb': {'before': rss_before, 'after': runner.rss()},
+        'endpoints': results,
+    }
+
+
+def compare(current, baseline, max_regression_pct):
+    """Print p95 deltas against ``baseline``; return True if any endpoint regressed past the limit."""
+    regressed = False
+    for path, stats in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(path)
+        if not old or not old.get('p95_ms') or stats['p95_ms'] is None:
+            continue
+        delta = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+        flag = ''
+        if delta > max_regression_pct:
+            regressed = True
+            flag = '  <-- REGRESSION'
+        print(f"[BENCH] {path:<20} p95 {old['p95_ms']}ms -> {stats['p95_ms']}ms ({delta:+.1f}%){flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark AMRS pages and API endpoints')
+    parser.add_argument('--endpoint', action='append', dest='endpoints', help='Endpoint to benchmark (repeatable)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process test client')
+    parser.add_argument('--session-cookie', help='Cookie header for page requests in --base-url mode')
+    parser.add_argument('--api-token', help='Bearer token for /api requests in --base-url mode')
+    parser.add_argument('--server-pid', type=int, help='Server process to sample RSS from in --base-url mode')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'latest.json'))
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=20.0, help='Allowed p95 regression in percent')
+    args = parser.parse_args(argv)
+
+    if args.base_url:
+        runner = HttpRunner(args.base_url, args.session_cookie, args.api_token, args.server_pid)
+        concurrency = args.concurrency
+    else:
+        runner = InProcessRunner()
+        # The test client shares one session; keep requests sequential
+        concurrency = 1
+    result = run_benchmark(runner, args.endpoints or DEFAULT_ENDPOINTS, args.iterations, args.warmup, concurrency)
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark the import engine against the two row-at-a-time importers it replaced.
+
+Writes a workbook with ``--rows`` parts (plus their sites and machines),
+imports it with each implementation into the configured database, and
+reports wall time, SQL statement count and rows/s. Imported rows are deleted
+between runs. Use a throwaway database:
+
+    DATABASE_URL=sqlite:///bench_import.db python benchmark_import.py --rows 50000
+
+The ``legacy_*`` functions reproduce the previous ``ExcelImporter`` and
+``import_excel.import_excel`` logic (a lookup query per row, ORM adds) and
+exist only for this comparison.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import event, text
+
+PREFIX = 'Bench Import'
+
+
+def write_fixture(path, rows, machines_per_site=40, parts_per_machine=24):
+    """Workbook with ``rows`` parts spread over sites/machines; returns the total row count."""
+    machines = max(1, rows // parts_per_machine)
+    sites = max(1, machines // machines_per_site)
+    site_rows = [{'name': f'{PREFIX} Site {s}', 'location': f'Region {s % 7}'} for s in range(sites)]
+    machine_rows = [{'name': f'Machine {m}', 'site_name': f'{PREFIX} Site {m % sites}', 'model': f'M{m % 90}'}
+                    for m in range(machines)]
+    part_rows = [{'name': f'Part {p % parts_per_machine}', 'machine_name': f'Machine {p // parts_per_machine % machines}',
+                  'site_name': f'{PREFIX} Site {p // parts_per_machine % machines % sites}',
+                  'maintenance_frequency': 1 + p % 12, 'last_maintenance': '2024-01-15', 'description': 'bench'}
+                 for p in range(machines * parts_per_machine)]
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(site_rows).to_excel(writer, sheet_name='Sites', index=False)
+        pd.DataFrame(machine_rows).to_excel(writer, sheet_name='Machines', index=False)
+        pd.DataFrame(part_rows).to_excel(writer, sheet_name='Parts', index=False)
+    return len(site_rows) + len(machine_rows) + len(part_rows)
+
+
+def legacy_excel_importer(path):
+    """Previous excel_importer.ExcelImporter: per-row lookups, one commit at the end."""
+    from app import db
+    from models import Site, Machine, Part
+    excel_file = pd.ExcelFile(path)
+    for _, row in excel_file.parse('Sites').iterrows():
+        if Site.query.filter_by(name=row['name']).first():
+            continue
+        db.session.add(Site(name=row['name'], location=row['location']))
+    for _, row in excel_file.parse('Machines').iterrows():
+        site = Site.query.filter_by(name=row['site_name']).first()
+        if not site or Machine.query.filter_by(name=row['name'], site_id=site.id).first():
+            continue
+        db.session.add(Machine(name=row['name'], site_id=site.id, model=row.get('model')))
+    for _, row in excel_file.parse('Parts').iterrows():
+        site = Site.query.filter_by(name=row['site_name']).first()
+        machine = site and Machine.query.filter_by(name=row['machine_name'], site_id=site.id).first()
+        if not machine or Part.query.filter_by(name=row['name'], machine_id=machine.id).first():
+            continue
+        part = Part(name=row['name'], machine_id=machine.id, maintenance_frequency=int(row['maintenance_frequency']),
+                    last_maintenance=datetime.strptime(row['last_maintenance'], '%Y-%m-%d'),
+                    description=row.get('description'))
+        part.update_next_maintenance()
+        db.session.add(part)
+    db.session.commit()
+
+
+def legacy_import_excel(path):
+    """Previous import_excel.import_excel: per-row lookups, a commit per sheet."""
+    from app import db
+    from models import Site, Machine, Part
+    for _, row in pd.read_excel(path, sheet_name='Sites').iterrows():
+        if Site.query.filter_by(name=row.get('name')).first():
+            continue
+        db.session.add(Site(name=row.get('name'), location=row.get('location', ''), contact_email='',
+                            enable_notifications=False, notification_threshold=7))
+    db.session.commit()
+    for _, row in pd.read_excel(path, sheet_name='Machines').iterrows():
+        site = Site.query.filter_by(name=row.get('site_name')).first()
+        if not site or Machine.query.filter_by(name=row.get('name'), site_id=site.id).first():
+            continue
+        db.session.add(Machine(name=row.get('name'), model=row.get('model', ''), site_id=site.id))
+    db.session.commit()
+    for _, row in pd.read_excel(path, sheet_name='Parts').iterrows():
+        site = Site.query.filter_by(name=row.get('site_name')).first()
+        machine = site and Machine.query.filter_by(name=row.get('machine_name'), site_id=site.id).first()
+        if not machine or Part.query.filter_by(name=row.get('name'), machine_id=machine.id).first():
+            continue
+        part = Part(name=row.get('name'), description=row.get('description', ''), machine_id=machine.id,
+                    maintenance_frequency=int(row.get('maintenance_frequency', 7)),
+                    last_maintenance=datetime.strptime(row.get('last_maintenance'), '%Y-%m-%d'))
+        part.update_next_maintenance()
+        db.session.add(part)
+    db.session.commit()
+
+
+def engine_import(path):
+    from excel_importer import ExcelImporter
+    ExcelImporter(path).import_data()
+
+
+def engine_streaming(path):
+    from excel_importer import ExcelImporter
+    ExcelImporter(path).import_streaming()
+
+
+IMPLEMENTATIONS = {
+    'engine': engine_import,
+    'engine_streaming': engine_streaming,
+    'legacy_excel_importer': legacy_excel_importer,
+    'legacy_import_excel': legacy_import_excel,
+}
+
+
+def cleanup(db):
+    """Delete everything the benchmark imported."""
+    sites = f"SELECT id FROM sites WHERE name LIKE '{PREFIX} %'"
+    machines = f"SELECT id FROM machines WHERE site_id IN ({sites})"
+    db.session.execute(text(f"DELETE FROM parts WHERE machine_id IN ({machines})"))
+    db.session.execute(text(f"DELETE FROM machines WHERE site_id IN ({sites})"))
+    db.session.execute(text(f"DELETE FROM sites WHERE name LIKE '{PREFIX} %'"))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def run(name, path, total_rows, db):
+    counter = {'queries': 0}
+
+    def count(*args):
+        counter['queries'] += 1
+
+    cleanup(db)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    try:
+        IMPLEMENTATIONS[name](path)
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(db.engine, 'before_cursor_execute', count)
+    parts = db.session.execute(text(
+        f"SELECT COUNT(*) FROM parts WHERE machine_id IN (SELECT id FROM machines WHERE site_id IN "
+        f"(SELECT id FROM sites WHERE name LIKE '{PREFIX} %'))")).scalar()
+    result = {'seconds': round(elapsed, 2), 'queries': counter['queries'],
+              'rows_per_second': round(total_rows / elapsed, 1), 'parts_imported': parts}
+    print(f"[BENCH] {name:<22} {result['seconds']:>8.2f}s {result['queries']:>8} queries "
+          f"{result['rows_per_second']:>10.1f} rows/s")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the import engine with the legacy importers')
+    parser.add_argument('--rows', type=int, default=50000, help='Number of part rows in the fixture')
+    parser.add_argument('--only', action='append', choices=sorted(IMPLEMENTATIONS),
+                        help='Implementation to run (repeatable; default: all)')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only run the new engine')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'import_latest.json'))
+    args = parser.parse_args(argv)
+
+    names = args.only or [n for n in IMPLEMENTATIONS if not (args.skip_legacy and n.startswith('legacy'))]
+    from app import app, db
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fixture.xlsx')
+        started = time.perf_counter()
+        total_rows = write_fixture(path, args.rows)
+        print(f"[BENCH] Fixture: {total_rows} rows written in {time.perf_counter() - started:.1f}s")
+        results = {name: run(name, path, total_rows, db) for name in names}
+        cleanup(db)
+
+    output = {'generated_at': datetime.utcnow().isoformat(), 'rows': total_rows, 'results': results}
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
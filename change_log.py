@@ -0,0 +1,105 @@
+"""
+Append-only change log (``change_log`` table) for incremental consumers.
+
+Every insert, update and delete of a tracked entity (``TRACKED``) appends a
+row ``(seq, entity, entity_id, op, version, changed_at)``. ``seq`` is a
+monotonic sequence, so delta sync, caches and exporters tail the log with
+``WHERE seq > :cursor`` instead of re-reading tables; deletes are the only
+trace of a removed row (tombstones). ``version`` counts the changes of one
+(entity, entity_id).
+
+ORM writes are logged by an ``after_flush`` hook (``install_change_log_hook``).
+Statements that bypass the unit of work - Core executemany UPDATEs, ORM bulk
+inserts, ``Query.delete()`` - call ``record_changes`` themselves.
+
+``seq`` is allocated at insert time, so on PostgreSQL a long transaction can
+commit a lower seq after a consumer has read a higher one; consumers that
+need every change should re-read a short window behind their cursor.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import event, func, select
+
+from models import (User, Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion,
+                    ChangeLog)
+
+TRACKED = (User, Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion)
+TRACKED_ENTITIES = tuple(model.__tablename__ for model in TRACKED)
+
+CHANGE_PAGE_SIZE = 1000
+
+
+def _versions(conn, entity, ids):
+    """{entity_id: latest version} for ``ids`` of ``entity``."""
+    return dict(conn.execute(
+        select(ChangeLog.entity_id, func.max(ChangeLog.version))
+        .where(ChangeLog.entity == entity, ChangeLog.entity_id.in_(ids))
+        .group_by(ChangeLog.entity_id)
+    ).all())
+
+
+def record_changes(conn, changes):
+    """Append ``changes`` - (entity, entity_id, op) tuples - to the log.
+
+    One version lookup per entity type, then one executemany INSERT.
+    """
+    if not changes:
+        return
+    now = datetime.utcnow()
+    by_entity = {}
+    for entity, entity_id, op in changes:
+        by_entity.setdefault(entity, []).append((entity_id, op))
+    rows = []
+    for entity, entries in by_entity.items():
+        versions = _versions(conn, entity, {entity_id for entity_id, _ in entries})
+        for entity_id, op in entries:
+            versions[entity_id] = versions.get(entity_id, 0) + 1
+            rows.append({'entity': entity, 'entity_id': entity_id, 'op': op,
+                         'version': versions[entity_id], 'changed_at': now})
+    conn.execute(ChangeLog.__table__.insert(), rows)
+
+
+def _flushed_changes(session):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, TRACKED):
+            changes.append((obj.__tablename__, obj.id, 'insert'))
+    for obj in session.dirty:
+        if isinstance(obj, TRACKED) and session.is_modified(obj, include_collections=False):
+            changes.append((obj.__tablename__, obj.id, 'update'))
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED):
+            changes.append((obj.__tablename__, obj.id, 'delete'))
+    return changes
+
+
+def _after_flush(session, flush_context):
+    changes = _flushed_changes(session)
+    if changes:
+        record_changes(session.connection(), changes)
+
+
+def install_change_log_hook(session):
+    """Log ORM inserts, updates and deletes of tracked entities flushed through ``session``."""
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+
+def latest_seq(conn):
+    return conn.execute(select(func.max(ChangeLog.seq))).scalar() or 0
+
+
+def changes_query(seq, limit=CHANGE_PAGE_SIZE, entities=None, op=None):
+    """Select of the log entries after ``seq`` in seq order, at most ``limit``."""
+    stmt = select(ChangeLog).where(ChangeLog.seq > seq).order_by(ChangeLog.seq).limit(limit)
+    if entities is not None:
+        stmt = stmt.where(ChangeLog.entity.in_(entities))
+    if op is not None:
+        stmt = stmt.where(ChangeLog.op == op)
+    return stmt
+
+
+def changes_since(conn, seq, limit=CHANGE_PAGE_SIZE, entities=None, op=None):
+    """Log rows after ``seq`` in seq order, at most ``limit``."""
+    return conn.execute(changes_query(seq, limit, entities, op)).all()
@@ -0,0 +1,226 @@
+"""
+Bulk export of maintenance data (sites, machines, parts, maintenance records
+and audit completions) as CSV, XLSX or Parquet.
+
+Rows are read with a server-side cursor (``yield_per``) and never collected
+in a list, so exporting years of history runs in constant memory:
+
+- CSV is streamed to the client as a chunked response while rows arrive.
+- XLSX is written with openpyxl's write-only workbook to a temporary file,
+  then sent.
+- Parquet (only if pyarrow is installed) is written in record batches to a
+  temporary file, then sent.
+"""
+
+import io
+import os
+import csv
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import Response, jsonify, send_file, stream_with_context
+from sqlalchemy import Boolean, Date, DateTime, Integer, select
+
+from models import db, Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))
+
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# ``select`` builds the statement; ``site_column``/``date_column`` are used
+# for access restriction and the optional date range filter.
+ExportSpec = namedtuple('ExportSpec', ['select', 'site_column', 'date_column'])
+
+
+def _sites():
+    return select(Site.id, Site.name, Site.location, Site.contact_email, Site.enable_notifications,
+                  Site.notification_threshold, Site.created_at, Site.updated_at).order_by(Site.id)
+
+
+def _machines():
+    return (select(Machine.id, Machine.name, Machine.model, Machine.machine_number, Machine.serial_number,
+                   Machine.site_id, Site.name.label('site_name'), Machine.created_at, Machine.updated_at)
+            .join(Site, Machine.site_id == Site.id)
+            .order_by(Machine.id))
+
+
+def _parts():
+    return (select(Part.id, Part.name, Part.description, Part.machine_id, Machine.name.label('machine_name'),
+                   Machine.site_id, Site.name.label('site_name'), Part.maintenance_frequency,
+                   Part.maintenance_unit, Part.maintenance_days, Part.last_maintenance, Part.next_maintenance,
+                   Part.created_at, Part.updated_at)
+            .join(Machine, Part.machine_id == Machine.id)
+            .join(Site, Machine.site_id == Site.id)
+            .order_by(Part.id))
+
+
+def _maintenance_records():
+    return (select(MaintenanceRecord.id, MaintenanceRecord.date, MaintenanceRecord.part_id,
+                   Part.name.label('part_name'), Part.machine_id, Machine.name.label('machine_name'),
+                   Machine.site_id, Site.name.label('site_name'), MaintenanceRecord.user_id,
+                   MaintenanceRecord.performed_by, MaintenanceRecord.maintenance_type, MaintenanceRecord.status,
+                   MaintenanceRecord.description, MaintenanceRecord.comments, MaintenanceRecord.notes,
+                   MaintenanceRecord.client_id, MaintenanceRecord.created_at)
+            .join(Part, MaintenanceRecord.part_id == Part.id)
+            .join(Machine, Part.machine_id == Machine.id)
+            .join(Site, Machine.site_id == Site.id)
+            .order_by(MaintenanceRecord.id))
+
+
+def _audit_completions():
+    return (select(AuditTaskCompletion.id, AuditTaskCompletion.date, AuditTaskCompletion.audit_task_id,
+                   AuditTask.name.label('audit_task_name'), AuditTaskCompletion.machine_id,
+                   Machine.name.label('machine_name'), Machine.site_id, Site.name.label('site_name'),
+                   AuditTaskCompletion.completed, AuditTaskCompletion.completed_by,
+                   AuditTaskCompletion.completed_at)
+            .join(AuditTask, AuditTaskCompletion.audit_task_id == AuditTask.id)
+            .join(Machine, AuditTaskCompletion.machine_id == Machine.id)
+            .join(Site, Machine.site_id == Site.id)
+            .order_by(AuditTaskCompletion.id))
+
+
+EXPORTS = {
+    'sites': ExportSpec(_sites, Site.id, None),
+    'machines': ExportSpec(_machines, Machine.site_id, None),
+    'parts': ExportSpec(_parts, Machine.site_id, None),
+    'maintenance_records': ExportSpec(_maintenance_records, Machine.site_id, MaintenanceRecord.date),
+    'audit_completions': ExportSpec(_audit_completions, Machine.site_id, AuditTaskCompletion.date),
+}
+
+
+def build_query(entity, site_ids=None, site_id=None, start=None, end=None):
+    """Export statement for ``entity`` restricted to ``site_ids`` (None = all sites).
+
+    ``start``/``end`` bound the date column of history exports; ``end`` is exclusive.
+    """
+    spec = EXPORTS[entity]
+    stmt = spec.select()
+    if site_ids is not None:
+        stmt = stmt.where(spec.site_column.in_(site_ids))
+    if site_id is not None:
+        stmt = stmt.where(spec.site_column == site_id)
+    if spec.date_column is not None:
+        if start is not None:
+            stmt = stmt.where(spec.date_column >= start)
+        if end is not None:
+            stmt = stmt.where(spec.date_column < end)
+    return stmt
+
+
+def iter_rows(stmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield result rows from a server-side cursor, ``batch_size`` at a time."""
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(stmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield CSV text in chunks of roughly ``batch_size`` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(stmt.selected_columns.keys())
+    pending = 0
+    for row in iter_rows(stmt, batch_size):
+        writer.writerow([_cell(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def write_xlsx(stmt, path, title, batch_size=EXPORT_BATCH_SIZE):
+    """Write the rows of ``stmt`` to ``path`` with an openpyxl write-only workbook."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(list(stmt.selected_columns.keys()))
+    for row in iter_rows(stmt, batch_size):
+        sheet.append(list(row))
+    workbook.save(path)
+
+
+def _arrow_type(column):
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def write_parquet(stmt, path, batch_size=EXPORT_BATCH_SIZE):
+    """Write the rows of ``stmt`` to ``path`` as Parquet, one record batch per ``batch_size`` rows."""
+    schema = pa.schema([(column.key, _arrow_type(column)) for column in stmt.selected_columns])
+    names = schema.names
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in iter_rows(stmt, batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist([dict(zip(names, r)) for r in batch], schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(names, r)) for r in batch], schema=schema))
+
+
+def _send_temp_file(path, mimetype, filename):
+    response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename)
+    response.call_on_close(lambda: os.path.exists(path) and os.unlink(path))
+    return response
+
+
+def export_response(entity, fmt, site_ids=None, site_id=None, start=None, end=None):
+    """Flask response exporting ``entity`` in ``fmt`` (csv, xlsx or parquet)."""
+    if entity not in EXPORTS:
+        return jsonify({'error': f"Unknown export '{entity}'", 'available': sorted(EXPORTS)}), 404
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'", 'available': sorted(FORMATS)}), 400
+    if fmt == 'parquet' and pa is None:
+        return jsonify({'error': 'Parquet export requires pyarrow to be installed'}), 501
+
+    stmt = build_query(entity, site_ids=site_ids, site_id=site_id, start=start, end=end)
+    filename = f"{entity}_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}"
+    if fmt == 'csv':
+        return Response(stream_with_context(stream_csv(stmt)), mimetype=FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        if fmt == 'xlsx':
+            write_xlsx(stmt, path, entity)
+        else:
+            write_parquet(stmt, path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return _send_temp_file(path, FORMATS[fmt], filename)
@@ -0,0 +1,187 @@
+"""
+Database connection health monitoring for the AMRS Maintenance Tracker.
+
+Replaces the per-request ``SELECT 1`` with a background probe per worker
+process and a circuit breaker, so requests fail fast while the database is
+known to be down instead of each one paying a round trip (or a timeout).
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Three-state circuit breaker (closed -> open -> half_open -> closed)."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("[DB_HEALTH] Database reachable again, closing circuit")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error else None
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"[DB_HEALTH] Opening circuit after {self.consecutive_failures} failure(s): {self.last_error}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def should_probe(self):
+        """Return True when an open circuit has waited long enough for a trial probe."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN
+
+    def snapshot(self):
+        retry_after = None
+        if self.state == self.OPEN and self.opened_at is not None:
+            retry_after = max(0, int(self.reset_timeout - (time.monotonic() - self.opened_at)))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'retry_after': retry_after,
+        }
+
+
+class DatabaseHealthMonitor:
+    """Background connection-health monitor feeding a circuit breaker.
+
+    The probe thread is started lazily on the first request so that each
+    gunicorn worker (forked after import) runs its own monitor.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = None
+        self.interval = 15
+        self.breaker = CircuitBreaker()
+        self.last_check = None
+        self.last_latency_ms = None
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._probe_lock = threading.Lock()
+        # Set on the thread running check_now, whose own failure is counted there
+        self._probing = threading.local()
+        if app is not None and db is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        app.config.setdefault('DB_HEALTH_CHECK_INTERVAL', int(os.environ.get('DB_HEALTH_CHECK_INTERVAL', 15)))
+        app.config.setdefault('DB_CIRCUIT_FAILURE_THRESHOLD', int(os.environ.get('DB_CIRCUIT_FAILURE_THRESHOLD', 3)))
+        app.config.setdefault('DB_CIRCUIT_RESET_TIMEOUT', int(os.environ.get('DB_CIRCUIT_RESET_TIMEOUT', 30)))
+        self.interval = app.config['DB_HEALTH_CHECK_INTERVAL']
+        self.breaker = CircuitBreaker(
+            failure_threshold=app.config['DB_CIRCUIT_FAILURE_THRESHOLD'],
+            reset_timeout=app.config['DB_CIRCUIT_RESET_TIMEOUT'],
+        )
+        # Connection-level errors raised while serving requests also feed the
+        # breaker, so an outage is noticed before the next background probe.
+        with app.app_context():
+            event.listen(db.engine, 'handle_error', self._on_engine_error)
+        app.extensions['db_health'] = self
+
+    def _on_engine_error(self, context):
+        if getattr(self._probing, 'active', False):
+            return
+        if context.is_disconnect or context.connection is None:
+            self.breaker.record_failure(context.original_exception)
+
+    def check_now(self):
+        """Probe the database once and update the breaker. Returns True if healthy."""
+        with self._probe_lock:
+            started = time.perf_counter()
+            self._probing.active = True
+            try:
+                with self.app.app_context():
+                    with self.db.engine.connect() as conn:
+                        conn.execute(text("SELECT 1"))
+                self.last_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.breaker.record_success()
+                return True
+            except Exception as e:
+                self.last_latency_ms = None
+                self.breaker.record_failure(e)
+                return False
+            finally:
+                self._probing.active = False
+                self.last_check = datetime.utcnow()
+
+    def ensure_started(self):
+        """Start the probe thread for this process if it is not running yet."""
+        if self.app is None or self.app.config.get('TESTING') or self.interval <= 0:
+            return
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='db-health-monitor', daemon=True)
+        self._thread_pid = pid
+        self._thread.start()
+        logger.info(f"[DB_HEALTH] Started connection monitor (every {self.interval}s) in pid {pid}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_now()
+            self._stop.wait(self.interval)
+
+    def allow_request(self):
+        """Return False unless the circuit is closed so callers can fail fast."""
+        if self.breaker.should_probe():
+            # Half-open: a single inline probe decides whether to close the circuit
+            return self.check_now()
+        # Other requests keep failing fast until that probe closes it
+        return self.breaker.state == CircuitBreaker.CLOSED
+
+    def is_stale(self):
+        if self.last_check is None:
+            return True
+        return (datetime.utcnow() - self.last_check).total_seconds() > max(self.interval, 1)
+
+    def status(self):
+        status = self.breaker.snapshot()
+        status.update({
+            'healthy': status['state'] == CircuitBreaker.CLOSED,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'latency_ms': self.last_latency_ms,
+            'monitor_running': bool(self._thread and self._thread.is_alive()),
+            'check_interval': self.interval,
+        })
+        return status
@@ -0,0 +1,225 @@
+"""
+Delta synchronization for offline desktop clients (``POST /api/sync/data``).
+
+Pull returns, per entity type, only the rows whose ``updated_at`` moved past
+the client's cursor, plus the ids deleted since then. Each table is paged
+with a keyset on (``updated_at``, ``id``) backed by an index
+(``ix_<table>_updated_at_id``), so a sync costs one indexed range scan per
+entity and its size follows the number of changed rows, not the size of the
+fleet. The cursor is opaque: the last (updated_at, id) the client received
+per entity type and its change_log position, base64-encoded. A plain ISO
+timestamp is also accepted as ``last_sync`` for clients that only kept the
+time of their last sync.
+
+Push bulk-upserts maintenance records keyed by ``client_id``: new records
+go through ``maintenance_batch.record_batch`` (one INSERT, part due dates
+and stats updated), records the server already has are updated in one
+executemany UPDATE, and only when a field actually changed, so a resubmitted
+push writes nothing.
+
+Deleted rows are reported as tombstones read from ``change_log``
+(``deleted`` in the pull response), tailed by the cursor's change_log
+``seq``. Rows that move out of a user's sites simply stop appearing.
+"""
+
+import json
+import base64
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, func, select, tuple_
+
+from change_log import changes_since, record_changes
+from models import Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion, ChangeLog
+
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# Record fields a client may change on a record it pushed earlier
+PUSH_FIELDS = ('maintenance_type', 'description', 'status', 'notes', 'comments', 'performed_by')
+
+# ``select`` builds the statement (the table's columns plus a ``site_id`` for
+# child tables); ``model`` provides the (updated_at, id) keyset columns.
+SyncSpec = namedtuple('SyncSpec', ['model', 'select', 'site_column'])
+
+
+def _sites():
+    return select(*Site.__table__.columns)
+
+
+def _machines():
+    return select(*Machine.__table__.columns)
+
+
+def _parts():
+    return select(*Part.__table__.columns, Machine.site_id).join(Machine, Part.machine_id == Machine.id)
+
+
+def _maintenance_records():
+    return (select(*MaintenanceRecord.__table__.columns, Machine.site_id)
+            .join(Part, MaintenanceRecord.part_id == Part.id)
+            .join(Machine, Part.machine_id == Machine.id))
+
+
+def _audit_tasks():
+    return select(*AuditTask.__table__.columns)
+
+
+def _audit_task_completions():
+    return (select(*AuditTaskCompletion.__table__.columns, Machine.site_id)
+            .join(Machine, AuditTaskCompletion.machine_id == Machine.id))
+
+
+ENTITIES = {
+    'sites': SyncSpec(Site, _sites, Site.id),
+    'machines': SyncSpec(Machine, _machines, Machine.site_id),
+    'parts': SyncSpec(Part, _parts, Machine.site_id),
+    'maintenance_records': SyncSpec(MaintenanceRecord, _maintenance_records, Machine.site_id),
+    'audit_tasks': SyncSpec(AuditTask, _audit_tasks, AuditTask.site_id),
+    'audit_task_completions': SyncSpec(AuditTaskCompletion, _audit_task_completions, Machine.site_id),
+}
+
+
+def encode_cursor(positions, seq):
+    raw = json.dumps({'rows': {entity: [updated_at.isoformat(), row_id]
+                               for entity, (updated_at, row_id) in positions.items()},
+                      'seq': seq}, sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, entities=ENTITIES):
+    """``(positions, seq, since)`` from a cursor or ISO timestamp; raises ValueError if invalid.
+
+    ``positions`` maps entity to (updated_at, id), ``seq`` is the change_log
+    position for tombstones (None for a first sync or a timestamp) and
+    ``since`` the timestamp, if one was given.
+    """
+    if not cursor:
+        return {}, None, None
+    try:
+        since = datetime.fromisoformat(cursor)
+    except (TypeError, ValueError):
+        pass
+    else:
+        if since.tzinfo is not None:
+            # updated_at is stored as naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return {entity: (since, 0) for entity in entities}, None, since
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        positions = {entity: (datetime.fromisoformat(updated_at), int(row_id))
+                     for entity, (updated_at, row_id) in raw['rows'].items() if entity in entities}
+        return positions, int(raw['seq']), None
+    except (TypeError, ValueError, AttributeError, KeyError) as e:
+        raise ValueError(f"Invalid sync cursor: {e}")
+
+
+def _tombstone_start(session, since):
+    """change_log seq to read deletions after: everything logged up to ``since`` (None = now)."""
+    stmt = select(func.max(ChangeLog.seq))
+    if since is not None:
+        stmt = stmt.where(ChangeLog.changed_at <= since)
+    return session.execute(stmt).scalar() or 0
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def changes_query(entity, site_ids=None, after=None, limit=SYNC_PAGE_SIZE):
+    """Rows of ``entity`` changed after the (updated_at, id) position ``after``, oldest change first."""
+    spec = ENTITIES[entity]
+    model = spec.model
+    stmt = spec.select().order_by(model.updated_at, model.id).limit(limit)
+    if site_ids is not None:
+        stmt = stmt.where(spec.site_column.in_(site_ids))
+    if after is not None:
+        stmt = stmt.where(tuple_(model.updated_at, model.id) > tuple_(*after))
+    return stmt
+
+
+def pull(session, site_ids=None, cursor=None, entities=None, limit=SYNC_PAGE_SIZE):
+    """One page of changes per entity since ``cursor``.
+
+    Returns ``(data, deleted, next_cursor, has_more)``: ``data`` maps each
+    entity type to its changed rows, ``deleted`` to the ids deleted since the
+    cursor (from change_log; ids only, so not restricted to ``site_ids``);
+    while ``has_more`` is true the client should pull again with ``next_cursor``.
+    """
+    entities = list(entities or ENTITIES)
+    unknown = [entity for entity in entities if entity not in ENTITIES]
+    if unknown:
+        raise ValueError(f"Unknown entity type: {', '.join(unknown)}")
+    limit = max(1, min(int(limit), MAX_SYNC_PAGE_SIZE))
+    positions, seq, since = decode_cursor(cursor)
+    if seq is None:
+        # A first sync gets current rows only; a timestamp gets deletions after it
+        seq = _tombstone_start(session, since if cursor else None)
+
+    data, has_more = {}, False
+    for entity in entities:
+        rows = session.execute(changes_query(entity, site_ids, positions.get(entity), limit + 1)).mappings().all()
+        if len(rows) > limit:
+            rows, has_more = rows[:limit], True
+        if rows:
+            positions[entity] = (rows[-1]['updated_at'], rows[-1]['id'])
+        data[entity] = [{key: _value(value) for key, value in row.items()} for row in rows]
+
+    tombstones = changes_since(session.connection(), seq, limit + 1, entities, op='delete')
+    if len(tombstones) > limit:
+        tombstones, has_more = tombstones[:limit], True
+    deleted = {entity: [] for entity in entities}
+    for row in tombstones:
+        deleted[row.entity].append({'id': row.entity_id, 'deleted_at': row.changed_at.isoformat()})
+    if tombstones:
+        seq = tombstones[-1].seq
+    return data, deleted, encode_cursor(positions, seq), has_more
+
+
+def push(session, items, user, site_ids=None, performed_by=None):
+    """Upsert pushed maintenance records keyed by client_id; per-item results in input order.
+
+    Statuses are those of ``record_batch`` for new records, and ``updated``
+    or ``unchanged`` for records the server already has.
+    """
+    from maintenance_batch import record_batch
+    results = record_batch(session, items, user, site_ids=site_ids, performed_by=performed_by)
+    pushed = {result['client_id']: item for result, item in zip(results, items) if result['status'] == 'duplicate'}
+    if not pushed:
+        return results
+
+    query = (select(MaintenanceRecord.id, MaintenanceRecord.client_id, *[getattr(MaintenanceRecord, name)
+                                                                         for name in PUSH_FIELDS])
+             .join(Part, MaintenanceRecord.part_id == Part.id)
+             .join(Machine, Part.machine_id == Machine.id)
+             .where(MaintenanceRecord.client_id.in_(pushed)))
+    if site_ids is not None:
+        query = query.where(Machine.site_id.in_(site_ids))
+    stored = {row.client_id: row for row in session.execute(query)}
+
+    # Group by the fields each item sends so every group is one executemany UPDATE
+    changed, groups = set(), {}
+    for client_id, item in pushed.items():
+        row = stored.get(client_id)
+        if row is None:
+            continue
+        fields = tuple(name for name in PUSH_FIELDS if name in item and item[name] != getattr(row, name))
+        if fields:
+            changed.add(client_id)
+            groups.setdefault(fields, []).append({'record_id': row.id, **{f'b_{name}': item[name] for name in fields}})
+    table = MaintenanceRecord.__table__
+    for fields, params in groups.items():
+        session.execute(table.update().where(table.c.id == bindparam('record_id'))
+                        .values(**{name: bindparam(f'b_{name}') for name in fields}), params)
+    record_changes(session.connection(),
+                   [('maintenance_records', params['record_id'], 'update')
+                    for group in groups.values() for params in group])
+
+    for result in results:
+        if result['status'] != 'duplicate':
+            continue
+        if result['client_id'] not in stored:
+            result.update(status='error', error='Record not found')
+        else:
+            result['status'] = 'updated' if result['client_id'] in changed else 'unchanged'
+    return results
@@ -1,28 +1,319 @@
 """
-Excel Import Tool for Maintenance Tracker
+Import engine for the Maintenance Tracker (sites, machines and parts).
 
-This script provides functionality to import maintenance data from Excel files
-into the Maintenance Tracker database.
+This is the one import implementation; ``import_excel.import_excel`` and
+the ``/import_excel`` upload route both go through it.
+
+Files are read through a pluggable source (.xlsx via openpyxl read-only
+mode, legacy .xls, chunked CSV, or JSON), always in batches of
+``batch_size`` rows. Existing sites, machines and parts are loaded into
+lookup frames once per import; each batch is validated and resolved against
+them with pandas merges (``plan_*_frame``, shared with the dry run) and
+written with one multi-row insert per table (``import_*_frame``). Import
+time is therefore dominated by parsing the file rather than by per-row
+database round trips.
+
+``import_data`` commits once at the end. ``import_streaming`` (or an
+``ImportJob`` via ``run_import_job``) commits after every batch together
+with the job's progress, so an interrupted job resumes after its last
+committed batch. A job is claimed atomically before it runs, and jobs
+orphaned by a dead worker are returned to 'failed' by
+``reap_stale_import_jobs``.
+
+Usage:
+    python excel_importer.py data.xlsx [--batch-size 2000]
+    python excel_importer.py --resume <job_id>
+    python excel_importer.py --reap-stale
+    python excel_importer.py data.xlsx --dry-run
 """
 
 import pandas as pd
-import numpy as np
 import os
+import sys
+import json
+import argparse
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, update
 from app import db, Site, Machine, Part, User, app
+from models import ImportJob
+from maintenance_schedule import normalize_unit, nominal_days_many, compute_next_many
+from change_log import record_changes
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('excel_importer')
 
+
+SITE_REQUIRED = ['name', 'location']
+MACHINE_REQUIRED = ['name', 'site_name']
+PART_REQUIRED = ['name', 'machine_name', 'site_name', 'maintenance_frequency']
+
+# Attributes compared against existing rows to detect changes (dry run)
+SITE_COMPARED = ['location', 'contact_email']
+MACHINE_COMPARED = ['model', 'machine_number', 'serial_number']
+PART_COMPARED = ['description', 'maintenance_frequency', 'maintenance_unit']
+
+# Columns of the in-memory lookup frames; db_* hold the stored values
+LOOKUP_COLUMNS = {
+    'sites': ['site_name', 'site_id'] + [f'db_{col}' for col in SITE_COMPARED],
+    'machines': ['site_id', 'machine_name', 'machine_id'] + [f'db_{col}' for col in MACHINE_COMPARED],
+    'parts': ['machine_id', 'part_name', 'part_id'] + [f'db_{col}' for col in PART_COMPARED],
+}
+
+# Identifying columns shown in dry-run samples
+DIFF_KEYS = {
+    'sites': ['name'],
+    'machines': ['site_name', 'name'],
+    'parts': ['site_name', 'machine_name', 'name'],
+}
+
+# Sheets are imported in this order so foreign keys resolve
+SHEET_ORDER = ('Sites', 'Machines', 'Parts')
+STREAM_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 2000))
+# A running job whose row has not changed for this long is taken to be orphaned
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', 900))
+# Data problems kept in stats['messages'] (the rest are only logged)
+MAX_MESSAGES = 50
+# Cell values read as True in boolean columns (case-insensitive); anything else is False
+TRUE_VALUES = {'true', '1', '1.0', 'yes', 'y'}
+
+
+def clean_frame(df):
+    """Lower-case/strip column names and strip whitespace from string cells."""
+    df = df.copy()
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda value: value.strip() if isinstance(value, str) else value)
+    return df
+
+
+def require_columns(df, required, sheet):
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise ValueError(f"{sheet} sheet missing required columns: {', '.join(missing)}")
+
+
+class ImportCancelled(Exception):
+    """Raised between batches when an import job has been cancelled."""
+
+
+def detect_sheet(columns):
+    """Guess which sheet a single-table file (CSV) holds from its header."""
+    columns = {str(col).strip().lower() for col in columns}
+    if set(PART_REQUIRED) <= columns:
+        return 'Parts'
+    if set(MACHINE_REQUIRED) <= columns:
+        return 'Machines'
+    if set(SITE_REQUIRED) <= columns:
+        return 'Sites'
+    raise ValueError(f"Cannot tell whether file holds sites, machines or parts from columns: {', '.join(sorted(columns))}")
+
+
+def _optional(df, column, default=None):
+    """Column values with NaN replaced by ``default`` (or all ``default`` if the column is absent)."""
+    if column not in df.columns:
+        return pd.Series([default] * len(df), index=df.index, dtype=object)
+    return df[column].astype(object).where(df[column].notna(), default)
+
+
+def _flags(values, default=True):
+    """Boolean column from spreadsheet/CSV/JSON cells ('false', '0' and 'no' are False; blanks are ``default``)."""
+    def flag(value):
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return default
+        text = str(value).strip().lower()
+        return default if text == '' else text in TRUE_VALUES
+    return values.map(flag).astype(bool)
+
+
+def _normalise(value):
+    """Comparable form of a cell or column value (7 == 7.0 == '7')."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _differs(df, file_columns, compared):
+    """Rows where a value given in the file differs from the stored one."""
+    mask = pd.Series(False, index=df.index)
+    for col in compared:
+        if col not in file_columns or f'db_{col}' not in df.columns:
+            continue
+        given = df[col].map(_normalise)
+        stored = df[f'db_{col}'].map(_normalise)
+        mask |= given.notna() & (given != stored)
+    return mask
+
+
+def _sample(df, columns, limit):
+    if limit <= 0 or df.empty:
+        return []
+    return _records(df.head(limit), columns)
+
+
+def _sample_changes(df, kind, limit):
+    """Key columns plus {field: [stored, file]} for changed rows."""
+    if limit <= 0 or df.empty:
+        return []
+    compared = {'sites': SITE_COMPARED, 'machines': MACHINE_COMPARED, 'parts': PART_COMPARED}[kind]
+    samples = []
+    for row in _records(df.head(limit), DIFF_KEYS[kind] + [c for c in compared if c in df.columns]
+                                         + [f'db_{c}' for c in compared]):
+        changes = {col: [row[f'db_{col}'], row[col]] for col in compared
+                   if col in row and _normalise(row[col]) is not None
+                   and _normalise(row[col]) != _normalise(row[f'db_{col}'])}
+        samples.append({**{key: row[key] for key in DIFF_KEYS[kind]}, 'changes': changes})
+    return samples
+
+
+def _records(df, columns):
+    """DataFrame -> list of dicts for executemany, with NaN/NaT as None."""
+    out = df[columns].astype(object).where(df[columns].notna(), None)
+    return out.to_dict('records')
+
+
+# --- Sources ---------------------------------------------------------------
+#
+# A source yields raw DataFrames of at most ``batch_size`` rows per sheet,
+# together with how many data rows each batch consumed (blank rows included)
+# so a resumed import can skip exactly what was already committed.
+
+class ImportSource:
+    """Base class for import file formats."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def sheets(self):
+        """Sheets present, in import order."""
+        raise NotImplementedError
+
+    def iter_batches(self, sheet, batch_size, skip_rows=0):
+        """Yield ``(frame, rows_consumed)`` for ``sheet``."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _slice(frame, batch_size, skip_rows):
+        frame = frame.iloc[skip_rows:]
+        for start in range(0, len(frame), batch_size):
+            chunk = frame.iloc[start:start + batch_size]
+            yield chunk, len(chunk)
+
+
+class XlsxSource(ImportSource):
+    """.xlsx read row by row with openpyxl in read-only mode."""
+
+    def sheets(self):
+        from openpyxl import load_workbook
+        workbook = load_workbook(self.path, read_only=True)
+        try:
+            return [sheet for sheet in SHEET_ORDER if sheet in workbook.sheetnames]
+        finally:
+            workbook.close()
+
+    def iter_batches(self, sheet, batch_size, skip_rows=0):
+        from openpyxl import load_workbook
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            rows = workbook[sheet].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = ['' if col is None else str(col) for col in header]
+            width = len(columns)
+            batch = []
+            for index, row in enumerate(rows):
+                if index < skip_rows:
+                    continue
+                batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if len(batch) >= batch_size:
+                    yield pd.DataFrame(batch, columns=columns), len(batch)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns), len(batch)
+        finally:
+            workbook.close()
+
+
+class XlsSource(ImportSource):
+    """Legacy .xls; cannot be read row by row, so each sheet is loaded whole."""
+
+    def sheets(self):
+        return [sheet for sheet in SHEET_ORDER if sheet in pd.ExcelFile(self.path).sheet_names]
+
+    def iter_batches(self, sheet, batch_size, skip_rows=0):
+        return self._slice(pd.read_excel(self.path, sheet_name=sheet), batch_size, skip_rows)
+
+
+class CsvSource(ImportSource):
+    """One table per file (sites, machines or parts, detected from the header), read in chunks."""
+
+    def sheets(self):
+        return [detect_sheet(pd.read_csv(self.path, nrows=0).columns)]
+
+    def iter_batches(self, sheet, batch_size, skip_rows=0):
+        for chunk in pd.read_csv(self.path, chunksize=batch_size, skip_blank_lines=False):
+            if skip_rows >= len(chunk):
+                skip_rows -= len(chunk)
+                continue
+            yield chunk.iloc[skip_rows:], len(chunk) - skip_rows
+            skip_rows = 0
+
+
+class JsonSource(ImportSource):
+    """JSON: ``{"Sites": [...], "Machines": [...], "Parts": [...]}`` or a single list of records.
+
+    The document is parsed whole (the standard json module cannot stream),
+    then written in batches like the other sources.
+    """
+
+    def _load(self):
+        if not hasattr(self, '_data'):
+            with open(self.path) as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {detect_sheet(data[0].keys()) if data else 'Sites': data}
+            self._data = {str(key).strip().capitalize(): value for key, value in data.items()}
+        return self._data
+
+    def sheets(self):
+        return [sheet for sheet in SHEET_ORDER if sheet in self._load()]
+
+    def iter_batches(self, sheet, batch_size, skip_rows=0):
+        return self._slice(pd.DataFrame(self._load()[sheet]), batch_size, skip_rows)
+
+
+SOURCES = {
+    '.xlsx': XlsxSource,
+    '.xlsm': XlsxSource,
+    '.xls': XlsSource,
+    '.csv': CsvSource,
+    '.json': JsonSource,
+}
+
+
+def open_source(path):
+    """Return the ImportSource for ``path`` based on its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SOURCES:
+        raise ValueError(f"Unsupported import file type '{extension}' (expected {', '.join(sorted(SOURCES))})")
+    return SOURCES[extension](path)
+
+
 class ExcelImporter:
-    """Class to handle importing data from Excel files into the database."""
-    
-    def __init__(self, file_path):
-        """Initialize with the path to the Excel file."""
+    """Import sites, machines and parts from any ImportSource into the database."""
+
+    def __init__(self, file_path, batch_size=STREAM_BATCH_SIZE, source=None):
+        """Initialize with the path to the import file (.xlsx, .xls, .csv or .json)."""
         self.file_path = file_path
+        self.batch_size = batch_size
+        self.source = source or open_source(file_path)
+        self.rows_processed = 0
         self.stats = {
             'sites_added': 0,
             'sites_skipped': 0,
@@ -31,237 +322,507 @@ class ExcelImporter:
             'parts_added': 0,
             'parts_skipped': 0,
             'errors': 0,
+            'messages': [],
         }
-    
+        # Lookup frames (see LOOKUP_COLUMNS), loaded once per import and
+        # extended as rows are inserted
+        self._sites = None
+        self._machines = None
+        self._parts = None
+        self._next_planned_id = -1
+
     def validate_file(self):
-        """Validate that the Excel file exists and is readable."""
+        """Validate that the file exists and its format can be read."""
         if not os.path.exists(self.file_path):
-            raise FileNotFoundError(f"Excel file not found: {self.file_path}")
-        
-        # Check if pandas can read the file
+            raise FileNotFoundError(f"Import file not found: {self.file_path}")
         try:
-            # Just read the sheet names to validate
-            pd.ExcelFile(self.file_path).sheet_names
+            self.source.sheets()
             return True
         except Exception as e:
-            raise ValueError(f"Error reading Excel file: {str(e)}")
-    
+            raise ValueError(f"Error reading import file: {str(e)}")
+
     def import_data(self):
-        """Main method to import data from Excel into the database."""
+        """Import the whole file in one transaction (committed at the end)."""
+        self.validate_file()
         try:
-            self.validate_file()
-            excel_file = pd.ExcelFile(self.file_path)
-            
-            # Process based on available sheets
-            sheet_names = excel_file.sheet_names
-            
-            # First, import sites if the sheet exists
-            if 'Sites' in sheet_names:
-                self._import_sites(excel_file)
-            
-            # Next, import machines if the sheet exists
-            if 'Machines' in sheet_names:
-                self._import_machines(excel_file)
-                
-            # Finally, import parts and maintenance schedules
-            if 'Parts' in sheet_names:
-                self._import_parts(excel_file)
-            
-            # Commit all changes to the database
+            self._run(commit_batches=False)
             db.session.commit()
             return self.stats
-            
         except Exception as e:
             db.session.rollback()
             logger.error(f"Import failed: {str(e)}")
             self.stats['errors'] += 1
             raise
-    
-    def _import_sites(self, excel_file):
-        """Import sites from the Sites sheet."""
-        logger.info("Importing sites...")
-        
-        # Read the Sites sheet
-        df = excel_file.parse('Sites')
-        
-        # Clean column names and data
-        df.columns = df.columns.str.strip().str.lower()
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].str.strip()
-        
-        # Required columns
-        required_cols = ['name', 'location']
-        if not all(col in df.columns for col in required_cols):
-            missing = [col for col in required_cols if col not in df.columns]
-            raise ValueError(f"Sites sheet missing required columns: {', '.join(missing)}")
-        
-        # Process each row
-        for _, row in df.iterrows():
-            try:
-                # Check if site already exists
-                existing_site = Site.query.filter_by(name=row['name']).first()
-                if existing_site:
-                    logger.info(f"Site already exists: {row['name']}")
-                    self.stats['sites_skipped'] += 1
-                    continue
-                
-                # Create new site
-                site = Site(
-                    name=row['name'],
-                    location=row['location']
-                )
-                
-                # Optional fields
-                if 'contact_email' in row and not pd.isna(row['contact_email']):
-                    site.contact_email = row['contact_email']
-                
-                if 'enable_notifications' in row:
-                    site.enable_notifications = bool(row['enable_notifications'])
-                
-                if 'notification_threshold' in row and not pd.isna(row['notification_threshold']):
-                    site.notification_threshold = int(row['notification_threshold'])
-                
-                db.session.add(site)
-                self.stats['sites_added'] += 1
-                logger.info(f"Added site: {site.name}")
-                
-            except Exception as e:
-                logger.error(f"Error processing site {row['name']}: {str(e)}")
-                self.stats['errors'] += 1
-    
-    def _import_machines(self, excel_file):
-        """Import machines from the Machines sheet."""
-        logger.info("Importing machines...")
-        
-        # Read the Machines sheet
-        df = excel_file.parse('Machines')
-        
-        # Clean column names and data
-        df.columns = df.columns.str.strip().str.lower()
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].str.strip()
-        
-        # Required columns
-        required_cols = ['name', 'site_name']
-        if not all(col in df.columns for col in required_cols):
-            missing = [col for col in required_cols if col not in df.columns]
-            raise ValueError(f"Machines sheet missing required columns: {', '.join(missing)}")
-        
-        # Process each row
-        for _, row in df.iterrows():
-            try:
-                # Find the site
-                site = Site.query.filter_by(name=row['site_name']).first()
-                if not site:
-                    logger.warning(f"Site not found for machine: {row['name']} (site: {row['site_name']})")
-                    self.stats['machines_skipped'] += 1
-                    continue
-                
-                # Check if machine already exists
-                existing_machine = Machine.query.filter_by(name=row['name'], site_id=site.id).first()
-                if existing_machine:
-                    logger.info(f"Machine already exists: {row['name']} at site {site.name}")
-                    self.stats['machines_skipped'] += 1
-                    continue
-                
-                # Create new machine
-                machine = Machine(
-                    name=row['name'],
-                    site_id=site.id
-                )
-                
-                # Optional fields
-                if 'model' in row and not pd.isna(row['model']):
-                    machine.model = row['model']
-                
-                db.session.add(machine)
-                self.stats['machines_added'] += 1
-                logger.info(f"Added machine: {machine.name} to site {site.name}")
-                
-            except Exception as e:
-                logger.error(f"Error processing machine {row.get('name', 'unknown')}: {str(e)}")
-                self.stats['errors'] += 1
-    
-    def _import_parts(self, excel_file):
-        """Import parts from the Parts sheet."""
-        logger.info("Importing parts...")
-        
-        # Read the Parts sheet
-        df = excel_file.parse('Parts')
-        
-        # Clean column names and data
-        df.columns = df.columns.str.strip().str.lower()
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].str.strip()
-        
-        # Required columns
-        required_cols = ['name', 'machine_name', 'site_name', 'maintenance_frequency']
-        if not all(col in df.columns for col in required_cols):
-            missing = [col for col in required_cols if col not in df.columns]
-            raise ValueError(f"Parts sheet missing required columns: {', '.join(missing)}")
-        
-        # Process each row
-        for _, row in df.iterrows():
-            try:
-                # Find the site
-                site = Site.query.filter_by(name=row['site_name']).first()
-                if not site:
-                    logger.warning(f"Site not found for part: {row['name']} (site: {row['site_name']})")
-                    self.stats['parts_skipped'] += 1
-                    continue
-                
-                # Find the machine
-                machine = Machine.query.filter_by(name=row['machine_name'], site_id=site.id).first()
-                if not machine:
-                    logger.warning(f"Machine not found for part: {row['name']} (machine: {row['machine_name']})")
-                    self.stats['parts_skipped'] += 1
-                    continue
-                
-                # Check if part already exists
-                existing_part = Part.query.filter_by(name=row['name'], machine_id=machine.id).first()
-                if existing_part:
-                    logger.info(f"Part already exists: {row['name']} on machine {machine.name}")
-                    self.stats['parts_skipped'] += 1
+
+    def import_streaming(self, job=None, progress=None):
+        """Import sheet by sheet in batches, committing after every batch.
+
+        When ``job`` (an ImportJob) is given its progress is saved with each
+        batch and the import resumes from ``job.current_sheet`` /
+        ``job.rows_processed``. ``progress(sheet, rows_done, stats)`` is called
+        after every commit. If the job's status is set to 'cancelling'
+        (e.g. by another process) ImportCancelled is raised before the next
+        batch; batches already committed are kept.
+        """
+        try:
+            return self._run(job=job, progress=progress, commit_batches=True)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def iter_batches(self, sheet, skip_rows=0):
+        """Yield cleaned ``(frame, rows_consumed)`` batches of ``sheet`` from the source."""
+        for frame, consumed in self.source.iter_batches(sheet, self.batch_size, skip_rows):
+            yield clean_frame(frame.dropna(how='all')), consumed
+
+    def sheets(self):
+        return self.source.sheets()
+
+    def _run(self, job=None, progress=None, commit_batches=True):
+        """The single write path: every batch of every sheet goes through here."""
+        handlers = {
+            'Sites': self.import_sites_frame,
+            'Machines': self.import_machines_frame,
+            'Parts': self.import_parts_frame,
+        }
+        sheets = self.sheets()
+        resume_sheet, resume_row = None, 0
+        if job is not None:
+            self.stats.update(job.stats or {})
+            self.rows_processed = job.total_rows_processed or 0
+            if job.current_sheet in sheets:
+                resume_sheet, resume_row = job.current_sheet, job.rows_processed or 0
+                sheets = sheets[sheets.index(resume_sheet):]
+
+        for sheet in sheets:
+            logger.info(f"Importing {sheet.lower()}...")
+            done = resume_row if sheet == resume_sheet else 0
+            for frame, consumed in self.iter_batches(sheet, skip_rows=done):
+                if job is not None and self._cancel_requested(job):
+                    raise ImportCancelled(f"Import job {job.id} cancelled")
+                if not frame.empty:
+                    handlers[sheet](frame)
+                done += consumed
+                self.rows_processed += consumed
+                if not commit_batches:
                     continue
-                
-                # Process maintenance parameters
-                maintenance_frequency = int(row['maintenance_frequency'])
-                
-                # Handle last maintenance date if provided
-                last_maintenance = datetime.utcnow()
-                if 'last_maintenance' in row and not pd.isna(row['last_maintenance']):
-                    if isinstance(row['last_maintenance'], str):
-                        last_maintenance = datetime.strptime(row['last_maintenance'], '%Y-%m-%d')
-                    else:
-                        last_maintenance = row['last_maintenance']
-                
-                # Create new part
-                part = Part(
-                    name=row['name'],
-                    machine_id=machine.id,
-                    maintenance_frequency=maintenance_frequency,
-                    last_maintenance=last_maintenance
-                )
-                
-                # Optional fields
-                if 'description' in row and not pd.isna(row['description']):
-                    part.description = row['description']
-                
-                # Calculate next maintenance date
-                part.update_next_maintenance()
-                
-                db.session.add(part)
-                self.stats['parts_added'] += 1
-                logger.info(f"Added part: {part.name} to machine {machine.name}")
-                
-            except Exception as e:
-                logger.error(f"Error processing part {row.get('name', 'unknown')}: {str(e)}")
-                self.stats['errors'] += 1
+                if job is not None:
+                    job.current_sheet = sheet
+                    job.rows_processed = done
+                    job.total_rows_processed = self.rows_processed
+                    job.stats = dict(self.stats)
+                db.session.commit()
+                logger.info(f"{sheet}: {done} rows committed")
+                if progress:
+                    progress(sheet, done, self.stats)
+        return self.stats
+
+    def _warn(self, message):
+        """Log a data problem and keep it (bounded) in stats['messages']."""
+        logger.warning(message)
+        if len(self.stats['messages']) < MAX_MESSAGES:
+            self.stats['messages'].append(message)
+
+    @staticmethod
+    def _cancel_requested(job):
+        status = db.session.execute(select(ImportJob.status).where(ImportJob.id == job.id)).scalar()
+        return status == 'cancelling'
+
+    # --- Lookup maps -------------------------------------------------------
+
+    @staticmethod
+    def _lookup_query(kind):
+        """Select for the key columns (and compared attributes) of one lookup frame."""
+        if kind == 'sites':
+            return select(Site.name, Site.id, Site.location, Site.contact_email)
+        if kind == 'machines':
+            return select(Machine.site_id, Machine.name, Machine.id, Machine.model,
+                          Machine.machine_number, Machine.serial_number)
+        return select(Part.machine_id, Part.name, Part.id, Part.description,
+                      Part.maintenance_frequency, Part.maintenance_unit)
+
+    def _lookup_frame(self, kind, stmt=None):
+        rows = db.session.execute(stmt if stmt is not None else self._lookup_query(kind)).all()
+        return pd.DataFrame(rows, columns=LOOKUP_COLUMNS[kind])
+
+    def load_lookups(self):
+        """Load existing site, machine and part keys (three queries per import)."""
+        self._sites = self._lookup_frame('sites')
+        self._machines = self._lookup_frame('machines')
+        self._parts = self._lookup_frame('parts')
+
+    def _ensure_lookups(self):
+        if self._sites is None:
+            self.load_lookups()
+
+    def _extend_lookup(self, kind, frame):
+        frame = frame[LOOKUP_COLUMNS[kind]]
+        setattr(self, f'_{kind}', pd.concat([getattr(self, f'_{kind}'), frame], ignore_index=True))
+
+    def _planned_ids(self, count):
+        """Negative placeholder ids for rows a dry run would insert."""
+        start = self._next_planned_id
+        self._next_planned_id -= count
+        return list(range(start, start - count, -1))
+
+    # Planning: key matching shared by the real import and the dry run. Each
+    # returns (new, changed, errors): rows to insert, existing rows whose
+    # values differ from the file, and the number of invalid rows. Every
+    # other row is skipped (missing key, unresolved parent, duplicate or
+    # unchanged).
+
+    def plan_sites_frame(self, df):
+        require_columns(df, SITE_REQUIRED, 'Sites')
+        self._ensure_lookups()
+        file_columns = set(df.columns)
+        df = df[df['name'].notna()].copy()
+        df['name'] = df['name'].astype(str)
+        df = df.drop_duplicates('name').merge(self._sites, left_on='name', right_on='site_name', how='left')
+        exists = df['site_id'].notna()
+        changed = df[exists & _differs(df, file_columns, SITE_COMPARED)]
+
+        new = df[~exists].copy()
+        new = new.assign(
+            location=_optional(new, 'location'),
+            contact_email=_optional(new, 'contact_email'),
+            enable_notifications=_flags(_optional(new, 'enable_notifications')),
+            notification_threshold=pd.to_numeric(_optional(new, 'notification_threshold', 30), errors='coerce')
+                                     .fillna(30).astype(int),
+        )
+        return new, changed, 0
+
+    def plan_machines_frame(self, df):
+        require_columns(df, MACHINE_REQUIRED, 'Machines')
+        self._ensure_lookups()
+        file_columns = set(df.columns)
+        df = df[df['name'].notna() & df['site_name'].notna()].copy()
+        df['name'] = df['name'].astype(str)
+        df['site_name'] = df['site_name'].astype(str)
+
+        # Resolve site ids
+        df = df.merge(self._sites[['site_name', 'site_id']], on='site_name', how='left')
+        missing_site = df['site_id'].isna()
+        if missing_site.any():
+            self._warn(f"Site not found for {int(missing_site.sum())} machine(s): "
+                       f"{', '.join(df.loc[missing_site, 'site_name'].unique()[:10])}")
+        df = df[~missing_site].copy()
+        df['site_id'] = df['site_id'].astype(int)
+
+        # Match existing machines (name is unique per site)
+        df = df.drop_duplicates(['site_id', 'name']).merge(
+            self._machines, left_on=['site_id', 'name'], right_on=['site_id', 'machine_name'], how='left')
+        exists = df['machine_id'].notna()
+        changed = df[exists & _differs(df, file_columns, MACHINE_COMPARED)]
+
+        new = df[~exists].copy()
+        new = new.assign(
+            model=_optional(new, 'model'),
+            machine_number=_optional(new, 'machine_number'),
+            serial_number=_optional(new, 'serial_number'),
+        )
+        return new, changed, 0
+
+    def plan_parts_frame(self, df):
+        require_columns(df, PART_REQUIRED, 'Parts')
+        self._ensure_lookups()
+        file_columns = set(df.columns)
+        df = df[df['name'].notna() & df['machine_name'].notna() & df['site_name'].notna()].copy()
+        for col in ('name', 'machine_name', 'site_name'):
+            df[col] = df[col].astype(str)
+
+        # Resolve site, then machine within site
+        df = df.merge(self._sites[['site_name', 'site_id']], on='site_name', how='left')
+        df = df.merge(self._machines[['site_id', 'machine_name', 'machine_id']],
+                      on=['site_id', 'machine_name'], how='left')
+        unresolved = df['machine_id'].isna()
+        if unresolved.any():
+            self._warn(f"Site or machine not found for {int(unresolved.sum())} part(s): "
+                       f"{', '.join(df.loc[unresolved, 'machine_name'].unique()[:10])}")
+        df = df[~unresolved].copy()
+        df['machine_id'] = df['machine_id'].astype(int)
+
+        # Maintenance schedule, computed column-wise
+        frequency = pd.to_numeric(df['maintenance_frequency'], errors='coerce')
+        invalid = frequency.isna()
+        if invalid.any():
+            self._warn(f"Invalid maintenance_frequency for {int(invalid.sum())} part(s): "
+                       f"{', '.join(df.loc[invalid, 'name'].unique()[:10])}")
+        df = df[~invalid].copy()
+        df['maintenance_frequency'] = frequency[~invalid].astype(int)
+        df['maintenance_unit'] = _optional(df, 'maintenance_unit', 'day').map(normalize_unit)
+        df['maintenance_days'] = nominal_days_many(df)
+
+        # Match existing parts (name is unique per machine)
+        df = df.drop_duplicates(['machine_id', 'name']).merge(
+            self._parts, left_on=['machine_id', 'name'], right_on=['machine_id', 'part_name'], how='left')
+        exists = df['part_id'].notna()
+        changed = df[exists & _differs(df, file_columns, PART_COMPARED)]
+
+        new = df[~exists].copy()
+        now = datetime.utcnow()
+        last = pd.to_datetime(_optional(new, 'last_maintenance'), errors='coerce')
+        new['last_maintenance'] = last.fillna(pd.Timestamp(now))
+        new['next_maintenance'] = compute_next_many(new)
+        new['description'] = _optional(new, 'description')
+        return new, changed, int(invalid.sum())
+
+    # Writing: insert the planned new rows and extend the lookups with their ids
+
+    def import_sites_frame(self, df):
+        """Insert the sites in a cleaned frame that do not exist yet."""
+        new, _, errors = self.plan_sites_frame(df)
+        self._count('sites', len(df), len(new), errors)
+        if new.empty:
+            return
+        self._insert('sites', Site, _records(new, ['name', 'location', 'contact_email',
+                                                    'enable_notifications', 'notification_threshold']))
+        logger.info(f"Added {len(new)} sites")
+
+    def import_machines_frame(self, df):
+        """Insert the machines in a cleaned frame whose site exists and that do not exist yet."""
+        new, _, errors = self.plan_machines_frame(df)
+        self._count('machines', len(df), len(new), errors)
+        if new.empty:
+            return
+        self._insert('machines', Machine, _records(new, ['name', 'site_id', 'model',
+                                                          'machine_number', 'serial_number']))
+        logger.info(f"Added {len(new)} machines")
+
+    def import_parts_frame(self, df):
+        """Insert the parts in a cleaned frame whose site/machine exist and that do not exist yet."""
+        new, _, errors = self.plan_parts_frame(df)
+        self._count('parts', len(df), len(new), errors)
+        if new.empty:
+            return
+        records = _records(new, ['name', 'description', 'machine_id', 'maintenance_frequency', 'maintenance_unit',
+                                 'maintenance_days', 'last_maintenance', 'next_maintenance'])
+        for record in records:
+            # pandas Timestamps -> datetime for the DB driver
+            record['last_maintenance'] = record['last_maintenance'].to_pydatetime()
+            record['next_maintenance'] = record['next_maintenance'].to_pydatetime()
+        self._insert('parts', Part, records)
+        logger.info(f"Added {len(new)} parts")
+
+    def _insert(self, kind, model, records):
+        """Insert ``records``, log them and add exactly the rows inserted to the ``kind`` lookup."""
+        stmt = insert(model).returning(*self._lookup_query(kind).selected_columns)
+        rows = db.session.execute(stmt, records).all()
+        record_changes(db.session.connection(), [(model.__tablename__, row.id, 'insert') for row in rows])
+        self._extend_lookup(kind, pd.DataFrame(rows, columns=LOOKUP_COLUMNS[kind]))
+
+    def _count(self, kind, total, added, errors):
+        self.stats[f'{kind}_added'] += added
+        self.stats[f'{kind}_skipped'] += total - added - errors
+        self.stats['errors'] += errors
+
+    # --- Dry run -----------------------------------------------------------
+
+    def dry_run(self, sample_size=10):
+        """Work out what importing the file would change, without writing.
+
+        Uses the same key matching as the real import (three lookup queries,
+        then pandas merges; rows a real import would insert get placeholder
+        ids so later sheets resolve against them). Returns a dict per sheet
+        with ``insert``/``update``/``skip``/``errors`` counts and a sample of
+        the rows behind each. ``update`` counts existing rows whose values
+        differ from the file; a real import keeps the existing values and
+        reports those rows as skipped.
+        """
+        planners = {
+            'Sites': ('sites', self.plan_sites_frame),
+            'Machines': ('machines', self.plan_machines_frame),
+            'Parts': ('parts', self.plan_parts_frame),
+        }
+        diff = {}
+        self._next_planned_id = -1
+        try:
+            for sheet in self.sheets():
+                kind, plan = planners[sheet]
+                summary = diff.setdefault(kind, {'insert': 0, 'update': 0, 'skip': 0, 'errors': 0,
+                                                 'insert_sample': [], 'update_sample': []})
+                for frame, _ in self.iter_batches(sheet):
+                    if frame.empty:
+                        continue
+                    new, changed, errors = plan(frame)
+                    summary['insert'] += len(new)
+                    summary['update'] += len(changed)
+                    summary['errors'] += errors
+                    summary['skip'] += len(frame) - len(new) - len(changed) - errors
+                    summary['insert_sample'] += _sample(new, DIFF_KEYS[kind], sample_size - len(summary['insert_sample']))
+                    summary['update_sample'] += _sample_changes(changed, kind, sample_size - len(summary['update_sample']))
+                    self._extend_lookup(kind, self._planned_rows(kind, new))
+        finally:
+            # Nothing was written; make sure the read transaction is closed
+            db.session.rollback()
+        return diff
+
+    def _planned_rows(self, kind, new):
+        """Lookup rows for planned inserts, with placeholder ids."""
+        if kind == 'sites':
+            return new.assign(site_name=new['name'], site_id=self._planned_ids(len(new)),
+                              **{f'db_{col}': new[col] for col in SITE_COMPARED})
+        if kind == 'machines':
+            return new.assign(machine_name=new['name'], machine_id=self._planned_ids(len(new)),
+                              **{f'db_{col}': new[col] for col in MACHINE_COMPARED})
+        return new.assign(part_name=new['name'], part_id=0, **{f'db_{col}': new[col] for col in PART_COMPARED})
+
 
 def import_excel(file_path):
-    """Helper function to import data from an Excel file."""
+    """Import a file in one transaction and return the stats dict."""
     importer = ExcelImporter(file_path)
     return importer.import_data()
+
+
+def create_import_job(file_path, filename=None, user_id=None, batch_size=STREAM_BATCH_SIZE):
+    """Record a pending streaming import of ``file_path`` and return the job."""
+    job = ImportJob(file_path=file_path, filename=filename or os.path.basename(file_path),
+                    created_by=user_id, batch_size=batch_size, status='pending', stats={})
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_import_job(job_id, progress=None):
+    """Run (or resume) an ImportJob and return it.
+
+    Only a pending or failed job is run: it is claimed with a conditional
+    UPDATE, so of two callers racing for the same job one runs it and the
+    other gets it back unchanged. Completed, cancelled and running jobs are
+    returned unchanged (see ``reap_stale_import_jobs`` for running jobs
+    whose process died). On failure the job is marked 'failed' with the
+    error; its committed progress is kept so it can be resumed with another
+    call.
+    """
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        raise ValueError(f"Import job not found: {job_id}")
+    if job.status == 'cancelling':
+        # Cancelled before a worker picked it up
+        return _finish_job(job_id, 'cancelled')
+    if not _claim_job(job_id):
+        db.session.refresh(job)
+        logger.info(f"Import job {job_id} not run: {job.status}")
+        return job
+    job = db.session.get(ImportJob, job_id)
+
+    importer = ExcelImporter(job.file_path, batch_size=job.batch_size or STREAM_BATCH_SIZE)
+    try:
+        importer.import_streaming(job=job, progress=progress)
+    except ImportCancelled:
+        logger.info(f"Import job {job_id} cancelled")
+        return _finish_job(job_id, 'cancelled')
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {str(e)}")
+        return _finish_job(job_id, 'failed', error=str(e))
+
+    job = _finish_job(job_id, 'completed')
+    logger.info(f"Import job {job.id} completed: {job.stats}")
+    return job
+
+
+def _claim_job(job_id):
+    """Atomically move a pending or failed job to 'running'; False if another caller has it."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status.in_(('pending', 'failed')))
+        .values(status='running', error=None, started_at=db.func.coalesce(ImportJob.started_at, now),
+                updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+
+def reap_stale_import_jobs(max_age=None):
+    """Mark running jobs with no progress for ``max_age`` seconds as failed, so they can be resumed.
+
+    A running job's row is updated with every committed batch; one that has
+    not changed for ``IMPORT_JOB_STALE_SECONDS`` was orphaned by a crashed or
+    restarted worker. Returns the ids of the jobs reaped.
+    """
+    max_age = IMPORT_JOB_STALE_SECONDS if max_age is None else max_age
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=max_age)
+    stale = db.session.execute(select(ImportJob.id).where(
+        ImportJob.status.in_(('running', 'cancelling')), ImportJob.updated_at < cutoff)).scalars().all()
+    for job_id in stale:
+        # Conditional again, in case the job made progress since the select
+        db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == 'running', ImportJob.updated_at < cutoff)
+            .values(status='failed', error=f'No progress for {max_age}s; worker presumed dead', updated_at=now)
+            .execution_options(synchronize_session=False))
+        db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == 'cancelling', ImportJob.updated_at < cutoff)
+            .values(status='cancelled', finished_at=now, updated_at=now)
+            .execution_options(synchronize_session=False))
+    db.session.commit()
+    if stale:
+        logger.warning(f"Reaped {len(stale)} stale import job(s): {', '.join(stale)}")
+    return stale
+
+
+def _finish_job(job_id, status, error=None):
+    job = db.session.get(ImportJob, job_id)
+    job.status = status
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def cancel_import_job(job_id):
+    """Ask a pending or running job to stop; returns the job (None if unknown).
+
+    The runner notices before its next batch, so rows already committed stay
+    imported.
+    """
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        return None
+    if job.status in ('pending', 'running', 'failed'):
+        job.status = 'cancelling' if job.status == 'running' else 'cancelled'
+        if job.status == 'cancelled':
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import sites, machines and parts into the maintenance database')
+    parser.add_argument('file', nargs='?', help='.xlsx, .xls, .csv or .json file to import')
+    parser.add_argument('--batch-size', type=int, default=STREAM_BATCH_SIZE)
+    parser.add_argument('--resume', metavar='JOB_ID', help='Resume an interrupted import job')
+    parser.add_argument('--dry-run', action='store_true', help='Print what would change without writing')
+    parser.add_argument('--reap-stale', action='store_true',
+                        help='Mark running jobs orphaned by a dead worker as failed (resumable)')
+    args = parser.parse_args(argv)
+    if not args.file and not args.resume and not args.reap_stale:
+        parser.error('a file, --resume JOB_ID or --reap-stale is required')
+
+    with app.app_context():
+        if args.reap_stale or args.resume:
+            reaped = reap_stale_import_jobs()
+            print(f"[IMPORT] Reaped {len(reaped)} stale job(s)")
+            if not args.file and not args.resume:
+                return 0
+        if args.dry_run:
+            diff = ExcelImporter(args.file, batch_size=args.batch_size).dry_run()
+            print(json.dumps(diff, indent=2, default=str))
+            return 0
+        if args.resume:
+            job_id = args.resume
+        else:
+            job_id = create_import_job(os.path.abspath(args.file), batch_size=args.batch_size).id
+            print(f"[IMPORT] Created job {job_id}")
+        job = run_import_job(job_id, progress=lambda sheet, done, stats: print(f"[IMPORT] {sheet}: {done} rows"))
+        print(f"[IMPORT] Job {job.id} {job.status}: {job.stats}")
+        if job.error:
+            print(f"[IMPORT] Error: {job.error}")
+        return 0 if job.status == 'completed' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -82,9 +82,12 @@ def fix_audit_task_machine_ids(session):
         session.rollback()
         return 0, 0
 
-def setup_enhanced_audit_history():
+def setup_enhanced_audit_history(fix_data=True):
     """
     Replace the audit_history_page route handler with an improved version.
+
+    Set fix_data=False to skip the machine ID data fix; app.py runs it once
+    from prepare_database() instead of on every import.
     """
     try:
         # Import at function level to avoid import errors
@@ -134,16 +137,17 @@ def setup_enhanced_audit_history():
         logger.info("Added calendar template functions")
         
         # First, fix any audit completions with missing machine IDs
-        with app.app_context():
-            try:
-                fixed_count, remaining_count = fix_audit_task_machine_ids(db.session)
-                if fixed_count > 0:
-                    logger.info(f"Fixed {fixed_count} audit completions with missing machine IDs")
-                if remaining_count > 0:
-                    logger.warning(f"{remaining_count} audit completions still have missing machine IDs")
-            except Exception as e:
-                logger.error(f"Error fixing audit machine IDs: {e}")
-                logger.error(traceback.format_exc())
+        if fix_data:
+            with app.app_context():
+                try:
+                    fixed_count, remaining_count = fix_audit_task_machine_ids(db.session)
+                    if fixed_count > 0:
+                        logger.info(f"Fixed {fixed_count} audit completions with missing machine IDs")
+                    if remaining_count > 0:
+                        logger.warning(f"{remaining_count} audit completions still have missing machine IDs")
+                except Exception as e:
+                    logger.error(f"Error fixing audit machine IDs: {e}")
+                    logger.error(traceback.format_exc())
                 
         # Define enhanced audit history page function
         @login_required
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic, production-scale fleet for local performance work.
+
+Creates N sites with machines, parts, maintenance history, audit tasks and
+a configurable number of days of daily audit completions. Rows are written
+with Core ``executemany`` inserts in batches, so a year of completions for a
+few hundred machines takes seconds rather than minutes. Data is
+deterministic for a given ``--seed``.
+
+Usage:
+    python generate_fleet_data.py --sites 20 --machines-per-site 25 --parts-per-machine 6
+"""
+
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from maintenance_schedule import UNITS, compute_next, interval as maintenance_interval, nominal_days
+from models import Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion, User, machine_audit_task
+
+AUDIT_INTERVALS = ['daily', 'daily', 'weekly', 'monthly']
+
+
+def _next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert_batches(conn, target, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        conn.execute(insert(target), rows[start:start + batch_size])
+
+
+def _sync_postgres_sequences(conn, tables):
+    """Explicit ids bypass PostgreSQL sequences; move them past the new rows."""
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def generate_fleet(conn, sites=10, machines_per_site=20, parts_per_machine=5, records_per_part=4,
+                   audit_tasks_per_site=3, audit_days=365, seed=42, id_base=None, user_id=None,
+                   batch_size=5000, now=None):
+    """Insert a synthetic fleet using ``conn`` and return row counts per table.
+
+    ``id_base`` forces all generated ids to start at that value (used by the
+    test suite so cleanup is a range delete); otherwise ids continue from the
+    current maximum of each table. Maintenance records are attributed to
+    ``user_id`` (default: the first user) and skipped if there are no users.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    today = now.date()
+
+    def base_for(model):
+        return id_base if id_base is not None else _next_id(conn, model)
+
+    if user_id is None:
+        user_id = conn.execute(select(User.id).order_by(User.id).limit(1)).scalar()
+
+    site_base, machine_base, part_base = base_for(Site), base_for(Machine), base_for(Part)
+    record_base, task_base, completion_base = base_for(MaintenanceRecord), base_for(AuditTask), base_for(AuditTaskCompletion)
+
+    site_rows, machine_rows, part_rows, record_rows = [], [], [], []
+    task_rows, link_rows, completion_rows = [], [], []
+
+    for s in range(sites):
+        site_id = site_base + s
+        site_rows.append({'id': site_id, 'name': f'Fleet Site {site_id}', 'location': f'Region {s % 5}',
+                          'notification_threshold': rng.choice([7, 14, 30]), 'enable_notifications': True,
+                          'created_at': now, 'updated_at': now})
+        site_machines = []
+        for m in range(machines_per_site):
+            machine_id = machine_base + len(machine_rows)
+            site_machines.append(machine_id)
+            machine_rows.append({'id': machine_id, 'name': f'Machine {site_id}-{m + 1}', 'model': f'M{rng.randint(100, 999)}',
+                                 'machine_number': f'MN-{machine_id}', 'serial_number': f'SN-{machine_id:08d}',
+                                 'site_id': site_id, 'created_at': now, 'updated_at': now})
+            for p in range(parts_per_machine):
+                part_id = part_base + len(part_rows)
+                unit = rng.choice(UNITS)
+                frequency = rng.randint(1, 3) if unit == 'year' else rng.randint(1, 12)
+                period = nominal_days(frequency, unit)
+                last = now - timedelta(days=rng.randint(0, min(period * 2, 720)))
+                part_rows.append({'id': part_id, 'name': f'Part {m + 1}-{p + 1}', 'description': 'Synthetic part',
+                                  'machine_id': machine_id, 'maintenance_frequency': frequency,
+                                  'maintenance_unit': unit, 'maintenance_days': period,
+                                  'last_maintenance': last, 'next_maintenance': compute_next(last, frequency, unit),
+                                  'created_at': now, 'updated_at': now})
+                if user_id is None:
+                    continue
+                for r in range(records_per_part):
+                    # Earlier services on the same calendar schedule
+                    record_date = last - maintenance_interval(frequency, unit) * r
+                    record_rows.append({'id': record_base + len(record_rows), 'part_id': part_id,
+                                        'machine_id': machine_id, 'user_id': user_id, 'date': record_date,
+                                        'comments': 'Synthetic maintenance', 'maintenance_type': 'scheduled',
+                                        'status': 'completed', 'client_id': f'fleet-{record_base + len(record_rows)}',
+                                        'created_at': record_date, 'updated_at': record_date})
+        for t in range(audit_tasks_per_site):
+            task_id = task_base + len(task_rows)
+            interval = AUDIT_INTERVALS[t % len(AUDIT_INTERVALS)]
+            step = {'daily': 1, 'weekly': 7, 'monthly': 30}[interval]
+            task_rows.append({'id': task_id, 'name': f'Audit {t + 1} @ site {site_id}', 'site_id': site_id,
+                              'interval': interval, 'color': f'hsl({int(t * 360 / max(audit_tasks_per_site, 1))}, 70%, 50%)',
+                              'created_at': now, 'updated_at': now})
+            for machine_id in site_machines:
+                link_rows.append({'audit_task_id': task_id, 'machine_id': machine_id})
+                for day in range(1, audit_days + 1, step):
+                    completed_on = today - timedelta(days=day)
+                    completed_at = datetime.combine(completed_on, datetime.min.time()) + timedelta(hours=rng.randint(6, 18))
+                    completion_rows.append({'id': completion_base + len(completion_rows), 'audit_task_id': task_id,
+                                            'machine_id': machine_id, 'date': completed_on, 'completed': True,
+                                            'completed_by': user_id, 'completed_at': completed_at,
+                                            'created_at': completed_at, 'updated_at': completed_at})
+
+    _insert_batches(conn, Site, site_rows, batch_size)
+    _insert_batches(conn, Machine, machine_rows, batch_size)
+    _insert_batches(conn, Part, part_rows, batch_size)
+    _insert_batches(conn, MaintenanceRecord, record_rows, batch_size)
+    _insert_batches(conn, AuditTask, task_rows, batch_size)
+    _insert_batches(conn, machine_audit_task, link_rows, batch_size)
+    _insert_batches(conn, AuditTaskCompletion, completion_rows, batch_size)
+    _sync_postgres_sequences(conn, ['sites', 'machines', 'parts', 'maintenance_records',
+                                    'audit_tasks', 'audit_task_completions'])
+    return {
+        'sites': len(site_rows),
+        'machines': len(machine_rows),
+        'parts': len(part_rows),
+        'maintenance_records': len(record_rows),
+        'audit_tasks': len(task_rows),
+        'audit_task_completions': len(completion_rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic AMRS fleet for performance testing')
+    parser.add_argument('--sites', type=int, default=10)
+    parser.add_argument('--machines-per-site', type=int, default=20)
+    parser.add_argument('--parts-per-machine', type=int, default=5)
+    parser.add_argument('--records-per-part', type=int, default=4)
+    parser.add_argument('--audit-tasks-per-site', type=int, default=3)
+    parser.add_argument('--audit-days', type=int, default=365, help='Days of audit completion history')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    from app import app, db
+    with app.app_context():
+        started = datetime.utcnow()
+        with db.engine.begin() as conn:
+            counts = generate_fleet(
+                conn, sites=args.sites, machines_per_site=args.machines_per_site,
+                parts_per_machine=args.parts_per_machine, records_per_part=args.records_per_part,
+                audit_tasks_per_site=args.audit_tasks_per_site, audit_days=args.audit_days,
+                seed=args.seed, batch_size=args.batch_size,
+            )
+        elapsed = (datetime.utcnow() - started).total_seconds()
+    for table, count in counts.items():
+        print(f"[FLEET] {table}: {count}")
+    print(f"[FLEET] Generated {sum(counts.values())} rows in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
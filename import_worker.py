@@ -0,0 +1,73 @@
+"""
+Background runner for spreadsheet/CSV import jobs.
+
+Uploads are recorded as ``ImportJob`` rows and handed to a small thread
+pool, so the request that accepted the file returns immediately instead of
+holding a gunicorn worker until the import finishes. Progress is read back
+from the job row (``/api/import/<job_id>``), which also works when the poll
+lands on a different worker process. Cancellation is signalled through the
+job's status and honoured between batches.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Guards creation of the per-app worker (and its thread pool)
+_worker_lock = threading.Lock()
+
+
+class ImportWorker:
+    """Run import jobs on a thread pool inside the application context."""
+
+    def __init__(self, app, max_workers=None):
+        self.app = app
+        max_workers = max_workers or int(os.environ.get('IMPORT_WORKERS', 1))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import-job')
+        self.futures = {}
+
+    def submit(self, job_id):
+        """Queue ``job_id`` and return its Future (result: final job status)."""
+        future = self.executor.submit(self._run, job_id)
+        self.futures[job_id] = future
+        future.add_done_callback(lambda _: self.futures.pop(job_id, None))
+        return future
+
+    def _run(self, job_id):
+        from app import db
+        from excel_importer import run_import_job
+        with self.app.app_context():
+            try:
+                job = run_import_job(job_id)
+                print(f"[IMPORT] Job {job_id} finished: {job.status}")
+                return job.status
+            except Exception as e:
+                logger.error(f"[IMPORT] Job {job_id} crashed: {e}")
+                raise
+            finally:
+                db.session.remove()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+def get_import_worker(app):
+    """Return the app's ImportWorker, creating it (and its threads) on first use.
+
+    On creation, jobs left running by a previous process are reaped so they
+    can be resumed.
+    """
+    worker = app.extensions.get('import_worker')
+    if worker is not None:
+        return worker
+    with _worker_lock:
+        worker = app.extensions.get('import_worker')
+        if worker is None:
+            from excel_importer import reap_stale_import_jobs
+            reap_stale_import_jobs()
+            worker = ImportWorker(app)
+            app.extensions['import_worker'] = worker
+    return worker
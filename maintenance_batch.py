@@ -0,0 +1,217 @@
+"""
+Record maintenance for many parts in one request.
+
+A PM visit services dozens of parts on a machine; ``record_batch`` takes the
+whole visit as a list of items - ``{"part_id": 12, "date": "2026-10-18",
+"notes": "...", "client_id": "..."}`` - and writes it with bulk statements:
+one SELECT for client ids already recorded, one for the parts, one multi-row INSERT for the MaintenanceRecords,
+one executemany UPDATE for the parts' last/next maintenance and one pass over
+the maintenance stats. The caller commits, so the visit lands in a single
+transaction.
+
+Items are validated one by one; invalid items (bad part id or date, a part
+outside the user's sites) are reported in the per-item results and skipped,
+the rest are recorded.
+
+Ingestion is idempotent on ``client_id`` (unique in ``maintenance_records``):
+desktop clients retry a batch with the same client ids, and records already
+stored are reported as duplicates instead of being inserted again. Items
+without a client_id get a fresh one.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from change_log import record_changes
+from maintenance_schedule import compute_next, interval
+from maintenance_stats import apply_services
+from models import Machine, Part, MaintenanceRecord
+
+# Upper bound on items per request
+MAX_BATCH_ITEMS = 500
+
+# Free-text item fields copied onto the MaintenanceRecord
+RECORD_FIELDS = ('maintenance_type', 'description', 'status', 'notes', 'comments', 'performed_by')
+
+
+def batch_items(payload):
+    """Items from a JSON body: ``{"items": [...]}`` or a bare list. Raises ValueError."""
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        raise ValueError('Expected a non-empty list of items')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f'At most {MAX_BATCH_ITEMS} items per batch')
+    return items
+
+
+def _parse_date(value, default):
+    if value in (None, ''):
+        return default
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_item(item, default_date):
+    if not isinstance(item, dict):
+        raise ValueError('Item must be an object')
+    try:
+        part_id = int(item.get('part_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Missing or invalid part_id')
+    try:
+        date = _parse_date(item.get('date'), default_date)
+    except ValueError:
+        raise ValueError('Invalid date, use YYYY-MM-DD or ISO 8601')
+    client_id = str(item.get('client_id') or '').strip() or str(uuid.uuid4())
+    if len(client_id) > 36:
+        raise ValueError('client_id is longer than 36 characters')
+    fields = {name: item.get(name) for name in RECORD_FIELDS if item.get(name) not in (None, '')}
+    return {'part_id': part_id, 'date': date, 'client_id': client_id, **fields}
+
+
+def _existing_records(session, client_ids):
+    """{client_id: record id} for the ``client_ids`` already recorded."""
+    if not client_ids:
+        return {}
+    return dict(session.execute(select(MaintenanceRecord.client_id, MaintenanceRecord.id)
+                                .where(MaintenanceRecord.client_id.in_(client_ids))).all())
+
+
+def _insert_new(session, params):
+    """Insert records, skipping client_ids that already exist; {client_id: id} of the rows inserted."""
+    records = MaintenanceRecord.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(records).on_conflict_do_nothing(index_elements=['client_id'])
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(records).on_conflict_do_nothing(index_elements=['client_id'])
+    else:
+        stmt = records.insert()
+    return {client_id: record_id for record_id, client_id in
+            session.execute(stmt.returning(records.c.id, records.c.client_id), params)}
+
+
+def record_batch(session, items, user, site_ids=None, default_date=None, performed_by=None):
+    """Record maintenance for ``items``; returns the per-item results in input order.
+
+    ``site_ids`` restricts the parts ``user`` may record against (None for
+    all sites). Items without a date use ``default_date`` (now), items
+    without ``performed_by`` use ``performed_by``. An item whose client_id
+    is already recorded (a resubmit, or a repeat within the batch) is
+    reported as ``duplicate`` with the existing record id and changes nothing.
+    """
+    default_date = default_date or datetime.utcnow()
+    results, valid, repeats, first = [], [], [], {}
+    for index, item in enumerate(items):
+        result = {'index': index, 'part_id': item.get('part_id') if isinstance(item, dict) else None,
+                  'client_id': item.get('client_id') if isinstance(item, dict) else None}
+        results.append(result)
+        try:
+            parsed = _parse_item(item, default_date)
+        except ValueError as e:
+            result.update(status='error', error=str(e))
+            continue
+        result.update(part_id=parsed['part_id'], client_id=parsed['client_id'])
+        if parsed['client_id'] in first:
+            repeats.append(result)
+            continue
+        first[parsed['client_id']] = result
+        valid.append((result, parsed))
+
+    # A replayed batch stops here: one SELECT, no writes
+    recorded = _existing_records(session, set(first))
+    valid = [(result, parsed) for result, parsed in valid if parsed['client_id'] not in recorded]
+
+    parts = {}
+    if valid:
+        query = (select(Part.id, Part.machine_id, Machine.site_id, Part.last_maintenance, Part.next_maintenance,
+                        Part.maintenance_frequency, Part.maintenance_unit)
+                 .join(Machine, Part.machine_id == Machine.id)
+                 .where(Part.id.in_({parsed['part_id'] for _, parsed in valid})))
+        if site_ids is not None:
+            query = query.where(Machine.site_id.in_(site_ids))
+        parts = {row.id: row for row in session.execute(query)}
+
+    rows = []
+    for result, parsed in valid:
+        part = parts.get(parsed['part_id'])
+        if part is None:
+            result.update(status='error', error='Part not found')
+            continue
+        rows.append((result, {'user_id': user.id, 'machine_id': part.machine_id, 'status': 'completed',
+                              'performed_by': performed_by, **parsed}))
+
+    inserted = {}
+    if rows:
+        columns = ('part_id', 'machine_id', 'user_id', 'date', 'client_id') + RECORD_FIELDS
+        inserted = _insert_new(session, [{name: row.get(name) for name in columns} for _, row in rows])
+        # Rows another request inserted between the SELECT and the INSERT
+        raced = [row['client_id'] for _, row in rows if row['client_id'] not in inserted]
+        if raced:
+            recorded.update(_existing_records(session, raced))
+            rows = [(result, row) for result, row in rows if row['client_id'] in inserted]
+    if rows:
+        next_due, moved = _reschedule(session, parts, [row for _, row in rows])
+        record_changes(session.connection(),
+                       [('maintenance_records', inserted[row['client_id']], 'insert') for _, row in rows]
+                       + [('parts', part_id, 'update') for part_id in moved])
+        for result, row in rows:
+            due = next_due[row['part_id']]
+            result.update(status='created', record_id=inserted[row['client_id']],
+                          next_maintenance=due.isoformat() if due else None)
+
+    for result in first.values():
+        if 'status' not in result:
+            result.update(status='duplicate', record_id=recorded.get(result['client_id']))
+    for result in repeats:
+        original = first[result['client_id']]
+        if original['status'] == 'error':
+            result.update(status='error', error=original['error'])
+        else:
+            result.update(status='duplicate', record_id=original['record_id'])
+    if rows:
+        print(f"[MAINTENANCE BATCH] Recorded {len(rows)} of {len(items)} items for user {user.id}")
+    return results
+
+
+def _reschedule(session, parts, rows):
+    """Move parts to their newest service in ``rows`` and fold the services into the stats.
+
+    Returns ({part_id: next_maintenance} for the parts touched, ids of the parts updated).
+    """
+    # Each part moves to its latest service in the batch, unless it already has a later one
+    latest = {}
+    for row in rows:
+        latest[row['part_id']] = max(latest.get(row['part_id'], row['date']), row['date'])
+    next_due = {part_id: parts[part_id].next_maintenance for part_id in latest}
+    changes = []
+    for part_id, date in latest.items():
+        part = parts[part_id]
+        if part.last_maintenance is None or date >= part.last_maintenance:
+            next_due[part_id] = compute_next(date, part.maintenance_frequency, part.maintenance_unit)
+            changes.append({'part_id': part_id, 'last': date, 'next': next_due[part_id]})
+    if changes:
+        table = Part.__table__
+        session.execute(table.update().where(table.c.id == bindparam('part_id'))
+                        .values(last_maintenance=bindparam('last'), next_maintenance=bindparam('next')), changes)
+
+    # On time against the due date before the visit, then the previous service plus the interval
+    services, due = [], {}
+    for row in sorted(rows, key=lambda row: (row['part_id'], row['date'])):
+        part = parts[row['part_id']]
+        part_due = due.get(part.id, part.next_maintenance)
+        services.append((part.id, part.machine_id, part.site_id, row['date'], part_due is None or row['date'] <= part_due))
+        due[part.id] = row['date'] + interval(part.maintenance_frequency, part.maintenance_unit)
+    apply_services(session.connection(), services)
+    return next_due, [change['part_id'] for change in changes]
+
+
+def summarize(results):
+    """(created, duplicate, failed) counts for ``record_batch`` results."""
+    statuses = [result.get('status') for result in results]
+    return statuses.count('created'), statuses.count('duplicate'), statuses.count('error')
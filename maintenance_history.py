@@ -0,0 +1,116 @@
+"""
+Paginated, filtered maintenance history.
+
+Records are paged with a keyset (``date``, ``id``) cursor instead of
+OFFSET, so fetching page 500 costs the same as page 1, and every filter
+maps to an indexed column (see ``MaintenanceRecord.__table_args__``).
+Site and machine filters go through the record's part, which is set on
+every record (``maintenance_records.machine_id`` is not).
+"""
+
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, tuple_
+
+from models import db, User, Site, Machine, Part, MaintenanceRecord
+
+HISTORY_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Query parameters accepted by parse_filters
+INT_FILTERS = ('site_id', 'machine_id', 'part_id')
+TEXT_FILTERS = ('maintenance_type', 'status')
+DATE_FILTERS = ('start_date', 'end_date')
+
+
+def parse_filters(args):
+    """Filters from request ``args``; raises ValueError on malformed values.
+
+    ``start_date``/``end_date`` are YYYY-MM-DD and both inclusive.
+    """
+    filters = {}
+    for name in INT_FILTERS:
+        if args.get(name):
+            filters[name] = int(args[name])
+    for name in TEXT_FILTERS:
+        if args.get(name):
+            filters[name] = args[name]
+    for name in DATE_FILTERS:
+        if args.get(name):
+            filters[name] = datetime.strptime(args[name], '%Y-%m-%d')
+    return filters
+
+
+def encode_cursor(record_date, record_id):
+    raw = f"{record_date.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(date, id) from an ``encode_cursor`` string; raises ValueError if invalid."""
+    try:
+        record_date, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(record_date), int(record_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def history_query(site_ids=None, filters=None):
+    """Newest-first history statement restricted to ``site_ids`` (None = all sites)."""
+    filters = filters or {}
+    stmt = (select(MaintenanceRecord.id, MaintenanceRecord.date, MaintenanceRecord.maintenance_type,
+                   MaintenanceRecord.status, MaintenanceRecord.description, MaintenanceRecord.comments,
+                   MaintenanceRecord.notes, MaintenanceRecord.performed_by, MaintenanceRecord.user_id,
+                   MaintenanceRecord.client_id, MaintenanceRecord.part_id, Part.name.label('part_name'),
+                   Part.machine_id, Machine.name.label('machine_name'), Machine.machine_number,
+                   Machine.serial_number, Machine.site_id, Site.name.label('site_name'))
+            .join(Part, MaintenanceRecord.part_id == Part.id)
+            .join(Machine, Part.machine_id == Machine.id)
+            .join(Site, Machine.site_id == Site.id)
+            .where(MaintenanceRecord.date.isnot(None))
+            .order_by(MaintenanceRecord.date.desc(), MaintenanceRecord.id.desc()))
+    if site_ids is not None:
+        stmt = stmt.where(Machine.site_id.in_(site_ids))
+    if 'site_id' in filters:
+        stmt = stmt.where(Machine.site_id == filters['site_id'])
+    if 'machine_id' in filters:
+        stmt = stmt.where(Part.machine_id == filters['machine_id'])
+    if 'part_id' in filters:
+        stmt = stmt.where(MaintenanceRecord.part_id == filters['part_id'])
+    if 'maintenance_type' in filters:
+        stmt = stmt.where(MaintenanceRecord.maintenance_type == filters['maintenance_type'])
+    if 'status' in filters:
+        stmt = stmt.where(MaintenanceRecord.status == filters['status'])
+    if 'start_date' in filters:
+        stmt = stmt.where(MaintenanceRecord.date >= filters['start_date'])
+    if 'end_date' in filters:
+        stmt = stmt.where(MaintenanceRecord.date < filters['end_date'] + timedelta(days=1))
+    return stmt
+
+
+def _record_dict(row):
+    record = dict(row._mapping)
+    record['date'] = row.date.isoformat()
+    return record
+
+
+def history_page(site_ids=None, filters=None, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of history as ``(records, next_cursor)``; ``next_cursor`` is None on the last page.
+
+    A single query: one row beyond ``limit`` is fetched to tell whether
+    another page exists.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    stmt = history_query(site_ids, filters)
+    if cursor:
+        stmt = stmt.where(tuple_(MaintenanceRecord.date, MaintenanceRecord.id) < decode_cursor(cursor))
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].date, rows[limit - 1].id) if len(rows) > limit else None
+    return [_record_dict(row) for row in rows[:limit]], next_cursor
+
+
+def page_users(records):
+    """Users of ``records`` without a performed_by name, keyed by id, in one query."""
+    user_ids = {record['user_id'] for record in records if not record['performed_by']}
+    return {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
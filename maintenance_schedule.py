@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Next-maintenance scheduling.
+
+A part is due ``maintenance_frequency`` x ``maintenance_unit`` (day, week,
+month or year) after its last service. Months and years are calendar
+months and years: a part serviced on 31 January every month is due on the
+last day of February, and a yearly part serviced on 29 February 2024 is
+due on 28 February 2025. ``maintenance_days`` keeps the nominal length in
+days (30 per month, 365 per year) for sorting and display only.
+
+``compute_next`` schedules one part, ``compute_next_many`` a whole frame of
+parts column-wise, and ``recompute_all`` (``flask recompute-next-maintenance``
+or ``python maintenance_schedule.py``) rewrites ``next_maintenance`` for every
+part in batched UPDATEs, e.g. after a frequency policy change.
+
+``status_case`` classifies parts as overdue, due soon or ok in SQL, so
+lists can be filtered by status in the query.
+"""
+
+import sys
+import argparse
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import DateTime, bindparam, case, literal, select, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+UNITS = ('day', 'week', 'month', 'year')
+DEFAULT_UNIT = 'day'
+
+# Nominal days per unit, stored in parts.maintenance_days
+NOMINAL_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+# Parts rescheduled per UPDATE batch by recompute_all
+RECOMPUTE_BATCH_SIZE = 5000
+
+
+def normalize_unit(unit):
+    """'Months', ' week ' -> 'month', 'week'; anything unknown -> 'day'."""
+    unit = str(unit or '').strip().lower().rstrip('s')
+    return unit if unit in UNITS else DEFAULT_UNIT
+
+
+def _frequency(frequency):
+    return int(frequency) if frequency else 1
+
+
+def interval(frequency, unit):
+    """Calendar interval for ``frequency`` x ``unit``."""
+    frequency, unit = _frequency(frequency), normalize_unit(unit)
+    return relativedelta(**{f'{unit}s': frequency})
+
+
+def nominal_days(frequency, unit):
+    return _frequency(frequency) * NOMINAL_DAYS[normalize_unit(unit)]
+
+
+def compute_next(last_maintenance, frequency, unit):
+    """Due date following a service on ``last_maintenance``."""
+    return last_maintenance + interval(frequency, unit)
+
+
+class days_after(FunctionElement):
+    """SQL ``timestamp`` plus ``days`` (a column or expression), compiled per dialect."""
+    type = DateTime()
+    name = 'days_after'
+    inherit_cache = True
+
+
+@compiles(days_after)
+def _days_after(element, compiler, **kw):
+    timestamp, days = [compiler.process(clause, **kw) for clause in element.clauses]
+    return f"({timestamp} + make_interval(days => {days}))"
+
+
+@compiles(days_after, 'sqlite')
+def _days_after_sqlite(element, compiler, **kw):
+    timestamp, days = [compiler.process(clause, **kw) for clause in element.clauses]
+    return f"datetime({timestamp}, '+' || ({days}) || ' days')"
+
+
+def status_case(next_maintenance, threshold, now):
+    """SQL 'overdue' / 'due_soon' / 'ok' for a part due at ``next_maintenance``.
+
+    Matches the Python checks on ``days_until = (next_maintenance - now).days``:
+    overdue below 0, due soon up to ``threshold`` days (a site column; NULL
+    means never due soon). ``now`` should have no microseconds, as SQLite
+    date arithmetic works in whole seconds.
+    """
+    return case((next_maintenance < now, 'overdue'),
+                (next_maintenance < days_after(literal(now, DateTime()), threshold + 1), 'due_soon'),
+                else_='ok')
+
+
+def _frequencies(values):
+    import pandas as pd
+    frequency = pd.to_numeric(values, errors='coerce').fillna(0).astype(int)
+    return frequency.where(frequency != 0, 1)
+
+
+def nominal_days_many(parts):
+    """``maintenance_days`` for a frame of parts."""
+    return _frequencies(parts['maintenance_frequency']) * parts['maintenance_unit'].map(normalize_unit).map(NOMINAL_DAYS)
+
+
+def _add_months(last, months):
+    """Vectorised calendar month addition, clamping to the end of the target month."""
+    import pandas as pd
+    total = last.dt.year * 12 + (last.dt.month - 1) + months
+    month_start = pd.to_datetime({'year': total // 12, 'month': total % 12 + 1, 'day': 1}, errors='coerce')
+    day = last.dt.day.clip(upper=month_start.dt.days_in_month)
+    return month_start + pd.to_timedelta(day - 1, unit='D') + (last - last.dt.normalize())
+
+
+def compute_next_many(parts):
+    """Due dates for a frame of parts, column-wise.
+
+    ``parts`` needs ``last_maintenance``, ``maintenance_frequency`` and
+    ``maintenance_unit`` columns; returns a datetime Series on the same index
+    (NaT where ``last_maintenance`` is missing).
+    """
+    import pandas as pd
+    last = pd.to_datetime(parts['last_maintenance'], errors='coerce')
+    frequency = _frequencies(parts['maintenance_frequency'])
+    unit = parts['maintenance_unit'].map(normalize_unit)
+
+    result = pd.Series(pd.NaT, index=parts.index, dtype='datetime64[ns]')
+    days = unit.isin(['day', 'week'])
+    result[days] = last[days] + pd.to_timedelta(frequency[days] * unit[days].map(NOMINAL_DAYS), unit='D')
+    months = ~days
+    if months.any():
+        per_unit = unit[months].map({'month': 1, 'year': 12})
+        result[months] = _add_months(last[months], frequency[months] * per_unit)
+    return result
+
+
+def recompute_all(session, batch_size=RECOMPUTE_BATCH_SIZE, commit=True):
+    """Recompute ``next_maintenance`` and ``maintenance_days`` for every serviced part.
+
+    Walks parts in id order, ``batch_size`` at a time, with one SELECT and
+    one executemany UPDATE per batch (committed per batch unless ``commit``
+    is False). Parts without ``last_maintenance`` are left alone. Returns
+    the number of parts updated.
+    """
+    from models import Part
+    from change_log import record_changes
+    import pandas as pd
+    table = Part.__table__
+    stmt = (update(table).where(table.c.id == bindparam('part_id'))
+            .values(next_maintenance=bindparam('next'), maintenance_days=bindparam('days')))
+    updated, after = 0, 0
+    while True:
+        rows = session.execute(
+            select(Part.id, Part.last_maintenance, Part.maintenance_frequency, Part.maintenance_unit)
+            .where(Part.id > after, Part.last_maintenance.isnot(None))
+            .order_by(Part.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        frame = pd.DataFrame(rows, columns=['id', 'last_maintenance', 'maintenance_frequency', 'maintenance_unit'])
+        frame['next'] = compute_next_many(frame)
+        frame['days'] = nominal_days_many(frame)
+        session.execute(stmt, [{'part_id': int(row.id), 'next': row.next.to_pydatetime(), 'days': int(row.days)}
+                               for row in frame.itertuples(index=False)])
+        record_changes(session.connection(), [('parts', int(part_id), 'update') for part_id in frame['id']])
+        if commit:
+            session.commit()
+        updated += len(rows)
+        after = rows[-1].id
+        print(f"[SCHEDULE] Rescheduled {updated} parts")
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute next_maintenance for all parts')
+    parser.add_argument('--batch-size', type=int, default=RECOMPUTE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    from app import app, db
+    with app.app_context():
+        recompute_all(db.session, batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Precomputed maintenance summaries per site, machine and part: record count,
+last service date, mean interval between services and on-time percentage.
+
+New MaintenanceRecords are folded into the ``maintenance_stats`` table by an
+``after_flush`` hook, so history page headers read one row instead of
+scanning the whole history. A service is on time when it is performed on or
+before the part's ``next_maintenance`` as it stood before the service.
+
+The hook only sees inserts (and drops the stats of deleted sites, machines
+and parts). ``rebuild_stats`` recomputes every row from the
+history (after schema migration 11 creates the table, and
+``flask rebuild-maintenance-stats`` after
+records are edited or deleted); there the due date of a service is the
+previous service plus the part's interval.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, event, inspect, or_, select, tuple_
+from sqlalchemy.orm.util import identity_key
+
+from maintenance_schedule import interval as schedule_interval
+from models import Site, Machine, Part, MaintenanceRecord, MaintenanceStat
+
+
+def _entity_keys(part_id, machine_id, site_id):
+    return (('part', part_id), ('machine', machine_id), ('site', site_id))
+
+
+def _aggregate(services, totals=None):
+    """Per-entity (count, on_time_count, first, last) for (part, machine, site, date, on_time) tuples."""
+    totals = {} if totals is None else totals
+    for part_id, machine_id, site_id, service_date, on_time in services:
+        for key in _entity_keys(part_id, machine_id, site_id):
+            count, on_time_count, first, last = totals.get(key, (0, 0, service_date, service_date))
+            totals[key] = (count + 1, on_time_count + int(on_time), min(first, service_date), max(last, service_date))
+    return totals
+
+
+def apply_services(conn, services):
+    """Add ``services`` - (part_id, machine_id, site_id, date, on_time) tuples - to the stats rows.
+
+    One SELECT for the touched entities' existing rows, then one executemany
+    UPDATE for those and one executemany INSERT for the rest.
+    """
+    totals = _aggregate(services)
+    if not totals:
+        return
+    table = MaintenanceStat.__table__
+    now = datetime.utcnow()
+    existing = set(conn.execute(
+        select(table.c.entity_type, table.c.entity_id)
+        .where(tuple_(table.c.entity_type, table.c.entity_id).in_(list(totals)))
+    ).all())
+    updates, inserts = [], []
+    for (entity_type, entity_id), (count, on_time_count, first, last) in totals.items():
+        if (entity_type, entity_id) in existing:
+            updates.append({'b_type': entity_type, 'b_id': entity_id, 'b_count': count,
+                            'b_on_time': on_time_count, 'b_first': first, 'b_last': last})
+        else:
+            inserts.append({'entity_type': entity_type, 'entity_id': entity_id, 'record_count': count,
+                            'on_time_count': on_time_count, 'first_date': first, 'last_date': last,
+                            'updated_at': now})
+    if updates:
+        first, last = bindparam('b_first'), bindparam('b_last')
+        conn.execute(
+            table.update()
+            .where(table.c.entity_type == bindparam('b_type'), table.c.entity_id == bindparam('b_id'))
+            .values(record_count=table.c.record_count + bindparam('b_count'),
+                    on_time_count=table.c.on_time_count + bindparam('b_on_time'),
+                    first_date=case((or_(table.c.first_date.is_(None), table.c.first_date > first), first),
+                                    else_=table.c.first_date),
+                    last_date=case((or_(table.c.last_date.is_(None), table.c.last_date < last), last),
+                                   else_=table.c.last_date),
+                    updated_at=now),
+            updates)
+    if inserts:
+        conn.execute(table.insert(), inserts)
+
+
+def _due_before_flush(session, part_id, stored_due):
+    """The part's next_maintenance before this flush (None for a part created in it)."""
+    part = session.identity_map.get(identity_key(Part, part_id))
+    if part is None:
+        return stored_due
+    state = inspect(part)
+    if state.pending or part in session.new:
+        return None
+    deleted = state.attrs.next_maintenance.history.deleted
+    return deleted[0] if deleted else stored_due
+
+
+ENTITY_MODELS = ((Site, 'site'), (Machine, 'machine'), (Part, 'part'))
+
+
+def _forget_deleted(session):
+    """Drop the stats of sites, machines and parts deleted in this flush."""
+    table = MaintenanceStat.__table__
+    for model, entity_type in ENTITY_MODELS:
+        ids = [obj.id for obj in session.deleted if isinstance(obj, model)]
+        if ids:
+            session.connection().execute(
+                table.delete().where(table.c.entity_type == entity_type, table.c.entity_id.in_(ids)))
+
+
+def _after_flush(session, flush_context):
+    if session.deleted:
+        _forget_deleted(session)
+    records = [obj for obj in session.new if isinstance(obj, MaintenanceRecord) and obj.part_id and obj.date]
+    if not records:
+        return
+    conn = session.connection()
+    parts = {row.id: row for row in conn.execute(
+        select(Part.id, Part.machine_id, Machine.site_id, Part.next_maintenance)
+        .join(Machine, Part.machine_id == Machine.id)
+        .where(Part.id.in_({record.part_id for record in records}))
+    )}
+    services = []
+    for record in records:
+        part = parts.get(record.part_id)
+        if part is None:
+            continue
+        due = _due_before_flush(session, part.id, part.next_maintenance)
+        services.append((part.id, part.machine_id, part.site_id, record.date, due is None or record.date <= due))
+    apply_services(conn, services)
+
+
+def install_stats_hook(session):
+    """Keep maintenance_stats current for records inserted through ``session``."""
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+
+def rebuild_stats(conn, batch_size=2000):
+    """Recompute every stats row from the full history; returns the number of rows written."""
+    stmt = (select(MaintenanceRecord.part_id, Part.machine_id, Machine.site_id, MaintenanceRecord.date,
+                   Part.maintenance_frequency, Part.maintenance_unit)
+            .join(Part, MaintenanceRecord.part_id == Part.id)
+            .join(Machine, Part.machine_id == Machine.id)
+            .where(MaintenanceRecord.date.isnot(None))
+            .order_by(MaintenanceRecord.part_id, MaintenanceRecord.date, MaintenanceRecord.id)
+            .execution_options(yield_per=batch_size))
+    totals = {}
+    current_part, previous, interval = None, None, None
+    for row in conn.execute(stmt):
+        if row.part_id != current_part:
+            current_part, previous = row.part_id, None
+            interval = schedule_interval(row.maintenance_frequency, row.maintenance_unit)
+        on_time = previous is None or row.date <= previous + interval
+        _aggregate([(row.part_id, row.machine_id, row.site_id, row.date, on_time)], totals)
+        previous = row.date
+
+    table = MaintenanceStat.__table__
+    now = datetime.utcnow()
+    conn.execute(table.delete())
+    rows = [{'entity_type': entity_type, 'entity_id': entity_id, 'record_count': count,
+             'on_time_count': on_time_count, 'first_date': first, 'last_date': last, 'updated_at': now}
+            for (entity_type, entity_id), (count, on_time_count, first, last) in totals.items()]
+    if rows:
+        conn.execute(table.insert(), rows)
+    return len(rows)
+
+
+def get_stats(session, entity_type, entity_id):
+    """Stats row for one entity, or None if it has no maintenance history."""
+    return session.get(MaintenanceStat, (entity_type, entity_id))
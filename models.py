@@ -1,7 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 from sqlalchemy.dialects.postgresql import JSON as PG_JSON
 from sqlalchemy.types import JSON as SA_JSON
@@ -10,6 +10,7 @@ from cryptography.fernet import Fernet, InvalidToken
 import base64
 import os
 import hashlib
+from maintenance_schedule import interval, compute_next, nominal_days
 
 # --- Application-level encryption utilities ---
 # The encryption key MUST be set as an environment variable in production
@@ -198,6 +199,8 @@ class Role(db.Model):
 class Site(db.Model):
     """Site model representing physical locations"""
     __tablename__ = 'sites'  # Explicit table name for PostgreSQL conventions
+    # Delta sync pages on (updated_at, id)
+    __table_args__ = (db.Index('ix_sites_updated_at_id', 'updated_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -217,13 +220,15 @@ class Site(db.Model):
 class Machine(db.Model):
     """Machine model representing equipment at a site"""
     __tablename__ = 'machines'  # Explicit table name for PostgreSQL conventions
+    # Delta sync pages on (updated_at, id)
+    __table_args__ = (db.Index('ix_machines_updated_at_id', 'updated_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     model = db.Column(db.String(100))
     machine_number = db.Column(db.String(50))
     serial_number = db.Column(db.String(50))
-    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -236,11 +241,13 @@ class Machine(db.Model):
 class Part(db.Model):
     """Part model representing components of a machine that need maintenance"""
     __tablename__ = 'parts'  # Explicit table name for PostgreSQL conventions
+    # Delta sync pages on (updated_at, id)
+    __table_args__ = (db.Index('ix_parts_updated_at_id', 'updated_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False, index=True)
     maintenance_frequency = db.Column(db.Integer, default=30)  # Numeric value for frequency
     maintenance_unit = db.Column(db.String(10), default='day')  # Units: day, week, month, year
     maintenance_days = db.Column(db.Integer, default=30)  # Calculated days for maintenance period
@@ -265,12 +272,32 @@ class Part(db.Model):
             return f"Every {freq} year{'s' if freq != 1 else ''}"
         return f"Every {freq} {unit}(s)"
     
+    def maintenance_interval(self):
+        """Calendar interval between services implied by frequency and unit."""
+        return interval(self.maintenance_frequency, self.maintenance_unit)
+
+    def update_next_maintenance(self):
+        """Recalculate next_maintenance (and maintenance_days) from last_maintenance, frequency and unit."""
+        self.next_maintenance = compute_next(self.last_maintenance or datetime.utcnow(),
+                                             self.maintenance_frequency, self.maintenance_unit)
+        self.maintenance_days = nominal_days(self.maintenance_frequency, self.maintenance_unit)
+    
     def __repr__(self):
         return f'<Part {self.name}>'
 
 class MaintenanceRecord(db.Model):
     """Maintenance record model for tracking maintenance activities"""
     __tablename__ = 'maintenance_records'  # Explicit table name for PostgreSQL conventions
+    # Keyset pagination on (date, id), the maintenance history filters, sync dedupe and delta sync
+    __table_args__ = (
+        db.Index('ix_maintenance_records_date_id', 'date', 'id'),
+        db.Index('ix_maintenance_records_part_date', 'part_id', 'date'),
+        db.Index('ix_maintenance_records_status', 'status'),
+        db.Index('ix_maintenance_records_type', 'maintenance_type'),
+        # One record per client-generated id, so resubmitted records are ignored
+        db.Index('ux_maintenance_records_client_id', 'client_id', unique=True),
+        db.Index('ix_maintenance_records_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     part_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=False)
@@ -297,6 +324,8 @@ class MaintenanceRecord(db.Model):
 
 class AuditTask(db.Model):
     __tablename__ = 'audit_tasks'
+    # Delta sync pages on (updated_at, id)
+    __table_args__ = (db.Index('ix_audit_tasks_updated_at_id', 'updated_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
@@ -312,6 +341,8 @@ class AuditTask(db.Model):
 
 class AuditTaskCompletion(db.Model):
     __tablename__ = 'audit_task_completions'
+    # Delta sync pages on (updated_at, id)
+    __table_args__ = (db.Index('ix_audit_task_completions_updated_at_id', 'updated_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     audit_task_id = db.Column(db.Integer, db.ForeignKey('audit_tasks.id'), nullable=False)
     machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=False)
@@ -321,3 +352,150 @@ class AuditTaskCompletion(db.Model):
     completed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ImportJob(db.Model):
+    """Progress record for a streaming spreadsheet/CSV import.
+
+    Each committed batch updates ``current_sheet``/``rows_processed`` in the
+    same transaction as the rows it inserted, so an interrupted job can be
+    resumed from the last committed batch.
+    """
+    __tablename__ = 'import_jobs'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, running, cancelling, cancelled, completed, failed
+    batch_size = db.Column(db.Integer, default=2000)
+    current_sheet = db.Column(db.String(50))
+    rows_processed = db.Column(db.Integer, default=0)  # Committed rows of current_sheet
+    total_rows_processed = db.Column(db.Integer, default=0)
+    stats = db.Column(PG_JSON().with_variant(SA_JSON(), 'sqlite'), nullable=True)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        stats = self.stats or {}
+        processed = self.total_rows_processed or 0
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'current_sheet': self.current_sheet,
+            'rows_processed': self.rows_processed,
+            'total_rows_processed': processed,
+            'rows_added': sum(v for k, v in stats.items() if k.endswith('_added')),
+            'rows_skipped': sum(v for k, v in stats.items() if k.endswith('_skipped')),
+            'rows_errored': stats.get('errors', 0),
+            'elapsed_seconds': round(elapsed, 2) if elapsed is not None else None,
+            'rows_per_second': round(processed / elapsed, 1) if elapsed else None,
+            'stats': stats,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
+class MaintenanceStat(db.Model):
+    """Running maintenance summary for one site, machine or part.
+
+    Maintained on insert by maintenance_stats.py so history headers never
+    scan the full history. The mean interval telescopes to
+    (last_date - first_date) / (record_count - 1).
+    """
+    __tablename__ = 'maintenance_stats'
+
+    entity_type = db.Column(db.String(10), primary_key=True)  # site, machine or part
+    entity_id = db.Column(db.Integer, primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    on_time_count = db.Column(db.Integer, nullable=False, default=0)
+    first_date = db.Column(db.DateTime)
+    last_date = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def mean_interval_days(self):
+        if self.record_count < 2 or not self.first_date or not self.last_date:
+            return None
+        return round((self.last_date - self.first_date).total_seconds() / 86400 / (self.record_count - 1), 1)
+
+    @property
+    def on_time_percent(self):
+        if not self.record_count:
+            return None
+        return round(100.0 * self.on_time_count / self.record_count, 1)
+
+    def to_dict(self):
+        return {
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'record_count': self.record_count,
+            'last_date': self.last_date.isoformat() if self.last_date else None,
+            'mean_interval_days': self.mean_interval_days,
+            'on_time_percent': self.on_time_percent,
+        }
+
+    def __repr__(self):
+        return f'<MaintenanceStat {self.entity_type} {self.entity_id}>'
+
+class ChangeLog(db.Model):
+    """Append-only log of inserts, updates and deletes of synced entities.
+
+    Written by change_log.py from SQLAlchemy session events (and by the bulk
+    write paths). ``seq`` only grows, so consumers tail the log with
+    ``WHERE seq > :cursor``; ``version`` counts the changes of one row.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_entity_version', 'entity', 'entity_id', 'version'),
+        # Tombstones for delta sync
+        db.Index('ix_change_log_op_seq', 'op', 'seq'),
+        # Per-collection versions (ETags)
+        db.Index('ix_change_log_entity_seq', 'entity', 'seq'),
+        # Never reuse a seq on SQLite, even after pruning
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(50), nullable=False)  # table name, e.g. parts
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update or delete
+    version = db.Column(db.Integer, nullable=False, default=1)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'op': self.op,
+            'version': self.version,
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ChangeLog {self.seq} {self.op} {self.entity} {self.entity_id}>'
+
+class TokenVersion(db.Model):
+    """Current API token version of a user; tokens carrying an older one are revoked.
+
+    Bumped by token_auth.py whenever something a token's claims describe
+    (name, role, admin status, sites, password) changes. No foreign key, so
+    a deleted user's row stays behind and keeps their tokens revoked.
+    """
+    __tablename__ = 'token_versions'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TokenVersion user {self.user_id} v{self.version}>'
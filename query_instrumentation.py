@@ -0,0 +1,128 @@
+"""
+Per-request SQL instrumentation for the AMRS Maintenance Tracker.
+
+Hooks SQLAlchemy's ``before_cursor_execute``/``after_cursor_execute`` events
+(and ``handle_error``, for statements that fail) to count statements and
+total database time for each request, logs any
+statement slower than ``SLOW_QUERY_THRESHOLD_MS`` together with the route
+that issued it, and (outside production) adds ``X-DB-Queries`` and
+``Server-Timing`` response headers so N+1 patterns are visible in the
+browser dev tools and in CI.
+"""
+
+import os
+import time
+import logging
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+def _is_production():
+    return os.environ.get('FLASK_ENV') == 'production' or bool(os.environ.get('RENDER'))
+
+
+class QueryStats:
+    """Statement count and DB time accumulated for one request."""
+
+    __slots__ = ('count', 'total_ms', 'statements')
+
+    def __init__(self, record_statements=False):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = [] if record_statements else None
+
+    def to_dict(self):
+        data = {'count': self.count, 'total_ms': round(self.total_ms, 2)}
+        if self.statements is not None:
+            data['statements'] = list(self.statements)
+        return data
+
+
+class QueryInstrumentation:
+    """Count queries per request and log slow statements."""
+
+    def __init__(self, app=None, db=None):
+        self.slow_query_ms = 200
+        self.add_headers = False
+        # Keep the SQL text of every statement (used by the test-suite budgets)
+        self.record_statements = False
+        self._listeners = []
+        if app is not None and db is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200)))
+        app.config.setdefault('DB_QUERY_HEADERS',
+                              os.environ.get('DB_QUERY_HEADERS', 'false' if _is_production() else 'true').lower() == 'true')
+        self.slow_query_ms = app.config['SLOW_QUERY_THRESHOLD_MS']
+        self.add_headers = app.config['DB_QUERY_HEADERS']
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(db.engine, 'handle_error', self._handle_error)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions['query_instrumentation'] = self
+
+    def add_listener(self, func):
+        """Call ``func(endpoint, path, stats)`` after every request."""
+        self._listeners.append(func)
+
+    def remove_listener(self, func):
+        if func in self._listeners:
+            self._listeners.remove(func)
+
+    def current_stats(self):
+        """Return the QueryStats for the current request, or None outside one."""
+        if not has_request_context():
+            return None
+        return g.get('_query_stats')
+
+    def _start_request(self):
+        g._query_stats = QueryStats(self.record_statements)
+
+    # Start times are kept on the statement's execution context, so a statement
+    # that raises (no after_cursor_execute) leaves nothing behind on the
+    # pooled connection for the next statement to pick up.
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record(context, statement)
+
+    def _handle_error(self, exception_context):
+        self._record(exception_context.execution_context, exception_context.statement)
+
+    def _record(self, context, statement):
+        started = getattr(context, '_query_start_time', None)
+        if started is None:
+            return
+        context._query_start_time = None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self.current_stats()
+        if stats is not None:
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            if stats.statements is not None:
+                stats.statements.append(statement)
+        if elapsed_ms >= self.slow_query_ms:
+            route = f"{request.method} {request.path}" if has_request_context() else '<no request>'
+            logger.warning(f"[SLOW_QUERY] {elapsed_ms:.1f}ms on {route}: {' '.join(statement.split())[:500]}")
+
+    def _finish_request(self, response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+        if self.add_headers:
+            response.headers['X-DB-Queries'] = str(stats.count)
+            timing = f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"'
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f"{existing}, {timing}" if existing else timing
+        for listener in self._listeners:
+            listener(request.endpoint, request.path, stats)
+        return response
@@ -0,0 +1,572 @@
+"""
+Versioned schema migrations for the AMRS Maintenance Tracker database.
+
+All schema changes live in one ordered registry (``MIGRATIONS``). Each
+migration runs once, inside its own transaction, and records its version in
+the ``schema_version`` table. Once the database is current, startup only
+reads that table with a single query instead of re-introspecting every
+table and column.
+
+To add a schema change, append a function decorated with
+``@migration(<next version>, '<description>')`` at the bottom of the
+registry. Never renumber or edit a migration that has already shipped, and
+spell out the tables and indexes a migration creates instead of reading
+them from the models, which keep changing after it ships.
+
+`flask db-prepare` (or ``python schema_migrations.py``) applies pending
+migrations. Works on both SQLite and PostgreSQL.
+"""
+
+import os
+import sys
+import uuid
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import (JSON, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String,
+                        Table, Text, create_engine, inspect, text)
+
+logger = logging.getLogger(__name__)
+
+Migration = namedtuple('Migration', ['version', 'description', 'func'])
+
+# Ordered migration registry, populated by the @migration decorator below
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function under ``version``."""
+    def decorator(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} must be greater than {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+class MigrationContext:
+    """Helpers passed to each migration.
+
+    Table and column names are introspected at most once per run and the
+    cache is updated as columns are added, so a run over many migrations
+    does not re-inspect the same table for every column.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self._inspector = None
+        self._tables = None
+        self._columns = {}
+
+    @property
+    def is_postgres(self):
+        return self.dialect == 'postgresql'
+
+    @property
+    def is_sqlite(self):
+        return self.dialect == 'sqlite'
+
+    @property
+    def inspector(self):
+        if self._inspector is None:
+            self._inspector = inspect(self.conn)
+        return self._inspector
+
+    def invalidate(self):
+        """Forget cached introspection (after create_all or raw DDL)."""
+        self._inspector = None
+        self._tables = None
+        self._columns = {}
+
+    def has_table(self, table):
+        if self._tables is None:
+            self._tables = set(self.inspector.get_table_names())
+        return table in self._tables
+
+    def columns(self, table):
+        if table not in self._columns:
+            self._columns[table] = {col['name']: col for col in self.inspector.get_columns(table)}
+        return self._columns[table]
+
+    def has_column(self, table, column):
+        return self.has_table(table) and column in self.columns(table)
+
+    def quote(self, name):
+        return self.conn.dialect.identifier_preparer.quote(name)
+
+    def execute(self, sql, params=None):
+        return self.conn.execute(text(sql), params or {})
+
+    def add_column(self, table, column, ddl_type):
+        """Add ``column`` to ``table`` if the table exists and lacks it.
+
+        Returns True when the column was added.
+        """
+        if not self.has_table(table) or column in self.columns(table):
+            return False
+        self.execute(f"ALTER TABLE {self.quote(table)} ADD COLUMN {self.quote(column)} {ddl_type}")
+        self._columns[table][column] = {'name': column, 'type': ddl_type}
+        print(f"[SCHEMA] Added column {table}.{column}")
+        return True
+
+    def create_index(self, name, table, columns, unique=False):
+        """Create index ``name`` on ``table`` (``columns``) if the table exists and lacks it."""
+        if not self.has_table(table):
+            return False
+        column_list = ', '.join(self.quote(column) for column in columns)
+        self.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {self.quote(name)} "
+                     f"ON {self.quote(table)} ({column_list})")
+        return True
+
+
+def ensure_version_table(conn):
+    """Create the schema_version table if it does not exist."""
+    conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP
+        )
+        """
+    ))
+
+
+def _record_version(conn, version, description):
+    conn.execute(
+        text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+        {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+    )
+
+
+def get_schema_version(engine):
+    """Return the highest recorded schema version, or None if never prepared.
+
+    This is the only database work done on a normal import, so it must stay
+    a single cheap query.
+    """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except Exception:
+        # Table missing (fresh or legacy database)
+        return None
+
+
+def get_applied_versions(engine):
+    """Return the set of applied migration versions (empty if none)."""
+    try:
+        with engine.connect() as conn:
+            return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+    except Exception:
+        return set()
+
+
+def run_migrations(engine, target=None):
+    """Apply every pending migration up to ``target`` (default: latest).
+
+    Each migration runs in its own transaction together with the insert of
+    its version row, so a failure leaves earlier migrations recorded and
+    stops the run. Returns the list of versions applied.
+    """
+    applied = get_applied_versions(engine)
+    pending = [m for m in MIGRATIONS
+               if m.version not in applied and (target is None or m.version <= target)]
+    if not pending:
+        return []
+
+    applied_now = []
+    with engine.connect() as conn:
+        ctx = MigrationContext(conn)
+        for m in pending:
+            with conn.begin():
+                ensure_version_table(conn)
+                m.func(ctx)
+                _record_version(conn, m.version, m.description)
+            applied_now.append(m.version)
+            print(f"[SCHEMA] Applied migration {m.version}: {m.description}")
+    return applied_now
+
+
+def rebuild_derived_data(engine, applied):
+    """Recompute data derived by application code, after the migrations in ``applied`` that need it.
+
+    Migrations stay frozen, so backfills that depend on current application
+    logic run here instead of inside them.
+    """
+    if 11 in applied:
+        from maintenance_stats import rebuild_stats
+        with engine.begin() as conn:
+            rows = rebuild_stats(conn)
+        print(f"[SCHEMA] Built {rows} maintenance summaries from existing history")
+
+
+def set_schema_version(engine, version=None, description='db-prepare'):
+    """Record ``version`` (default: latest) as applied without running anything."""
+    version = SCHEMA_VERSION if version is None else version
+    with engine.begin() as conn:
+        ensure_version_table(conn)
+        exists = conn.execute(
+            text("SELECT 1 FROM schema_version WHERE version = :version"),
+            {'version': version}
+        ).first()
+        if not exists:
+            _record_version(conn, version, description)
+    logger.info(f"[SCHEMA] Recorded schema version {version}")
+
+
+def schema_is_current(engine):
+    version = get_schema_version(engine)
+    return version is not None and version >= SCHEMA_VERSION
+
+
+# ---------------------------------------------------------------------------
+# Migration registry. Append only.
+# ---------------------------------------------------------------------------
+
+TIMESTAMPED_TABLES = ('users', 'roles', 'sites', 'machines', 'parts',
+                      'maintenance_records', 'audit_tasks', 'audit_task_completions')
+
+
+def _baseline_metadata():
+    """The schema migration 1 creates: the models as they were when the registry was introduced.
+
+    Frozen - later schema changes belong in later migrations, never here.
+    """
+    metadata = MetaData()
+    Table('roles', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(64), unique=True, nullable=False),
+          Column('description', String(255)),
+          Column('permissions', Text),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('users', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('username', Text, unique=True, nullable=False, index=True),
+          Column('username_hash', String(64), unique=True, nullable=False, index=True),
+          Column('email', Text, unique=True, nullable=False),
+          Column('email_hash', String(64), unique=True, nullable=False, index=True),
+          Column('full_name', String(100)),
+          Column('password_hash', String(255), nullable=False),
+          Column('is_admin', Boolean),
+          Column('role_id', Integer, ForeignKey('roles.id')),
+          Column('last_login', DateTime),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime),
+          Column('reset_token', String(100)),
+          Column('reset_token_expiration', DateTime),
+          Column('notification_preferences', JSON))
+    Table('sites', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('location', String(255)),
+          Column('contact_email', String(120)),
+          Column('enable_notifications', Boolean),
+          Column('notification_threshold', Integer),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('user_site', metadata,
+          Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+          Column('site_id', Integer, ForeignKey('sites.id'), primary_key=True))
+    Table('machines', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('model', String(100)),
+          Column('machine_number', String(50)),
+          Column('serial_number', String(50)),
+          Column('site_id', Integer, ForeignKey('sites.id'), nullable=False),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('parts', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('description', Text),
+          Column('machine_id', Integer, ForeignKey('machines.id'), nullable=False),
+          Column('maintenance_frequency', Integer),
+          Column('maintenance_unit', String(10)),
+          Column('maintenance_days', Integer),
+          Column('last_maintenance', DateTime),
+          Column('next_maintenance', DateTime),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('maintenance_records', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('part_id', Integer, ForeignKey('parts.id'), nullable=False),
+          Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+          Column('machine_id', Integer, ForeignKey('machines.id')),
+          Column('date', DateTime),
+          Column('comments', Text),
+          Column('maintenance_type', String(50)),
+          Column('description', Text),
+          Column('performed_by', String(100)),
+          Column('status', String(50)),
+          Column('notes', Text),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime),
+          Column('client_id', String(36)))
+    Table('audit_tasks', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(255), nullable=False),
+          Column('description', Text),
+          Column('site_id', Integer, ForeignKey('sites.id'), nullable=False),
+          Column('created_by', Integer, ForeignKey('users.id')),
+          Column('interval', String(20)),
+          Column('custom_interval_days', Integer),
+          Column('color', String(32)),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('machine_audit_task', metadata,
+          Column('audit_task_id', Integer, ForeignKey('audit_tasks.id'), primary_key=True),
+          Column('machine_id', Integer, ForeignKey('machines.id'), primary_key=True))
+    Table('audit_task_completions', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('audit_task_id', Integer, ForeignKey('audit_tasks.id'), nullable=False),
+          Column('machine_id', Integer, ForeignKey('machines.id'), nullable=False),
+          Column('date', Date, nullable=False),
+          Column('completed', Boolean),
+          Column('completed_by', Integer, ForeignKey('users.id')),
+          Column('completed_at', DateTime),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    return metadata
+
+
+@migration(1, 'baseline: create missing tables from models')
+def _baseline(ctx):
+    _baseline_metadata().create_all(ctx.conn)
+    ctx.invalidate()
+
+
+@migration(2, 'audit_tasks interval, custom_interval_days and color')
+def _audit_task_columns(ctx):
+    ctx.add_column('audit_tasks', 'interval', "VARCHAR(20) DEFAULT 'daily'")
+    ctx.add_column('audit_tasks', 'custom_interval_days', 'INTEGER')
+    ctx.add_column('audit_tasks', 'color', 'VARCHAR(32)')
+
+
+@migration(3, 'users hash, password reset, last_login and notification columns')
+def _user_columns(ctx):
+    ctx.add_column('users', 'username_hash', 'VARCHAR(64)')
+    ctx.add_column('users', 'email_hash', 'VARCHAR(64)')
+    ctx.add_column('users', 'last_login', 'TIMESTAMP')
+    ctx.add_column('users', 'reset_token', 'VARCHAR(100)')
+    ctx.add_column('users', 'reset_token_expiration', 'TIMESTAMP')
+    ctx.add_column('users', 'notification_preferences', 'JSON')
+
+
+@migration(4, 'created_at/updated_at on all tables')
+def _timestamps(ctx):
+    # SQLite cannot ADD COLUMN with a non-constant default, so add the
+    # column bare and backfill.
+    for table in TIMESTAMPED_TABLES:
+        for column in ('created_at', 'updated_at'):
+            if ctx.add_column(table, column, 'TIMESTAMP'):
+                ctx.execute(f"UPDATE {ctx.quote(table)} SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL")
+
+
+@migration(5, 'maintenance_records detail columns and machine_id backfill')
+def _maintenance_record_columns(ctx):
+    ctx.add_column('maintenance_records', 'client_id', 'VARCHAR(36)')
+    ctx.add_column('maintenance_records', 'maintenance_type', 'VARCHAR(50)')
+    ctx.add_column('maintenance_records', 'description', 'TEXT')
+    ctx.add_column('maintenance_records', 'performed_by', 'VARCHAR(100)')
+    ctx.add_column('maintenance_records', 'status', 'VARCHAR(50)')
+    ctx.add_column('maintenance_records', 'notes', 'TEXT')
+    machine_id_type = 'INTEGER REFERENCES machines (id)' if ctx.is_postgres else 'INTEGER'
+    ctx.add_column('maintenance_records', 'machine_id', machine_id_type)
+    if ctx.has_table('maintenance_records'):
+        ctx.execute(
+            """
+            UPDATE maintenance_records
+            SET machine_id = (SELECT parts.machine_id FROM parts WHERE parts.id = maintenance_records.part_id)
+            WHERE machine_id IS NULL
+            """
+        )
+
+
+@migration(6, 'parts maintenance unit/days and machine number/serial')
+def _part_and_machine_columns(ctx):
+    ctx.add_column('parts', 'maintenance_unit', "VARCHAR(10) DEFAULT 'day'")
+    ctx.add_column('parts', 'maintenance_days', 'INTEGER DEFAULT 30')
+    ctx.add_column('machines', 'machine_number', 'VARCHAR(50)')
+    ctx.add_column('machines', 'serial_number', 'VARCHAR(50)')
+
+
+@migration(7, 'postgres: widen encrypted user fields and fix client_id type')
+def _postgres_column_types(ctx):
+    if not ctx.is_postgres:
+        # SQLite does not enforce VARCHAR lengths, nothing to do
+        return
+    if ctx.has_table('users'):
+        ctx.execute('ALTER TABLE users ALTER COLUMN username TYPE TEXT')
+        ctx.execute('ALTER TABLE users ALTER COLUMN email TYPE TEXT')
+    if ctx.has_column('maintenance_records', 'client_id'):
+        col_type = str(ctx.columns('maintenance_records')['client_id']['type']).lower()
+        if 'char' not in col_type and 'text' not in col_type:
+            ctx.execute('ALTER TABLE maintenance_records ALTER COLUMN client_id TYPE VARCHAR(36) USING client_id::text')
+
+
+@migration(8, 'backfill audit completion completed_at timestamps')
+def _completion_timestamps(ctx):
+    if ctx.has_column('audit_task_completions', 'completed_at'):
+        ctx.execute(
+            """
+            UPDATE audit_task_completions
+            SET completed_at = created_at
+            WHERE completed = :completed AND completed_at IS NULL
+            """,
+            {'completed': True}
+        )
+
+
+
+@migration(9, 'import_jobs table for resumable streaming imports')
+def _import_jobs(ctx):
+    metadata = MetaData()
+    # Only referenced by the foreign key; not created here
+    Table('users', metadata, Column('id', Integer, primary_key=True))
+    import_jobs = Table('import_jobs', metadata,
+                        Column('id', String(36), primary_key=True),
+                        Column('filename', String(255)),
+                        Column('file_path', String(1024), nullable=False),
+                        Column('status', String(20)),
+                        Column('batch_size', Integer),
+                        Column('current_sheet', String(50)),
+                        Column('rows_processed', Integer),
+                        Column('total_rows_processed', Integer),
+                        Column('stats', JSON),
+                        Column('error', Text),
+                        Column('created_by', Integer, ForeignKey('users.id')),
+                        Column('started_at', DateTime),
+                        Column('finished_at', DateTime),
+                        Column('created_at', DateTime),
+                        Column('updated_at', DateTime))
+    import_jobs.create(ctx.conn, checkfirst=True)
+    ctx.invalidate()
+
+
+@migration(10, 'maintenance history indexes and date backfill')
+def _maintenance_history_indexes(ctx):
+    if ctx.has_table('maintenance_records'):
+        # History pages are keyed on (date, id); give legacy undated records a date
+        ctx.execute("UPDATE maintenance_records SET date = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE date IS NULL")
+    ctx.create_index('ix_machines_site_id', 'machines', ['site_id'])
+    ctx.create_index('ix_parts_machine_id', 'parts', ['machine_id'])
+    ctx.create_index('ix_maintenance_records_date_id', 'maintenance_records', ['date', 'id'])
+    ctx.create_index('ix_maintenance_records_part_date', 'maintenance_records', ['part_id', 'date'])
+    ctx.create_index('ix_maintenance_records_status', 'maintenance_records', ['status'])
+    ctx.create_index('ix_maintenance_records_type', 'maintenance_records', ['maintenance_type'])
+    ctx.invalidate()
+
+
+@migration(11, 'maintenance_stats summary table')
+def _maintenance_stats(ctx):
+    Table('maintenance_stats', MetaData(),
+          Column('entity_type', String(10), primary_key=True),
+          Column('entity_id', Integer, primary_key=True, autoincrement=False),
+          Column('record_count', Integer, nullable=False),
+          Column('on_time_count', Integer, nullable=False),
+          Column('first_date', DateTime),
+          Column('last_date', DateTime),
+          Column('updated_at', DateTime)).create(ctx.conn, checkfirst=True)
+    ctx.invalidate()
+    # The summaries are filled in by rebuild_derived_data, with today's code
+
+
+@migration(12, 'unique maintenance_records.client_id')
+def _maintenance_record_client_id(ctx):
+    if not ctx.has_table('maintenance_records'):
+        return
+    # Retried submissions left duplicate client ids; keep the id on the oldest record
+    duplicates = ctx.execute(
+        "SELECT id FROM maintenance_records r WHERE client_id IS NOT NULL AND EXISTS ("
+        "SELECT 1 FROM maintenance_records o WHERE o.client_id = r.client_id AND o.id < r.id)"
+    ).scalars().all()
+    for record_id in duplicates:
+        ctx.execute("UPDATE maintenance_records SET client_id = :client_id WHERE id = :id",
+                    {'client_id': str(uuid.uuid4()), 'id': record_id})
+    if duplicates:
+        print(f"[SCHEMA] Gave {len(duplicates)} duplicate maintenance records new client ids")
+    ctx.create_index('ux_maintenance_records_client_id', 'maintenance_records', ['client_id'], unique=True)
+    ctx.invalidate()
+
+
+@migration(13, 'delta sync (updated_at, id) indexes and updated_at backfill')
+def _delta_sync_indexes(ctx):
+    for table in ('sites', 'machines', 'parts', 'maintenance_records', 'audit_tasks', 'audit_task_completions'):
+        if not ctx.has_table(table):
+            continue
+        # Rows without updated_at would never be pulled
+        ctx.execute(f"UPDATE {ctx.quote(table)} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+                    "WHERE updated_at IS NULL")
+        ctx.create_index(f'ix_{table}_updated_at_id', table, ['updated_at', 'id'])
+    ctx.invalidate()
+
+
+@migration(14, 'change_log table')
+def _change_log(ctx):
+    Table('change_log', MetaData(),
+          Column('seq', Integer, primary_key=True, autoincrement=True),
+          Column('entity', String(50), nullable=False),
+          Column('entity_id', Integer, nullable=False),
+          Column('op', String(10), nullable=False),
+          Column('version', Integer, nullable=False),
+          Column('changed_at', DateTime, nullable=False),
+          Index('ix_change_log_entity_version', 'entity', 'entity_id', 'version'),
+          Index('ix_change_log_op_seq', 'op', 'seq'),
+          sqlite_autoincrement=True).create(ctx.conn, checkfirst=True)
+    ctx.invalidate()
+
+
+@migration(15, 'change_log per-entity seq index')
+def _change_log_entity_seq(ctx):
+    ctx.create_index('ix_change_log_entity_seq', 'change_log', ['entity', 'seq'])
+    ctx.invalidate()
+
+
+@migration(16, 'token_versions table')
+def _token_versions(ctx):
+    Table('token_versions', MetaData(),
+          Column('user_id', Integer, primary_key=True, autoincrement=False),
+          Column('version', Integer, nullable=False),
+          Column('updated_at', DateTime)).create(ctx.conn, checkfirst=True)
+    ctx.invalidate()
+
+
+# Latest version; the startup fast path compares the recorded MAX(version) to this
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def _database_url():
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        from config import Config
+        url = Config.SQLALCHEMY_DATABASE_URI
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def main(argv=None):
+    """Apply pending migrations to DATABASE_URL (or the configured database)."""
+    engine = create_engine(_database_url())
+    try:
+        applied = run_migrations(engine)
+        if applied:
+            print(f"[SCHEMA] Applied migrations: {applied}")
+            rebuild_derived_data(engine, applied)
+        else:
+            print(f"[SCHEMA] Database already at schema version {SCHEMA_VERSION}")
+        return 0
+    except Exception as e:
+        print(f"[SCHEMA] Migration failed: {e}")
+        return 1
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
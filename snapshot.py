@@ -0,0 +1,121 @@
+"""
+Streaming initial load for desktop clients (``GET /api/snapshot``).
+
+A snapshot is every row a client may see of the delta-sync entities
+(``delta_sync.ENTITIES``: sites, machines, parts, audit tasks, and the last
+``history_days`` of maintenance records and audit completions), written as
+newline-delimited JSON::
+
+    {"entity": "sites", "data": {...}}
+    ...
+    {"cursor": "..."}
+    ...
+    {"done": true, "counts": {...}, "sync_cursor": "..."}
+
+Each entity is read in id order from a server-side cursor (``yield_per``)
+and written out a batch at a time, so memory stays bounded however large
+the fleet is. After every batch, and at the end of each entity, a
+``cursor`` line records where the stream is; a client whose connection
+drops asks for ``?cursor=`` of the last one it received and the stream
+resumes after it. The final ``sync_cursor`` is a ``/api/sync/data`` cursor
+positioned at the start of the snapshot, so changes made while it streamed
+are picked up by the first delta sync.
+"""
+
+import json
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import Date
+
+from data_export import EXPORT_BATCH_SIZE, iter_rows
+from delta_sync import ENTITIES, encode_cursor
+from change_log import latest_seq
+from models import MaintenanceRecord, AuditTaskCompletion
+
+# Days of maintenance and audit history in a snapshot
+HISTORY_DAYS = 365
+
+# History entities and the column their window applies to
+HISTORY_COLUMNS = {
+    'maintenance_records': MaintenanceRecord.date,
+    'audit_task_completions': AuditTaskCompletion.date,
+}
+
+
+def _isoformat(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(obj):
+    return json.dumps(obj, default=_isoformat, separators=(',', ':'))
+
+
+def encode_snapshot_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, sort_keys=True).encode()).decode()
+
+
+def open_snapshot(session, cursor=None, history_days=HISTORY_DAYS):
+    """Snapshot state to stream from: a new snapshot, or the one ``cursor`` resumes.
+
+    Raises ValueError for an invalid cursor.
+    """
+    if cursor:
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            datetime.fromisoformat(state['started_at'])
+            datetime.fromisoformat(state['history_since'])
+            state['after'], state['seq'] = int(state['after']), int(state['seq'])
+        except (TypeError, ValueError, AttributeError, KeyError) as e:
+            raise ValueError(f"Invalid snapshot cursor: {e}")
+        if state['entity'] is not None and state['entity'] not in ENTITIES:
+            raise ValueError(f"Invalid snapshot cursor: unknown entity {state['entity']}")
+        return state
+    started_at = datetime.utcnow()
+    return {
+        'entity': next(iter(ENTITIES)),
+        'after': 0,
+        'started_at': started_at.isoformat(),
+        'seq': latest_seq(session.connection()),
+        'history_since': (started_at - timedelta(days=max(0, int(history_days)))).isoformat(),
+    }
+
+
+def snapshot_query(entity, site_ids=None, after=0, history_since=None):
+    """Rows of ``entity`` after id ``after`` in id order, restricted to ``site_ids`` (None = all)."""
+    spec = ENTITIES[entity]
+    stmt = spec.select().where(spec.model.id > after).order_by(spec.model.id)
+    if site_ids is not None:
+        stmt = stmt.where(spec.site_column.in_(site_ids))
+    column = HISTORY_COLUMNS.get(entity)
+    if column is not None and history_since is not None:
+        stmt = stmt.where(column >= (history_since.date() if isinstance(column.type, Date) else history_since))
+    return stmt
+
+
+def stream_snapshot(state, site_ids=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the NDJSON of the snapshot ``state``, one chunk per batch of rows."""
+    entities = list(ENTITIES)
+    remaining = entities[entities.index(state['entity']):] if state['entity'] is not None else []
+    history_since = datetime.fromisoformat(state['history_since'])
+    counts = {}
+    for position, entity in enumerate(remaining):
+        after = state['after'] if position == 0 else 0
+        lines, count = [], 0
+        for row in iter_rows(snapshot_query(entity, site_ids, after, history_since), batch_size):
+            lines.append(_line({'entity': entity, 'data': dict(row._mapping)}))
+            after, count = row.id, count + 1
+            if len(lines) >= batch_size:
+                lines.append(_line({'cursor': encode_snapshot_cursor(dict(state, entity=entity, after=after))}))
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        counts[entity] = count
+        following = remaining[position + 1] if position + 1 < len(remaining) else None
+        lines.append(_line({'cursor': encode_snapshot_cursor(dict(state, entity=following, after=0))}))
+        yield '\n'.join(lines) + '\n'
+
+    started_at = datetime.fromisoformat(state['started_at'])
+    sync_cursor = encode_cursor({entity: (started_at, 0) for entity in entities}, state['seq'])
+    yield _line({'done': True, 'counts': counts, 'sync_cursor': sync_cursor}) + '\n'
@@ -46,6 +46,10 @@ app = application
 EOL
 fi
 
+# Run one-shot migrations so gunicorn workers only check the schema marker
+echo "Preparing database..."
+python -m flask --app app db-prepare || echo "Warning: flask db-prepare failed, workers will retry on import"
+
 # Start the application
 echo "Starting application with gunicorn..."
 exec $GUNICORN_PATH app:app
@@ -0,0 +1,121 @@
+"""
+Startup timeline for the AMRS Maintenance Tracker.
+
+app.py marks named phases while it imports (third-party imports, config,
+database init, schema check, routes, ...). Each phase records wall-clock
+time and the number of SQL statements executed, and the finished timeline
+is logged as one JSON line (and optionally written to a file) so cold-start
+regressions can be compared release to release.
+
+Run with ``--profile-startup`` (or ``PROFILE_STARTUP=true``) to also capture
+a cProfile of the whole import; stats are dumped to ``startup_profile.prof``
+and the top entries are printed.
+
+Only the standard library is imported at module level so the timer can
+start before the heavy imports it is meant to measure; SQLAlchemy (for the
+statement counter on ``Engine``) is imported inside the methods that hook
+it, once the timer is running.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def profiling_requested(argv=None):
+    argv = sys.argv if argv is None else argv
+    return '--profile-startup' in argv or os.environ.get('PROFILE_STARTUP', 'false').lower() == 'true'
+
+
+class StartupTimeline:
+    """Record named startup phases with wall time and SQL statement counts."""
+
+    def __init__(self, profile=False):
+        self.started_at = datetime.utcnow()
+        self._t0 = time.perf_counter()
+        self._last_mark = self._t0
+        self._last_queries = 0
+        self.query_count = 0
+        self.phases = []
+        self.finished = False
+        self.total_ms = None
+        self._profiler = None
+        if profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        # Count statements on every engine created during startup
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'before_cursor_execute', self._count_query)
+
+    def _count_query(self, *args):
+        self.query_count += 1
+
+    def mark(self, name):
+        """Close the phase that started at the previous mark and name it ``name``."""
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.phases.append({
+            'name': name,
+            'wall_ms': round((now - self._last_mark) * 1000, 2),
+            'queries': self.query_count - self._last_queries,
+        })
+        self._last_mark = now
+        self._last_queries = self.query_count
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at.isoformat(),
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'python': sys.version.split()[0],
+            'total_ms': self.total_ms,
+            'total_queries': sum(p['queries'] for p in self.phases),
+            'profiled': self._profiler is not None,
+            'phases': self.phases,
+        }
+
+    def finish(self, output_path=None):
+        """Stop the clock, log the timeline as JSON and write it to ``output_path``.
+
+        Safe to call more than once; only the first call has an effect.
+        """
+        if self.finished:
+            return self.to_dict()
+        self.total_ms = round((time.perf_counter() - self._t0) * 1000, 2)
+        self.finished = True
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.remove(Engine, 'before_cursor_execute', self._count_query)
+
+        timeline = self.to_dict()
+        print(f"[STARTUP] Timeline: {json.dumps(timeline)}")
+        output_path = output_path or os.environ.get('STARTUP_PROFILE_FILE')
+        if output_path:
+            try:
+                with open(output_path, 'w') as f:
+                    json.dump(timeline, f, indent=2)
+            except OSError as e:
+                print(f"[STARTUP] Could not write startup timeline to {output_path}: {e}")
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._dump_profile()
+        return timeline
+
+    def _dump_profile(self, path='startup_profile.prof', limit=30):
+        import pstats
+        try:
+            self._profiler.dump_stats(path)
+            print(f"[STARTUP] cProfile stats written to {path} (view with `python -m pstats {path}`)")
+        except OSError as e:
+            print(f"[STARTUP] Could not write cProfile stats: {e}")
+        pstats.Stats(self._profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(limit)
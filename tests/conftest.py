@@ -1,16 +1,21 @@
 import os
+from string import ascii_uppercase
 import pytest
 from app import app as flask_app, db as _db, ensure_db_schema
-from models import User, Role, Site, Machine, Part, MaintenanceRecord
+from models import User, Role, Site, Machine, Part, MaintenanceRecord, MaintenanceStat, hash_value, user_site
 from flask import template_rendered
 from contextlib import contextmanager
 from auto_migrate import run_auto_migration
 
+# Per-request SQL statement budgets (query_budget fixture/marker, seeded_fleet datasets)
+pytest_plugins = ['tests.query_budget']
+
 @pytest.fixture(scope='session')
-def app():
+def app(tmp_path_factory):
     # Always use in-memory SQLite for tests
     flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     flask_app.config['TESTING'] = True
+    flask_app.config['IMPORT_UPLOAD_DIR'] = str(tmp_path_factory.mktemp('imports'))
     flask_app.config['WTF_CSRF_ENABLED'] = False
     with flask_app.app_context():
         _db.create_all()
@@ -32,7 +37,8 @@ def client(app, db):
 @pytest.fixture
 def login_admin(client, db):
     def do_login():
-        admin = User.query.filter_by(username='admin').first()
+        # username is an encrypted property; look the admin up by its hash
+        admin = User.query.filter_by(username_hash=hash_value('admin')).first()
         if not admin:
             admin_role = Role.query.filter_by(name='admin').first()
             if not admin_role:
@@ -74,8 +80,70 @@ def setup_test_data(db):
     db.session.add(machine)
     db.session.commit()
     # Assign admin user to both sites
-    admin = User.query.filter_by(username='admin').first()
+    admin = User.query.filter_by(username_hash=hash_value('admin')).first()
     if admin:
         admin.sites = [site1, site2]
         db.session.commit()
     return {'site1': site1, 'site2': site2, 'machine': machine, 'admin': admin}
+
+
+@pytest.fixture
+def fleet_spec():
+    """Shape of the ``fleet`` fixture; override it in a test module or parametrize it."""
+    return {}
+
+
+@pytest.fixture
+def fleet(db, login_admin, fleet_spec):
+    """Sites, machines, parts and maintenance records built from ``fleet_spec``, removed afterwards.
+
+    ``fleet_spec`` keys: ``name`` (prefix of every name), ``sites``, ``machines`` per site,
+    ``parts`` per machine (a count, or a list of column values per part), ``site`` and
+    ``part`` (column values for every site and part) and ``records`` (column values of each
+    record, on the part at index ``part``). Teardown removes everything under the sites,
+    including rows the test added there.
+    """
+    from api_endpoints import create_token
+    spec = {'name': 'Fleet', 'sites': 1, 'machines': 1, 'parts': 1, 'site': {}, 'part': {}, 'records': [],
+            **fleet_spec}
+    login_admin()
+    admin = User.query.filter_by(username_hash=hash_value('admin')).first()
+    name = lambda kind, index, count: f"{spec['name']} {kind}" + (f' {index}' if count > 1 else '')
+    sites = [Site(name=name('Site', ascii_uppercase[i], spec['sites']), **spec['site'])
+             for i in range(spec['sites'])]
+    db.session.add_all(sites)
+    db.session.commit()
+    machine_sites = [site.id for site in sites for _ in range(spec['machines'])]
+    machines = [Machine(name=name('Machine', i, len(machine_sites)), site_id=site_id)
+                for i, site_id in enumerate(machine_sites)]
+    db.session.add_all(machines)
+    db.session.commit()
+    per_machine = spec['parts'] if isinstance(spec['parts'], list) else [{}] * spec['parts']
+    part_rows = [(machine.id, values) for machine in machines for values in per_machine]
+    parts = [Part(name=name('Part', i, len(part_rows)), machine_id=machine_id, **{**spec['part'], **values})
+             for i, (machine_id, values) in enumerate(part_rows)]
+    db.session.add_all(parts)
+    db.session.commit()
+    records = []
+    for values in spec['records']:
+        values = dict(values)
+        part = parts[values.pop('part', 0)]
+        records.append(MaintenanceRecord(part_id=part.id, machine_id=part.machine_id, user_id=admin.id, **values))
+    db.session.add_all(records)
+    db.session.commit()
+    site_ids = [site.id for site in sites]
+    yield {'admin': admin, 'headers': {'Authorization': f'Bearer {create_token(admin)}'},
+           'sites': sites, 'machines': machines, 'parts': parts, 'records': records,
+           'site': sites[0], 'machine': machines[0]}
+    db.session.rollback()
+    machine_ids = [machine_id for (machine_id,) in db.session.query(Machine.id).filter(Machine.site_id.in_(site_ids))]
+    part_ids = [part_id for (part_id,) in db.session.query(Part.id).filter(Part.machine_id.in_(machine_ids))]
+    MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids)).delete()
+    for entity_type, ids in (('site', site_ids), ('machine', machine_ids), ('part', part_ids)):
+        MaintenanceStat.query.filter(MaintenanceStat.entity_type == entity_type,
+                                     MaintenanceStat.entity_id.in_(ids)).delete()
+    Part.query.filter(Part.id.in_(part_ids)).delete()
+    Machine.query.filter(Machine.id.in_(machine_ids)).delete()
+    db.session.execute(user_site.delete().where(user_site.c.site_id.in_(site_ids)))
+    Site.query.filter(Site.id.in_(site_ids)).delete()
+    db.session.commit()
@@ -0,0 +1,103 @@
+"""
+Pytest plugin enforcing per-request SQL statement budgets.
+
+Use the ``query_budget`` fixture to issue a request and assert it stays
+within a declared number of statements, or mark a whole test with
+``@pytest.mark.query_budget(n)`` to check every request it makes. Budgets
+are meant to be checked against the ``seeded_fleet`` datasets (10 and 1,000
+machines) so a route whose query count grows with data size fails.
+"""
+
+import pytest
+from sqlalchemy import delete
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(max_queries): fail if any request in the test issues more SQL statements'
+    )
+
+
+class QueryRecorder:
+    """Collects per-request query stats from QueryInstrumentation."""
+
+    def __init__(self, db):
+        self.db = db
+        self.requests = []
+
+    def __call__(self, endpoint, path, stats):
+        self.requests.append((path, stats))
+
+    def request(self, client, path, max_queries, method='get', **kwargs):
+        """Issue a request with a cold session and assert its statement budget."""
+        # Start from an empty identity map so the count matches a real request
+        self.db.session.expunge_all()
+        start = len(self.requests)
+        response = getattr(client, method)(path, **kwargs)
+        recorded = self.requests[start:]
+        assert recorded, f"No instrumented request recorded for {path}"
+        for req_path, stats in recorded:
+            self.check(req_path, stats, max_queries)
+        return response
+
+    def check(self, path, stats, max_queries):
+        if stats.count > max_queries:
+            statements = '\n'.join(f"  {i + 1}. {' '.join(s.split())[:200]}"
+                                   for i, s in enumerate(stats.statements or []))
+            pytest.fail(f"{path} issued {stats.count} SQL statements (budget {max_queries}):\n{statements}",
+                        pytrace=False)
+
+
+@pytest.fixture
+def query_budget(app, db):
+    instrumentation = app.extensions['query_instrumentation']
+    recorder = QueryRecorder(db)
+    instrumentation.record_statements = True
+    instrumentation.add_listener(recorder)
+    yield recorder
+    instrumentation.remove_listener(recorder)
+    instrumentation.record_statements = False
+
+
+@pytest.fixture(autouse=True)
+def _enforce_query_budget_marker(request):
+    marker = request.node.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    recorder = request.getfixturevalue('query_budget')
+    yield
+    for path, stats in recorder.requests:
+        recorder.check(path, stats, marker.args[0])
+
+
+# IDs for seeded rows start here so cleanup never touches other tests' data
+SEED_ID_BASE = 1_000_000
+MACHINES_PER_SITE = 10
+
+
+@pytest.fixture(params=[10, 1000], ids=lambda n: f'{n}-machines')
+def seeded_fleet(request, db):
+    """Seed a fleet of ``request.param`` machines (with parts, audits and history)."""
+    from generate_fleet_data import generate_fleet
+    from models import Site, Machine, Part, MaintenanceRecord, AuditTask, AuditTaskCompletion, machine_audit_task
+
+    base = SEED_ID_BASE
+    counts = generate_fleet(db.session.connection(), sites=max(1, request.param // MACHINES_PER_SITE),
+                            machines_per_site=min(request.param, MACHINES_PER_SITE), parts_per_machine=3,
+                            records_per_part=1, audit_tasks_per_site=2, audit_days=1, id_base=base)
+    db.session.commit()
+    counts['id_base'] = base
+
+    yield counts
+
+    db.session.rollback()
+    db.session.execute(delete(AuditTaskCompletion).where(AuditTaskCompletion.id >= base))
+    db.session.execute(delete(machine_audit_task).where(machine_audit_task.c.audit_task_id >= base))
+    db.session.execute(delete(AuditTask).where(AuditTask.id >= base))
+    db.session.execute(delete(MaintenanceRecord).where(MaintenanceRecord.id >= base))
+    db.session.execute(delete(Part).where(Part.id >= base))
+    db.session.execute(delete(Machine).where(Machine.id >= base))
+    db.session.execute(delete(Site).where(Site.id >= base))
+    db.session.commit()
+    db.session.expunge_all()
@@ -0,0 +1,94 @@
+import gzip
+import datetime as dt
+from datetime import datetime
+
+import jwt
+import pytest
+
+import api_caching
+from models import User, Site, Machine, Part, hash_value
+
+
+@pytest.fixture
+def fleet(db, login_admin):
+    login_admin()
+    admin = User.query.filter_by(username_hash=hash_value('admin')).first()
+    site = Site(name='Polled Site')
+    db.session.add(site)
+    db.session.commit()
+    machine = Machine(name='Polled Machine', site_id=site.id)
+    db.session.add(machine)
+    db.session.commit()
+    parts = [Part(name=f'Polled Part {i}', description='x' * 100, machine_id=machine.id,
+                  next_maintenance=datetime(2030, 1, 1)) for i in range(20)]
+    db.session.add_all(parts)
+    db.session.commit()
+    part_ids, machine_id, site_id = [part.id for part in parts], machine.id, site.id
+    yield {'admin': admin, 'site': site, 'machine': machine, 'parts': parts}
+    db.session.rollback()
+    Part.query.filter(Part.id.in_(part_ids)).delete()
+    Machine.query.filter_by(id=machine_id).delete()
+    Site.query.filter_by(id=site_id).delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def headers(fleet):
+    from api_endpoints import JWT_SECRET_KEY
+    token = jwt.encode({'user_id': fleet['admin'].id, 'exp': dt.datetime.utcnow() + dt.timedelta(minutes=5)},
+                       JWT_SECRET_KEY)
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_unchanged_collection_is_not_modified(client, headers):
+    response = client.get('/api/parts', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.get('/api/parts', headers={**headers, 'If-None-Match': etag})
+    assert (response.status_code, response.data, response.headers['ETag']) == (304, b'', etag)
+    # Another URL is another representation
+    assert client.get('/api/parts?status=ok', headers=headers).headers['ETag'] != etag
+
+
+def test_change_invalidates_dependent_collections(client, db, fleet, headers):
+    etags = {path: client.get(path, headers=headers).headers['ETag']
+             for path in ('/api/sites', '/api/machines', '/api/parts')}
+
+    fleet['parts'][0].name = 'Polled Part renamed'
+    db.session.commit()
+    conditional = lambda path: client.get(path, headers={**headers, 'If-None-Match': etags[path]})
+    assert conditional('/api/sites').status_code == 304
+    assert conditional('/api/machines').status_code == 304
+    response = conditional('/api/parts')
+    assert response.status_code == 200
+    assert 'Polled Part renamed' in {part['name'] for part in response.get_json()}
+
+    # Parts and machines show the site name
+    fleet['site'].name = 'Polled Site renamed'
+    db.session.commit()
+    assert all(conditional(path).status_code == 200 for path in etags)
+
+
+def test_large_json_is_gzipped(client, headers):
+    plain = client.get('/api/parts', headers=headers)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = client.get('/api/parts', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert int(response.headers['Content-Length']) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] == plain.headers['ETag']
+
+
+def test_small_json_is_sent_as_is(client, headers):
+    response = client.get('/api/health', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+@pytest.mark.skipif(api_caching.brotli is None, reason='brotli not installed')
+def test_brotli_preferred_when_accepted(client, headers):
+    response = client.get('/api/parts', headers={**headers, 'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
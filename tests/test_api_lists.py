@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import User, Role, Site, user_site
+
+
+@pytest.fixture
+def fleet_spec():
+    now = datetime.utcnow()
+    # Hours of margin either side of each days_until boundary
+    due = [now - timedelta(hours=2), now + timedelta(hours=2), now + timedelta(days=7, hours=22),
+           now + timedelta(days=8, hours=2), now + timedelta(days=90)]
+    return {'name': 'Listed', 'site': {'notification_threshold': 7}, 'machines': 3,
+            'parts': [{'next_maintenance': when} for when in due]}
+
+
+def _ids(fleet):
+    """The first machine's parts by due date, the machine ids and the site id"""
+    parts = dict(zip(('overdue', 'today', 'edge', 'after', 'later'), (part.id for part in fleet['parts'])))
+    return parts, [machine.id for machine in fleet['machines']], fleet['site'].id
+
+
+def _get(client, fleet, path):
+    response = client.get(path, headers=fleet['headers'])
+    assert response.status_code == 200
+    return response
+
+
+def test_status_is_computed_in_sql_with_site_threshold(client, fleet):
+    due, machine_ids, _ = _ids(fleet)
+    machine_id = machine_ids[0]
+    parts = {part['id']: part for part in _get(client, fleet, f'/api/parts?machine_id={machine_id}').get_json()}
+    status = {key: parts[part_id]['status'] for key, part_id in due.items()}
+    assert status == {'overdue': 'overdue', 'today': 'due_soon', 'edge': 'due_soon', 'after': 'ok', 'later': 'ok'}
+    assert [parts[due[key]]['days_until'] for key in ('overdue', 'today', 'edge', 'after')] == [-1, 0, 7, 8]
+    assert parts[due['edge']]['site_name'] == 'Listed Site'
+
+    due_soon = _get(client, fleet, f'/api/parts?machine_id={machine_id}&status=due_soon').get_json()
+    assert {part['id'] for part in due_soon} == {due['today'], due['edge']}
+    assert _get(client, fleet, f'/api/parts?machine_id={machine_id}&status=unknown').get_json() == []
+
+
+def test_machine_detail_uses_site_threshold(client, fleet):
+    due, machine_ids, _ = _ids(fleet)
+    parts = {part['id']: part for part in _get(client, fleet, f'/api/machines/{machine_ids[0]}').get_json()['parts']}
+    assert {key: parts[part_id]['status'] for key, part_id in due.items()} == \
+        {'overdue': 'overdue', 'today': 'due_soon', 'edge': 'due_soon', 'after': 'ok', 'later': 'ok'}
+
+
+def test_parts_pages_follow_link_header(client, fleet):
+    due, machine_ids, _ = _ids(fleet)
+    machine_id = machine_ids[0]
+    seen, path = [], f'/api/parts?machine_id={machine_id}&limit=2'
+    while path:
+        response = _get(client, fleet, path)
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(part['id'] for part in page)
+        link = response.headers.get('Link')
+        path = link[1:link.index('>')] if link else None
+    assert seen == sorted(due.values())
+
+
+def test_machines_paging_and_site_name(client, fleet):
+    _, machine_ids, site_id = _ids(fleet)
+    first = _get(client, fleet, f'/api/machines?site_id={site_id}&limit=2')
+    assert [machine['id'] for machine in first.get_json()] == machine_ids[:2]
+    assert f'after={machine_ids[1]}' in first.headers['Link']
+    rest = _get(client, fleet, f'/api/machines?site_id={site_id}&after={machine_ids[1]}')
+    assert [(machine['id'], machine['site_name']) for machine in rest.get_json()] == \
+        [(machine_ids[2], 'Listed Site')]
+    assert 'Link' not in rest.headers
+
+
+def test_filters_stay_within_user_sites(client, db, fleet):
+    _, machine_ids, site_id = _ids(fleet)
+    role = Role(name='Other Site Tech', permissions='maintenance.record')
+    other = Site(name='Other Listed Site')
+    db.session.add_all([role, other])
+    db.session.commit()
+    user = User(username='othersitetech', email='othersitetech@example.com', password_hash='x',
+                role=role, sites=[other])
+    db.session.add(user)
+    db.session.commit()
+    ids = (user.id, role.id, other.id)
+    try:
+        from api_endpoints import create_token
+        headers = {'Authorization': f'Bearer {create_token(user)}'}
+        machines = client.get(f'/api/machines?site_id={site_id}', headers=headers)
+        assert (machines.status_code, machines.get_json()) == (200, [])
+        parts = client.get(f'/api/parts?machine_id={machine_ids[0]}', headers=headers)
+        assert (parts.status_code, parts.get_json()) == (200, [])
+    finally:
+        db.session.rollback()
+        db.session.execute(user_site.delete().where(user_site.c.user_id == ids[0]))
+        User.query.filter_by(id=ids[0]).delete()
+        Role.query.filter_by(id=ids[1]).delete()
+        Site.query.filter_by(id=ids[2]).delete()
+        db.session.commit()
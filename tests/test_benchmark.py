@@ -0,0 +1,14 @@
+from benchmark_app import percentile, summarize, compare
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+def test_compare_flags_p95_regression():
+    baseline = {'endpoints': {'/dashboard': summarize([10.0] * 20, 0, [3])}}
+    slower = {'endpoints': {'/dashboard': summarize([15.0] * 20, 0, [3])}}
+    assert compare(slower, baseline, max_regression_pct=20)
+    assert not compare(baseline, baseline, max_regression_pct=20)
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from change_log import changes_since, latest_seq
+from maintenance_batch import record_batch
+from models import User, Part, ChangeLog, hash_value
+
+
+@pytest.fixture
+def fleet_spec():
+    return {'name': 'Change Log', 'parts': 0}
+
+
+def _log(db, since, entity=None):
+    rows = changes_since(db.session.connection(), since, entities=[entity] if entity else None)
+    return [(row.entity, row.entity_id, row.op, row.version) for row in rows]
+
+
+def test_orm_writes_are_logged_in_order(db, fleet):
+    since = latest_seq(db.session.connection())
+    part = Part(name='Logged Part', machine_id=fleet['machine'].id, next_maintenance=datetime(2030, 1, 1))
+    db.session.add(part)
+    db.session.commit()
+    part.name = 'Logged Part renamed'
+    db.session.commit()
+    part_id = part.id
+    db.session.delete(part)
+    db.session.commit()
+
+    logged = _log(db, since, 'parts')
+    assert [entry[:3] for entry in logged] == [('parts', part_id, 'insert'), ('parts', part_id, 'update'),
+                                               ('parts', part_id, 'delete')]
+    # Versions count the changes of one row (ids may be reused, so relative)
+    assert [entry[3] - logged[0][3] for entry in logged] == [0, 1, 2]
+    seqs = [row.seq for row in changes_since(db.session.connection(), since)]
+    assert seqs == sorted(seqs)
+
+
+def test_batch_ingest_logs_inserts_and_reschedules(db, fleet):
+    part = Part(name='Batch Part', machine_id=fleet['machine'].id, last_maintenance=datetime(2025, 1, 1),
+                next_maintenance=datetime(2030, 1, 1))
+    db.session.add(part)
+    db.session.commit()
+    admin = User.query.filter_by(username_hash=hash_value('admin')).first()
+    since = latest_seq(db.session.connection())
+
+    results = record_batch(db.session, [{'part_id': part.id, 'date': '2026-01-05'}], admin)
+    db.session.commit()
+
+    logged = _log(db, since)
+    assert [entry[:3] for entry in logged] == [('maintenance_records', results[0]['record_id'], 'insert'),
+                                               ('parts', part.id, 'update')]
+    # The reschedule follows the part's own insert
+    assert logged[1][3] == _log(db, 0, 'parts')[-2][3] + 1
+
+
+def test_deleted_part_is_a_sync_tombstone(client, db, fleet):
+    part = Part(name='Doomed Part', machine_id=fleet['machine'].id, next_maintenance=datetime(2030, 1, 1))
+    db.session.add(part)
+    db.session.commit()
+    part_id = part.id
+    cursor = client.post('/api/sync/data', json={'type': 'pull'}).get_json()['cursor']
+
+    client.post(f'/parts/delete/{part_id}')
+
+    page = client.post('/api/sync/data', json={'type': 'pull', 'last_sync': cursor}).get_json()
+    assert [row['id'] for row in page['deleted']['parts']] == [part_id]
+    assert page['data']['parts'] == []
+    # The tombstone is delivered once
+    page = client.post('/api/sync/data', json={'type': 'pull', 'last_sync': page['cursor']}).get_json()
+    assert page['deleted']['parts'] == []
+
+
+def test_changes_api_tails_the_log(client, db, fleet):
+    since = latest_seq(db.session.connection())
+    db.session.add_all([Part(name=f'Tail Part {i}', machine_id=fleet['machine'].id, next_maintenance=datetime(2030, 1, 1))
+                        for i in range(3)])
+    db.session.commit()
+
+    first = client.get(f'/api/changes?since={since}&limit=2&entity=parts').get_json()
+    assert [change['op'] for change in first['changes']] == ['insert', 'insert']
+    rest = client.get(f'/api/changes?since={first["next_seq"]}&entity=parts').get_json()
+    assert len(rest['changes']) == 1
+    assert rest['next_seq'] == ChangeLog.query.filter_by(entity='parts').order_by(ChangeLog.seq.desc()).first().seq
+
+
+def test_changes_api_requires_admin(client, db):
+    user = User(username='changes-viewer', email='changes-viewer@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    assert client.get('/api/changes').status_code == 403
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
@@ -0,0 +1,72 @@
+import io
+import csv
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+import data_export
+
+
+@pytest.fixture
+def fleet_spec():
+    return {'name': 'Export',
+            'records': [{'date': datetime(2024, month, 10), 'description': f'Service {month}'} for month in (1, 2, 3)]}
+
+
+def _csv_rows(response):
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_csv_export_streams_rows(client, fleet):
+    response = client.get(f'/export/maintenance_records?site_id={fleet["site"].id}')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = _csv_rows(response)
+    assert rows[0][:3] == ['id', 'date', 'part_id']
+    assert [row[rows[0].index('description')] for row in rows[1:]] == ['Service 1', 'Service 2', 'Service 3']
+
+
+def test_csv_export_date_range_is_inclusive(client, fleet):
+    response = client.get(f'/export/maintenance_records?site_id={fleet["site"].id}'
+                          '&start_date=2024-02-01&end_date=2024-03-10')
+    rows = _csv_rows(response)
+    assert [row[rows[0].index('description')] for row in rows[1:]] == ['Service 2', 'Service 3']
+
+
+def test_csv_export_chunks_by_batch_size(app, fleet):
+    stmt = data_export.build_query('maintenance_records', site_id=fleet['site'].id)
+    chunks = list(data_export.stream_csv(stmt, batch_size=1))
+    # header + first row, then one row per chunk, then the (empty) tail
+    assert len(chunks) == 4
+
+
+def test_xlsx_export(client, fleet):
+    response = client.get(f'/export/parts?format=xlsx&site_id={fleet["site"].id}')
+    assert response.status_code == 200
+    workbook = load_workbook(io.BytesIO(response.data), read_only=True)
+    rows = list(workbook['parts'].iter_rows(values_only=True))
+    assert rows[0][:2] == ('id', 'name')
+    assert [row[1] for row in rows[1:]] == ['Export Part']
+
+
+def test_export_restricted_to_user_sites(app, fleet):
+    stmt = data_export.build_query('machines', site_ids=[])
+    assert list(data_export.iter_rows(stmt)) == []
+
+
+def test_parquet_export_requires_pyarrow(client, login_admin):
+    if data_export.pa is not None:
+        pytest.skip('pyarrow is installed')
+    login_admin()
+    response = client.get('/export/sites?format=parquet')
+    assert response.status_code == 501
+
+
+def test_export_rejects_unknown_entity_and_format(client, login_admin):
+    login_admin()
+    assert client.get('/export/widgets').status_code == 404
+    assert client.get('/export/sites?format=pdf').status_code == 400
+    assert client.get('/export/maintenance_records?start_date=yesterday').status_code == 400
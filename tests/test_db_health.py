@@ -0,0 +1,59 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from db_health import CircuitBreaker, DatabaseHealthMonitor
+
+def test_health_check_reports_database_state(client):
+    response = client.get('/health-check')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['status'] == 'ok'
+    assert data['database']['state'] == 'closed'
+    assert data['database']['healthy'] is True
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure('boom')
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure('boom')
+    assert breaker.is_open
+    # With a zero reset timeout the next check moves to half-open for a trial probe
+    assert breaker.should_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+def test_open_circuit_fails_fast(app, client):
+    monitor = app.extensions['db_health']
+    original = monitor.breaker
+    monitor.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    monitor.breaker.record_failure('database is down')
+    try:
+        response = client.get('/api/sync/status')
+        assert response.status_code == 503
+        assert response.headers.get('Retry-After') is not None
+        assert response.get_json()['database']['state'] == 'open'
+    finally:
+        monitor.breaker = original
+
+def test_failed_probe_counts_once(tmp_path):
+    class UnreachableDatabase:
+        engine = create_engine(f'sqlite:///{tmp_path}/missing/amrs.db')
+    monitor = DatabaseHealthMonitor(Flask(__name__), UnreachableDatabase())
+    monitor.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    assert monitor.check_now() is False
+    # The engine's handle_error hook does not count the probe's own failure again
+    assert monitor.breaker.consecutive_failures == 1
+    assert monitor.breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_admits_only_the_probe(app):
+    monitor = app.extensions['db_health']
+    original = monitor.breaker
+    monitor.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    monitor.breaker.state = CircuitBreaker.HALF_OPEN
+    try:
+        # Another request while the trial probe is in flight still fails fast
+        assert monitor.allow_request() is False
+    finally:
+        monitor.breaker = original
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, event
+from schema_migrations import SCHEMA_VERSION, get_schema_version, set_schema_version, schema_is_current
+
+def test_schema_marker_roundtrip(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'marker.db'}")
+    assert get_schema_version(engine) is None
+    assert not schema_is_current(engine)
+    set_schema_version(engine, SCHEMA_VERSION)
+    set_schema_version(engine, SCHEMA_VERSION)  # idempotent
+    assert get_schema_version(engine) == SCHEMA_VERSION
+    assert schema_is_current(engine)
+
+def test_marker_check_is_single_query(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'marker.db'}")
+    set_schema_version(engine, SCHEMA_VERSION)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    assert schema_is_current(engine)
+    assert len(statements) == 1
+
+def test_db_prepare_command_records_version(app, db):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['db-prepare'])
+    assert result.exit_code == 0, result.output
+    assert schema_is_current(db.engine)
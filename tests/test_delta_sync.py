@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from delta_sync import ENTITIES, decode_cursor
+from models import MaintenanceRecord
+
+# User load, one keyset query per entity and the change_log tombstone reads, whatever the fleet size
+PULL_BUDGET = 4 + len(ENTITIES)
+
+
+@pytest.fixture
+def fleet_spec():
+    return {'name': 'Sync', 'parts': 5, 'part': {'next_maintenance': datetime(2030, 1, 1)}}
+
+
+def _pull(client, **payload):
+    response = client.post('/api/sync/data', json={'type': 'pull', **payload})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_pull_pages_through_changes(client, fleet):
+    part_ids = {part.id for part in fleet['parts']}
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = _pull(client, entity_type='parts', limit=2, last_sync=cursor)
+        seen.extend(row['id'] for row in page['data']['parts'])
+        cursor, pages = page['cursor'], pages + 1
+        if not page['has_more']:
+            break
+    assert part_ids <= set(seen)
+    assert len(seen) == len(set(seen))
+    assert pages >= 3
+    assert _pull(client, entity_type='parts', last_sync=cursor)['data']['parts'] == []
+
+
+def test_pull_returns_only_changed_rows(client, db, fleet):
+    since = datetime.utcnow().isoformat()
+    part = fleet['parts'][2]
+    part.name = 'Sync Part renamed'
+    db.session.commit()
+
+    page = _pull(client, last_sync=since)
+    assert set(page['data']) == set(ENTITIES)
+    assert [row['name'] for row in page['data']['parts']] == ['Sync Part renamed']
+    assert page['data']['parts'][0]['site_id'] == fleet['site'].id
+    assert page['data']['machines'] == []
+    assert decode_cursor(page['cursor'])[0]['parts'][1] == part.id
+    # Nothing changed since the cursor
+    assert all(rows == [] for rows in _pull(client, last_sync=page['cursor'])['data'].values())
+
+
+def test_push_upserts_by_client_id(client, db, fleet):
+    part = fleet['parts'][0]
+    item = {'part_id': part.id, 'date': '2026-01-05', 'notes': 'offline', 'client_id': 'sync-push-1'}
+    push = lambda items: client.post('/api/sync/data', json={'type': 'push', 'items': items}).get_json()
+
+    assert push([item])['created'] == 1
+    since = datetime.utcnow().isoformat()
+    assert (push([item])['unchanged'], _pull(client, entity_type='maintenance_records', last_sync=since)['data']
+            ['maintenance_records']) == (1, [])
+
+    result = push([dict(item, notes='edited offline')])
+    assert (result['created'], result['updated']) == (0, 1)
+    assert result['results'][0]['status'] == 'updated'
+    pulled = _pull(client, entity_type='maintenance_records', last_sync=since)['data']['maintenance_records']
+    assert [(row['client_id'], row['notes']) for row in pulled] == [('sync-push-1', 'edited offline')]
+    assert MaintenanceRecord.query.filter_by(client_id='sync-push-1').count() == 1
+
+
+def test_sync_rejects_bad_requests(client, fleet):
+    assert client.post('/api/sync/data', json={'type': 'pull', 'last_sync': 'not-a-cursor'}).status_code == 400
+    assert client.post('/api/sync/data', json={'type': 'pull', 'entity_type': 'users'}).status_code == 400
+    assert client.post('/api/sync/data', json={'type': 'push', 'entity_type': 'parts',
+                                               'items': [{'id': 1}]}).status_code == 400
+    assert client.post('/api/sync/data', json={'type': 'other'}).status_code == 400
+
+
+def test_timestamp_cursor_offsets_are_converted_to_utc():
+    positions, seq, since = decode_cursor('2026-01-01T00:00:00+02:00')
+    assert since == datetime(2025, 12, 31, 22, 0) and seq is None
+    assert positions['parts'] == (since, 0)
+    assert decode_cursor('2026-01-01T00:00:00')[2] == datetime(2026, 1, 1)
+
+
+def test_pull_cost_follows_changes(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    response = query_budget.request(client, '/api/sync/data', PULL_BUDGET, method='post',
+                                    json={'type': 'pull', 'last_sync': datetime.utcnow().isoformat()})
+    assert all(rows == [] for rows in response.get_json()['data'].values())
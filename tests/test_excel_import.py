@@ -12,3 +12,248 @@ def test_excel_import(client, db, login_admin):
     # Check that at least one part or record was created (assuming Part model)
     from models import Part
     assert Part.query.count() > 0
+
+
+def _write_workbook(path, sites, machines_per_site, parts_per_machine, prefix='XL'):
+    import pandas as pd
+    site_rows = [{'name': f'{prefix} Site {s}', 'location': f'Plant {s}'} for s in range(sites)]
+    machine_rows = [{'name': f'{prefix} Machine {s}-{m}', 'site_name': f'{prefix} Site {s}', 'model': 'X1'}
+                    for s in range(sites) for m in range(machines_per_site)]
+    part_rows = [{'name': f'Part {p}', 'machine_name': f'{prefix} Machine {s}-{m}', 'site_name': f'{prefix} Site {s}',
+                  'maintenance_frequency': 3, 'maintenance_unit': 'week', 'last_maintenance': '2024-01-01'}
+                 for s in range(sites) for m in range(machines_per_site) for p in range(parts_per_machine)]
+    # One part pointing at a machine that does not exist
+    part_rows.append({'name': 'Orphan', 'machine_name': 'Nowhere', 'site_name': f'{prefix} Site 0',
+                      'maintenance_frequency': 1, 'maintenance_unit': 'day', 'last_maintenance': None})
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(site_rows).to_excel(writer, sheet_name='Sites', index=False)
+        pd.DataFrame(machine_rows).to_excel(writer, sheet_name='Machines', index=False)
+        pd.DataFrame(part_rows).to_excel(writer, sheet_name='Parts', index=False)
+
+
+def _count_queries(db, func):
+    from sqlalchemy import event
+    counter = {'n': 0}
+
+    def before(*args):
+        counter['n'] += 1
+    event.listen(db.engine, 'before_cursor_execute', before)
+    try:
+        result = func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before)
+    return result, counter['n']
+
+
+def test_excel_importer_bulk_inserts_and_resolves_keys(app, db, tmp_path):
+    from datetime import datetime
+    from excel_importer import import_excel
+    from models import Site, Machine, Part
+
+    small, large = tmp_path / 'small.xlsx', tmp_path / 'large.xlsx'
+    _write_workbook(small, sites=1, machines_per_site=2, parts_per_machine=2, prefix='XLS')
+    _write_workbook(large, sites=5, machines_per_site=10, parts_per_machine=5, prefix='XLL')
+
+    with app.app_context():
+        stats, small_queries = _count_queries(db, lambda: import_excel(str(small)))
+        assert stats['sites_added'] == 1 and stats['machines_added'] == 2 and stats['parts_added'] == 4
+        assert stats['parts_skipped'] == 1
+
+        stats, large_queries = _count_queries(db, lambda: import_excel(str(large)))
+        assert stats['sites_added'] == 5 and stats['machines_added'] == 50 and stats['parts_added'] == 250
+        # Round trips do not grow with the number of rows
+        assert large_queries == small_queries
+
+        part = (Part.query.join(Machine).join(Site)
+                .filter(Site.name == 'XLL Site 4', Machine.name == 'XLL Machine 4-9', Part.name == 'Part 4').one())
+        assert part.maintenance_unit == 'week'
+        assert part.last_maintenance == datetime(2024, 1, 1)
+        assert part.next_maintenance == datetime(2024, 1, 22)
+
+        # Re-importing the same file skips everything
+        stats = import_excel(str(large))
+        assert stats['sites_added'] == stats['machines_added'] == stats['parts_added'] == 0
+        assert stats['sites_skipped'] == 5 and stats['machines_skipped'] == 50 and stats['parts_skipped'] == 251
+
+
+def test_streaming_import_commits_batches_and_reports_progress(app, db, tmp_path):
+    from excel_importer import ExcelImporter
+
+    path = tmp_path / 'stream.xlsx'
+    _write_workbook(path, sites=2, machines_per_site=3, parts_per_machine=4, prefix='XST')
+    progress = []
+    with app.app_context():
+        stats = ExcelImporter(str(path), batch_size=5).import_streaming(
+            progress=lambda sheet, done, stats: progress.append((sheet, done)))
+    assert stats['sites_added'] == 2 and stats['machines_added'] == 6 and stats['parts_added'] == 24
+    # 2 sites -> 1 batch, 6 machines -> 2 batches, 25 part rows -> 5 batches
+    assert progress == [('Sites', 2), ('Machines', 5), ('Machines', 6),
+                        ('Parts', 5), ('Parts', 10), ('Parts', 15), ('Parts', 20), ('Parts', 25)]
+
+
+def test_streaming_csv_import(app, db, tmp_path):
+    import pandas as pd
+    from excel_importer import ExcelImporter
+    from models import Site
+
+    path = tmp_path / 'sites.csv'
+    pd.DataFrame([{'Name': f'CSV Site {i}', 'Location': 'Dock'} for i in range(7)]).to_csv(path, index=False)
+    with app.app_context():
+        stats = ExcelImporter(str(path), batch_size=3).import_streaming()
+        assert stats['sites_added'] == 7
+        assert Site.query.filter(Site.name.like('CSV Site %')).count() == 7
+
+
+def test_csv_notification_flags_are_parsed(app, db, tmp_path):
+    import pandas as pd
+    from excel_importer import ExcelImporter
+    from models import Site
+
+    values = {'false': False, '0': False, 'no': False, 'Yes': True, 'TRUE': True, '1': True, '': True}
+    path = tmp_path / 'flags.csv'
+    pd.DataFrame([{'name': f'Flag Site {value!r}', 'location': 'Dock', 'enable_notifications': value}
+                  for value in values]).to_csv(path, index=False)
+    with app.app_context():
+        ExcelImporter(str(path)).import_data()
+        flags = dict(db.session.execute(db.select(Site.name, Site.enable_notifications)
+                                        .where(Site.name.like('Flag Site %'))).all())
+        assert flags == {f'Flag Site {value!r}': expected for value, expected in values.items()}
+
+
+def test_concurrent_inserts_are_not_logged_as_imported(app, db, tmp_path, monkeypatch):
+    import pandas as pd
+    import excel_importer
+    from models import Site, ChangeLog
+
+    original = excel_importer._records
+
+    def records_with_concurrent_insert(df, columns):
+        # Another writer inserts a site while the import is writing its batch
+        db.session.execute(db.insert(Site), [{'name': 'Concurrent Site'}])
+        return original(df, columns)
+
+    path = tmp_path / 'concurrent.csv'
+    pd.DataFrame([{'name': 'Imported Site', 'location': 'Dock'}]).to_csv(path, index=False)
+    with app.app_context():
+        monkeypatch.setattr(excel_importer, '_records', records_with_concurrent_insert)
+        importer = excel_importer.ExcelImporter(str(path))
+        importer.import_data()
+        ids = dict(db.session.execute(db.select(Site.name, Site.id)
+                                      .where(Site.name.in_(['Imported Site', 'Concurrent Site']))).all())
+        logged = set(db.session.execute(db.select(ChangeLog.entity_id).where(
+            ChangeLog.entity == 'sites', ChangeLog.entity_id.in_(ids.values()))).scalars())
+        assert logged == {ids['Imported Site']}
+        assert set(importer._sites['site_name']) >= {'Imported Site'}
+        assert 'Concurrent Site' not in set(importer._sites['site_name'])
+        Site.query.filter(Site.id.in_(ids.values())).delete()
+        db.session.commit()
+
+
+def test_import_job_resumes_after_failure(app, db, tmp_path, monkeypatch):
+    from excel_importer import ExcelImporter, create_import_job, run_import_job
+    from models import Part, Machine, Site
+
+    path = tmp_path / 'resume.xlsx'
+    _write_workbook(path, sites=1, machines_per_site=2, parts_per_machine=10, prefix='XRS')
+    original = ExcelImporter.import_parts_frame
+    calls = {'n': 0}
+
+    def flaky(self, df):
+        calls['n'] += 1
+        if calls['n'] == 3:
+            raise RuntimeError('worker killed')
+        return original(self, df)
+
+    with app.app_context():
+        job = create_import_job(str(path), batch_size=5)
+        monkeypatch.setattr(ExcelImporter, 'import_parts_frame', flaky)
+        job = run_import_job(job.id)
+        assert job.status == 'failed' and 'worker killed' in job.error
+        assert job.current_sheet == 'Parts' and job.rows_processed == 10
+
+        monkeypatch.setattr(ExcelImporter, 'import_parts_frame', original)
+        job = run_import_job(job.id)
+        assert job.status == 'completed'
+        assert job.rows_processed == 21
+        assert job.stats['parts_added'] == 20
+        assert Part.query.join(Machine).join(Site).filter(Site.name == 'XRS Site 0').count() == 20
+
+
+def test_dry_run_reports_diff_without_writing(app, db, tmp_path):
+    import pandas as pd
+    from excel_importer import ExcelImporter, import_excel
+    from models import Site, Machine, Part
+
+    base = tmp_path / 'base.xlsx'
+    _write_workbook(base, sites=1, machines_per_site=2, parts_per_machine=3, prefix='XDR')
+    changed = tmp_path / 'changed.xlsx'
+    with app.app_context():
+        import_excel(str(base))
+
+        with pd.ExcelWriter(changed) as writer:
+            pd.DataFrame([{'name': 'XDR Site 0', 'location': 'Plant 0'},
+                          {'name': 'XDR Site New', 'location': 'Annex'}]).to_excel(writer, sheet_name='Sites', index=False)
+            pd.DataFrame([{'name': 'XDR Machine 0-0', 'site_name': 'XDR Site 0', 'model': 'X2'},
+                          {'name': 'XDR Machine 0-1', 'site_name': 'XDR Site 0', 'model': 'X1'},
+                          {'name': 'XDR Machine N', 'site_name': 'XDR Site New', 'model': 'X1'}]).to_excel(
+                writer, sheet_name='Machines', index=False)
+            pd.DataFrame([{'name': 'Part 0', 'machine_name': 'XDR Machine 0-0', 'site_name': 'XDR Site 0',
+                           'maintenance_frequency': 3, 'maintenance_unit': 'weeks'},
+                          {'name': 'Part 1', 'machine_name': 'XDR Machine 0-0', 'site_name': 'XDR Site 0',
+                           'maintenance_frequency': 6, 'maintenance_unit': 'week'},
+                          {'name': 'Part 0', 'machine_name': 'XDR Machine N', 'site_name': 'XDR Site New',
+                           'maintenance_frequency': 1, 'maintenance_unit': 'month'},
+                          {'name': 'Part 9', 'machine_name': 'XDR Machine 0-0', 'site_name': 'XDR Site 0',
+                           'maintenance_frequency': 'often'}]).to_excel(writer, sheet_name='Parts', index=False)
+
+        counts = (Site.query.count(), Machine.query.count(), Part.query.count())
+        diff, queries = _count_queries(db, lambda: ExcelImporter(str(changed)).dry_run())
+
+        assert {k: diff['sites'][k] for k in ('insert', 'update', 'skip')} == {'insert': 1, 'update': 0, 'skip': 1}
+        assert {k: diff['machines'][k] for k in ('insert', 'update', 'skip')} == {'insert': 1, 'update': 1, 'skip': 1}
+        assert diff['machines']['update_sample'][0]['changes'] == {'model': ['X1', 'X2']}
+        # The new machine's part resolves against the planned (not yet inserted) site and machine
+        assert {k: diff['parts'][k] for k in ('insert', 'update', 'skip', 'errors')} == \
+            {'insert': 1, 'update': 1, 'skip': 1, 'errors': 1}
+        assert diff['parts']['insert_sample'] == [{'site_name': 'XDR Site New', 'machine_name': 'XDR Machine N',
+                                                   'name': 'Part 0'}]
+
+        # Only the three lookup queries; nothing written
+        assert queries == 3
+        assert (Site.query.count(), Machine.query.count(), Part.query.count()) == counts
+
+
+def test_engine_sources_share_one_write_path(app, db, tmp_path):
+    import json
+    import pandas as pd
+    from excel_importer import ExcelImporter, open_source, CsvSource, JsonSource, XlsxSource
+    from models import Site, Machine, Part
+
+    assert isinstance(open_source('a.CSV'), CsvSource) and isinstance(open_source('a.json'), JsonSource)
+    assert isinstance(open_source('a.xlsx'), XlsxSource)
+    with pytest.raises(ValueError):
+        open_source('a.txt')
+
+    path = tmp_path / 'fleet.json'
+    path.write_text(json.dumps({
+        'sites': [{'name': 'JSN Site', 'location': 'Quay'}],
+        'machines': [{'name': 'JSN Machine', 'site_name': 'JSN Site'}],
+        'parts': [{'name': 'Belt', 'machine_name': 'JSN Machine', 'site_name': 'JSN Site',
+                   'maintenance_frequency': 2, 'maintenance_unit': 'month'},
+                  {'name': 'Chain', 'machine_name': 'Missing', 'site_name': 'JSN Site', 'maintenance_frequency': 2}],
+    }))
+    with app.app_context():
+        stats = ExcelImporter(str(path)).import_data()
+        assert (stats['sites_added'], stats['machines_added'], stats['parts_added']) == (1, 1, 1)
+        assert stats['parts_skipped'] == 1
+        assert any('Missing' in message for message in stats['messages'])
+        site = Site.query.filter_by(name='JSN Site').one()
+        # Shared defaults come from the model
+        assert site.notification_threshold == 30 and site.enable_notifications is True
+        part = Part.query.join(Machine).filter(Machine.site_id == site.id, Part.name == 'Belt').one()
+        assert part.maintenance_days == 60
+
+    # The legacy module delegates to the engine
+    import import_excel
+    import excel_importer
+    assert import_excel.import_excel is excel_importer.import_excel
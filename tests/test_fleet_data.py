@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+from models import db as models_db, AuditTaskCompletion, Part
+from generate_fleet_data import generate_fleet
+from maintenance_schedule import compute_next
+
+def test_generate_fleet_counts_and_determinism(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fleet.db'}")
+    models_db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        counts = generate_fleet(conn, sites=2, machines_per_site=3, parts_per_machine=2,
+                                audit_tasks_per_site=1, audit_days=30, seed=7)
+    assert counts['machines'] == 6
+    assert counts['parts'] == 12
+    # No users exist, so no maintenance records can be attributed
+    assert counts['maintenance_records'] == 0
+    # One daily task per site, one completion per machine per day
+    assert counts['audit_task_completions'] == 6 * 30
+    with engine.connect() as conn:
+        first = conn.execute(Part.__table__.select().order_by(Part.id)).first()
+        # Ids continue after existing rows on a second run
+        with engine.begin() as conn2:
+            again = generate_fleet(conn2, sites=1, machines_per_site=1, parts_per_machine=1,
+                                   audit_tasks_per_site=1, audit_days=1, seed=7)
+        assert again['parts'] == 1
+        assert conn.execute(select(func.count()).select_from(AuditTaskCompletion.__table__)).scalar() == 6 * 30 + 1
+    assert first.next_maintenance == compute_next(first.last_maintenance, first.maintenance_frequency,
+                                                  first.maintenance_unit)
+
+    # The same seed and clock produce the same rows
+    dumps = []
+    for name in ('a', 'b'):
+        engine = create_engine(f"sqlite:///{tmp_path / f'fleet-{name}.db'}")
+        models_db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            generate_fleet(conn, sites=2, machines_per_site=2, parts_per_machine=3, records_per_part=3,
+                           audit_tasks_per_site=2, audit_days=10, seed=7, user_id=1, now=datetime(2024, 5, 31, 9))
+        with engine.connect() as conn:
+            dumps.append({table.name: conn.execute(table.select().order_by(*table.primary_key.columns)).all()
+                          for table in models_db.metadata.sorted_tables})
+    assert dumps[0]['maintenance_records'] and dumps[0]['parts']
+    assert dumps[0] == dumps[1]
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import update
+
+
+def _write_parts_workbook(path, prefix, parts=12):
+    import pandas as pd
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([{'name': f'{prefix} Site', 'location': 'Yard'}]).to_excel(writer, sheet_name='Sites', index=False)
+        pd.DataFrame([{'name': f'{prefix} Machine', 'site_name': f'{prefix} Site'}]).to_excel(
+            writer, sheet_name='Machines', index=False)
+        pd.DataFrame([{'name': f'Part {i}', 'machine_name': f'{prefix} Machine', 'site_name': f'{prefix} Site',
+                       'maintenance_frequency': 7} for i in range(parts)]).to_excel(writer, sheet_name='Parts', index=False)
+
+
+def test_import_worker_runs_job_in_background(app, db, tmp_path):
+    from excel_importer import create_import_job
+    from import_worker import ImportWorker
+    from models import ImportJob
+
+    path = tmp_path / 'bg.xlsx'
+    _write_parts_workbook(path, 'BG')
+    job_id = create_import_job(str(path), batch_size=5).id
+    worker = ImportWorker(app)
+    try:
+        assert worker.submit(job_id).result(timeout=30) == 'completed'
+    finally:
+        worker.shutdown()
+    db.session.expire_all()
+    job = db.session.get(ImportJob, job_id)
+    assert job.stats['parts_added'] == 12
+    assert job.total_rows_processed == 14
+
+
+def test_import_job_status_and_cancel_api(client, db, login_admin, tmp_path):
+    from excel_importer import create_import_job
+    login_admin()
+    path = tmp_path / 'api.xlsx'
+    _write_parts_workbook(path, 'API')
+    job = create_import_job(str(path))
+
+    response = client.get(f'/api/import/{job.id}')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['status'] == 'pending'
+    assert {'rows_added', 'rows_skipped', 'rows_errored', 'rows_per_second'} <= set(data)
+
+    response = client.post(f'/api/import/{job.id}/cancel')
+    assert response.get_json()['status'] == 'cancelled'
+    assert client.get('/api/import/no-such-job').status_code == 404
+
+
+def test_running_job_stops_at_next_batch_when_cancelled(app, db, tmp_path, monkeypatch):
+    from excel_importer import ExcelImporter, create_import_job, run_import_job
+    from models import ImportJob
+
+    path = tmp_path / 'cancel.xlsx'
+    _write_parts_workbook(path, 'CXL', parts=20)
+    job_id = create_import_job(str(path), batch_size=5).id
+    original = ExcelImporter.import_parts_frame
+
+    def cancel_after_first_batch(self, df):
+        original(self, df)
+        # Simulates the cancel endpoint; committed together with this batch
+        db.session.execute(update(ImportJob).where(ImportJob.id == job_id).values(status='cancelling'))
+
+    monkeypatch.setattr(ExcelImporter, 'import_parts_frame', cancel_after_first_batch)
+    job = run_import_job(job_id)
+    assert job.status == 'cancelled'
+    assert job.stats['parts_added'] == 5
+    # A cancelled job is not picked up again
+    assert run_import_job(job_id).stats['parts_added'] == 5
+
+
+def test_job_is_claimed_once_and_stale_jobs_are_reaped(app, db, tmp_path):
+    from datetime import datetime, timedelta
+    from excel_importer import create_import_job, run_import_job, reap_stale_import_jobs
+    from models import ImportJob
+
+    path = tmp_path / 'claim.xlsx'
+    _write_parts_workbook(path, 'CLM', parts=3)
+    job_id = create_import_job(str(path)).id
+    # Another worker holds the job: it is not run a second time
+    db.session.execute(update(ImportJob).where(ImportJob.id == job_id).values(status='running'))
+    db.session.commit()
+    job = run_import_job(job_id)
+    assert (job.status, job.total_rows_processed) == ('running', 0)
+
+    # A recently updated running job is not stale
+    assert reap_stale_import_jobs(max_age=60) == []
+    # That worker died long ago: the job is reaped, then resumes normally
+    db.session.execute(update(ImportJob).where(ImportJob.id == job_id)
+                       .values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    assert reap_stale_import_jobs(max_age=60) == [job_id]
+    db.session.expire_all()
+    assert db.session.get(ImportJob, job_id).status == 'failed'
+    job = run_import_job(job_id)
+    assert job.status == 'completed' and job.stats['parts_added'] == 3
@@ -0,0 +1,131 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from maintenance_batch import record_batch, _insert_new
+from maintenance_stats import get_stats
+from models import User, Part, MaintenanceRecord
+
+# Statements for a whole batch, independent of its size
+BATCH_BUDGET = 12
+# A replayed batch only looks up its client ids
+REPLAY_BUDGET = 4
+REPLAYS = 10_000
+
+
+@pytest.fixture
+def fleet_spec():
+    return {'name': 'Batch', 'parts': 40,
+            'part': {'maintenance_frequency': 1, 'maintenance_unit': 'month',
+                     'last_maintenance': datetime(2024, 1, 1), 'next_maintenance': datetime(2024, 2, 1)}}
+
+
+def test_api_batch_records_all_parts(client, db, fleet):
+    items = [{'part_id': part.id, 'date': '2024-01-31', 'notes': f'n{part.id}', 'client_id': f'visit-{part.id}'}
+             for part in fleet['parts']]
+    response = client.post('/api/maintenance/batch', json={'items': items},
+                           headers=fleet['headers'])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['success'], data['created'], data['failed']) == (True, 40, 0)
+    assert [result['client_id'] for result in data['results']] == [item['client_id'] for item in items]
+    # 31 January + 1 month is the end of February
+    assert {result['next_maintenance'] for result in data['results']} == {'2024-02-29T00:00:00'}
+
+    db.session.expire_all()
+    part = db.session.get(Part, fleet['parts'][0].id)
+    assert part.last_maintenance == datetime(2024, 1, 31)
+    assert part.next_maintenance == datetime(2024, 2, 29)
+    record = MaintenanceRecord.query.filter_by(client_id=f'visit-{part.id}').one()
+    assert record.id == data['results'][0]['record_id']
+    assert (record.notes, record.machine_id, record.user_id) == (f'n{part.id}', fleet['machine'].id, fleet['admin'].id)
+    assert record.performed_by
+    stats = get_stats(db.session, 'machine', fleet['machine'].id)
+    assert (stats.record_count, stats.on_time_count) == (40, 40)
+
+
+def test_batch_reports_invalid_items(client, db, fleet):
+    part = fleet['parts'][0]
+    items = [{'part_id': part.id, 'client_id': 'dup'}, {'part_id': part.id, 'client_id': 'dup'},
+             {'part_id': 'abc'}, {'part_id': part.id, 'date': '31/01/2024'}, {'part_id': 999999999}]
+    response = client.post('/maintenance/batch', json={'items': items})
+    data = response.get_json()
+    assert (data['created'], data['duplicate'], data['failed']) == (1, 1, 3)
+    assert [result['status'] for result in data['results']] == ['created', 'duplicate', 'error', 'error', 'error']
+    assert data['results'][1]['record_id'] == data['results'][0]['record_id']
+    assert data['results'][4]['error'] == 'Part not found'
+    assert MaintenanceRecord.query.filter_by(part_id=part.id).count() == 1
+
+
+def test_batch_does_not_move_due_date_back(client, db, fleet):
+    part = fleet['parts'][0]
+    client.post('/maintenance/batch', json=[{'part_id': part.id, 'date': '2023-06-01'}])
+    db.session.expire_all()
+    assert db.session.get(Part, part.id).next_maintenance == datetime(2024, 2, 1)
+    assert MaintenanceRecord.query.filter_by(part_id=part.id).count() == 1
+
+
+def test_batch_rejects_bad_payload(client, fleet):
+    assert client.post('/maintenance/batch', json={'items': []}).status_code == 400
+    assert client.post('/api/maintenance/batch', json={'items': [{'part_id': 1}]}).status_code == 401
+
+
+def test_batch_form_from_machine_history(client, db, fleet):
+    part_ids = [str(part.id) for part in fleet['parts'][:3]]
+    response = client.post('/maintenance/batch', data={'part_ids': part_ids, 'date': '2024-01-20', 'notes': 'visit'})
+    assert response.status_code == 302
+    assert MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids), MaintenanceRecord.notes == 'visit').count() == 3
+    page = client.get(f"/machine/{fleet['machine'].id}/history")
+    assert b'Record Selected Parts' in page.data
+
+
+def test_batch_query_budget(client, fleet, query_budget):
+    items = [{'part_id': part.id, 'date': '2024-01-31'} for part in fleet['parts']]
+    response = query_budget.request(client, '/maintenance/batch', BATCH_BUDGET, method='post', json=items)
+    assert response.get_json()['created'] == 40
+
+
+def _table_state(db, part_ids):
+    records = MaintenanceRecord.query.filter(MaintenanceRecord.part_id.in_(part_ids))
+    parts = Part.query.filter(Part.id.in_(part_ids)).order_by(Part.id)
+    return (sorted((r.id, r.client_id, r.date) for r in records),
+            [(p.last_maintenance, p.next_maintenance) for p in parts])
+
+
+def test_replayed_batch_changes_nothing(client, db, fleet, query_budget):
+    part_ids, machine_id, admin_id = [part.id for part in fleet['parts']], fleet['machine'].id, fleet['admin'].id
+    items = [{'part_id': part_id, 'date': '2024-01-31', 'client_id': f'replay-{part_id}'} for part_id in part_ids]
+    first = record_batch(db.session, items, fleet['admin'])
+    db.session.commit()
+    assert {result['status'] for result in first} == {'created'}
+    before = _table_state(db, part_ids)
+    stats_before = get_stats(db.session, 'machine', machine_id).record_count
+
+    response = query_budget.request(client, '/maintenance/batch', REPLAY_BUDGET, method='post', json=items)
+    replay = response.get_json()
+    assert (replay['created'], replay['duplicate'], replay['failed']) == (0, 40, 0)
+    assert [r['record_id'] for r in replay['results']] == [r['record_id'] for r in first]
+
+    admin = db.session.get(User, admin_id)
+    started = time.perf_counter()
+    for _ in range(REPLAYS):
+        record_batch(db.session, items[:1], admin)
+    db.session.commit()
+    assert time.perf_counter() - started < 30
+
+    db.session.expire_all()
+    assert _table_state(db, part_ids) == before
+    assert get_stats(db.session, 'machine', machine_id).record_count == stats_before
+
+
+def test_insert_skips_existing_client_id(db, fleet):
+    part = fleet['parts'][0]
+    row = {'part_id': part.id, 'machine_id': fleet['machine'].id, 'user_id': fleet['admin'].id,
+           'date': datetime(2024, 1, 5), 'client_id': 'raced', 'maintenance_type': None, 'description': None,
+           'status': None, 'notes': None, 'comments': None, 'performed_by': None}
+    assert list(_insert_new(db.session, [row])) == ['raced']
+    # A concurrent resubmit that passed the client id lookup is dropped by ON CONFLICT DO NOTHING
+    assert _insert_new(db.session, [row]) == {}
+    db.session.commit()
+    assert MaintenanceRecord.query.filter_by(client_id='raced').count() == 1
@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+
+from maintenance_history import history_page
+from models import User, Role, MaintenanceRecord, user_site
+
+# History pages are a single query regardless of how much history exists
+HISTORY_API_BUDGET = 3
+MAINTENANCE_PAGE_BUDGET = 8
+RECORDS_PAGE_BUDGET = 8
+
+
+@pytest.fixture
+def fleet_spec():
+    # Five records on site A (two share a date), one on site B
+    records = [{'date': datetime(2024, 1, day), 'maintenance_type': 'Repair' if day % 2 else 'Routine',
+                'status': 'completed', 'description': f'A{day}'} for day in (1, 2, 3, 3, 5)]
+    records.append({'part': 1, 'date': datetime(2024, 1, 4), 'maintenance_type': 'Routine', 'description': 'B4'})
+    return {'name': 'History', 'sites': 2, 'records': records}
+
+
+def _walk(site_ids, filters, limit):
+    descriptions, cursor = [], None
+    while True:
+        records, cursor = history_page(site_ids, filters, cursor=cursor, limit=limit)
+        descriptions += [r['description'] for r in records]
+        if not cursor:
+            return descriptions
+
+
+def test_keyset_pages_cover_history_once(app, fleet):
+    site_ids = [fleet['sites'][0].id]
+    assert _walk(site_ids, {}, limit=2) == ['A5', 'A3', 'A3', 'A2', 'A1']
+    assert _walk(site_ids, {}, limit=50) == ['A5', 'A3', 'A3', 'A2', 'A1']
+
+
+def test_history_filters(app, fleet):
+    site_a, site_b = fleet['sites']
+    assert _walk(None, {'site_id': site_b.id}, limit=10) == ['B4']
+    assert _walk([site_a.id], {'maintenance_type': 'Routine'}, limit=10) == ['A2']
+    assert _walk([site_a.id], {'start_date': datetime(2024, 1, 2), 'end_date': datetime(2024, 1, 3)},
+                 limit=10) == ['A3', 'A3', 'A2']
+    assert _walk([site_a.id], {'machine_id': fleet['machines'][1].id}, limit=10) == []
+
+
+def test_history_api_pages(client, fleet):
+    site_a = fleet['sites'][0]
+    first = client.get(f'/api/maintenance/history?site_id={site_a.id}&limit=3').get_json()
+    assert [r['description'] for r in first['records']] == ['A5', 'A3', 'A3']
+    assert first['records'][0]['site_name'] == 'History Site A'
+    second = client.get(f"/api/maintenance/history?site_id={site_a.id}&limit=3&cursor={first['next_cursor']}").get_json()
+    assert [r['description'] for r in second['records']] == ['A2', 'A1']
+    assert second['next_cursor'] is None
+    assert client.get('/api/maintenance/history?cursor=garbage').status_code == 400
+    assert client.get('/api/maintenance/history?start_date=01/02/2024').status_code == 400
+
+
+def test_maintenance_page_renders_history(client, fleet):
+    response = client.get(f"/maintenance?site_id={fleet['sites'][0].id}&maintenance_type=Repair")
+    assert response.status_code == 200
+    assert b'A5' in response.data and b'A1' in response.data
+    assert b'A2' not in response.data and b'B4' not in response.data
+    assert b'data-cursor=""' in response.data
+
+
+def test_page_and_api_scope_history_alike(client, db, fleet):
+    from flask import g
+    role = Role(name='History Recorder', permissions='maintenance.record')
+    db.session.add(role)
+    db.session.commit()
+    # Assigned to site A only, but maintenance.record grants every site
+    user = User(username='historyrecorder', email='historyrecorder@example.com', password_hash='x',
+                role=role, sites=[fleet['sites'][0]])
+    db.session.add(user)
+    db.session.commit()
+    ids = (user.id, role.id)
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+    # flask-login caches the user on the shared app context's g
+    g.pop('_login_user', None)
+    try:
+        page = client.get('/maintenance')
+        api = client.get('/api/maintenance/history').get_json()
+        assert page.status_code == 200
+        assert b'B4' in page.data
+        assert 'B4' in [record['description'] for record in api['records']]
+    finally:
+        g.pop('_login_user', None)
+        db.session.rollback()
+        db.session.execute(user_site.delete().where(user_site.c.user_id == ids[0]))
+        User.query.filter_by(id=ids[0]).delete()
+        Role.query.filter_by(id=ids[1]).delete()
+        db.session.commit()
+
+
+def test_history_query_budget(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    response = query_budget.request(client, '/api/maintenance/history', HISTORY_API_BUDGET)
+    assert response.status_code == 200
+    assert len(response.get_json()['records']) == min(50, seeded_fleet['maintenance_records'])
+    response = query_budget.request(client, '/maintenance', MAINTENANCE_PAGE_BUDGET)
+    assert response.status_code == 200
+    # Only the first page is rendered; the rest is behind the cursor
+    assert (b'data-cursor=""' in response.data) == (seeded_fleet['maintenance_records'] <= 50)
+
+
+def test_records_page_filters(client, fleet):
+    site_a, site_b = fleet['sites']
+    machine_a = fleet['machines'][0]
+    response = client.get(f'/api/maintenance/records?site_id={site_a.id}&machine_id={machine_a.id}')
+    assert response.status_code == 200
+    assert b'A5' in response.data and b'B4' not in response.data
+    response = client.get(f"/api/maintenance/records?part_id={fleet['parts'][1].id}")
+    assert b'B4' in response.data and b'A5' not in response.data
+    # A machine that is not at the selected site is rejected without querying it again
+    response = client.get(f"/api/maintenance/records?site_id={site_b.id}&machine_id={machine_a.id}")
+    assert response.status_code == 302
+
+
+def test_records_page_query_budget(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    response = query_budget.request(client, '/api/maintenance/records', RECORDS_PAGE_BUDGET)
+    assert response.status_code == 200
+    has_more = MaintenanceRecord.query.count() > 50
+    assert (b'Older &raquo;' in response.data) == has_more
+    if has_more:
+        cursor = response.data.split(b'cursor=')[1].split(b'"')[0].decode()
+        response = query_budget.request(client, f'/api/maintenance/records?cursor={cursor}', RECORDS_PAGE_BUDGET)
+        assert response.status_code == 200
+        assert b'&laquo; Newest' in response.data
@@ -0,0 +1,78 @@
+import random
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+
+from maintenance_schedule import compute_next, compute_next_many, normalize_unit, recompute_all
+from models import Part
+
+
+@pytest.mark.parametrize('last, frequency, unit, expected', [
+    (datetime(2024, 1, 31), 1, 'month', datetime(2024, 2, 29)),
+    (datetime(2023, 1, 31), 1, 'month', datetime(2023, 2, 28)),
+    (datetime(2024, 2, 29), 1, 'year', datetime(2025, 2, 28)),
+    (datetime(2024, 3, 15, 8, 30), 6, 'Months', datetime(2024, 9, 15, 8, 30)),
+    (datetime(2024, 1, 1), 2, 'weeks', datetime(2024, 1, 15)),
+    (datetime(2024, 1, 1), None, None, datetime(2024, 1, 2)),
+])
+def test_compute_next_is_calendar_accurate(last, frequency, unit, expected):
+    assert compute_next(last, frequency, unit) == expected
+
+
+def test_normalize_unit():
+    assert [normalize_unit(u) for u in ('Days', ' week ', 'YEARS', 'fortnight', None)] == \
+        ['day', 'week', 'year', 'day', 'day']
+
+
+def test_compute_next_many_matches_compute_next():
+    rng = random.Random(42)
+    rows = [{'last_maintenance': datetime(2020, 1, 1) + pd.Timedelta(days=rng.randint(0, 2000), hours=rng.randint(0, 23)),
+             'maintenance_frequency': rng.choice([1, 2, 3, 6, 12, 30]),
+             'maintenance_unit': rng.choice(['day', 'week', 'month', 'year', 'Months'])}
+            for _ in range(500)]
+    rows.append({'last_maintenance': None, 'maintenance_frequency': 1, 'maintenance_unit': 'month'})
+    result = compute_next_many(pd.DataFrame(rows))
+    for row, due in zip(rows[:-1], result[:-1]):
+        assert due.to_pydatetime() == compute_next(row['last_maintenance'], row['maintenance_frequency'],
+                                                   row['maintenance_unit'])
+    assert pd.isna(result.iloc[-1])
+
+
+@pytest.fixture
+def fleet_spec():
+    return {'name': 'Schedule', 'parts': 5,
+            'part': {'maintenance_frequency': 1, 'maintenance_unit': 'month',
+                     'last_maintenance': datetime(2024, 1, 31), 'next_maintenance': datetime(2024, 3, 1)}}
+
+
+def test_recompute_all_batches_updates(db, fleet):
+    parts = fleet['parts']
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        updated = recompute_all(db.session, batch_size=2)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert updated == Part.query.filter(Part.last_maintenance.isnot(None)).count()
+    db.session.expire_all()
+    assert {p.next_maintenance for p in parts} == {datetime(2024, 2, 29)}
+    assert {p.maintenance_days for p in parts} == {30}
+    # One SELECT and one executemany UPDATE per batch, plus the final empty SELECT
+    batches = -(-updated // 2)
+    statements = [' '.join(s.split()).upper() for s in statements]
+    assert sum(s.startswith('UPDATE PARTS') for s in statements) == batches
+    assert sum(s.startswith('SELECT') and 'FROM PARTS' in s for s in statements) == batches + 1
+    # and the batch's change_log entries
+    assert sum(s.startswith('INSERT INTO CHANGE_LOG') for s in statements) == batches
+
+
+def test_recording_maintenance_uses_calendar_months(client, db, fleet):
+    part = fleet['parts'][0]
+    part.maintenance_frequency, part.maintenance_unit = 1, 'year'
+    db.session.commit()
+    client.post(f'/parts/{part.id}/update_maintenance', data={'comments': 'yearly'})
+    db.session.refresh(part)
+    assert part.next_maintenance == compute_next(part.last_maintenance, 1, 'year')
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from maintenance_stats import get_stats, rebuild_stats
+from models import MaintenanceRecord
+
+HISTORY_VIEW_BUDGET = 9
+
+
+@pytest.fixture
+def fleet_spec():
+    # A part serviced every 10 days, and one due at the end of the year
+    return {'name': 'Stats', 'parts': [{'maintenance_frequency': 10, 'maintenance_unit': 'day',
+                                        'last_maintenance': datetime(2024, 1, 1),
+                                        'next_maintenance': datetime(2024, 1, 11)},
+                                       {'next_maintenance': datetime(2024, 12, 31)}]}
+
+
+def _service(db, fleet, part, when):
+    """Record a service the way the maintenance views do: insert, then move the due date."""
+    db.session.add(MaintenanceRecord(part_id=part.id, user_id=fleet['admin'].id, date=when, description='svc'))
+    part.last_maintenance = when
+    part.update_next_maintenance()
+    db.session.commit()
+
+
+def test_stats_updated_on_insert(db, fleet):
+    part = fleet['parts'][0]
+    _service(db, fleet, part, datetime(2024, 1, 10))   # due 2024-01-11: on time
+    _service(db, fleet, part, datetime(2024, 1, 30))   # due 2024-01-20: late
+    _service(db, fleet, fleet['parts'][1], datetime(2024, 2, 9))
+
+    stats = get_stats(db.session, 'part', part.id)
+    assert stats.record_count == 2
+    assert stats.last_date == datetime(2024, 1, 30)
+    assert stats.mean_interval_days == 20.0
+    assert stats.on_time_percent == 50.0
+
+    machine_stats = get_stats(db.session, 'machine', fleet['machine'].id)
+    assert machine_stats.record_count == 3
+    assert machine_stats.last_date == datetime(2024, 2, 9)
+    assert machine_stats.mean_interval_days == 15.0
+    assert get_stats(db.session, 'site', fleet['site'].id).on_time_count == 2
+
+
+def test_rebuild_matches_history(db, fleet):
+    part = fleet['parts'][0]
+    for day in (1, 8, 25):
+        _service(db, fleet, part, datetime(2024, 3, day))
+    rebuild_stats(db.session.connection())
+    db.session.commit()
+    db.session.expire_all()
+    stats = get_stats(db.session, 'part', part.id)
+    # 3/8 is within 10 days of 3/1, 3/25 is not
+    assert (stats.record_count, stats.on_time_count) == (3, 2)
+    assert stats.last_date == datetime(2024, 3, 25)
+    assert get_stats(db.session, 'site', fleet['site'].id).record_count == 3
+
+
+def test_history_views_show_summary(client, db, fleet):
+    part = fleet['parts'][0]
+    _service(db, fleet, part, datetime(2024, 1, 10))
+    for path in (f"/part/{part.id}/history", f"/machine/{fleet['machine'].id}/history",
+                 f"/site/{fleet['site'].id}/history"):
+        response = client.get(path)
+        assert response.status_code == 200, path
+        assert b'Maintenance Summary' in response.data
+        assert b'100.0%' in response.data
+        assert b'2024-01-10' in response.data
+
+
+def test_history_views_query_budget(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    base = seeded_fleet['id_base']
+    for path in (f'/site/{base}/history', f'/machine/{base}/history', f'/part/{base}/history'):
+        response = query_budget.request(client, path, HISTORY_VIEW_BUDGET)
+        assert response.status_code == 200, path
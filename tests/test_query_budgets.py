@@ -0,0 +1,58 @@
+import pytest
+from models import Part, User, hash_value
+
+# Maximum SQL statements per request; must hold for 10 and 1,000 machines
+DASHBOARD_BUDGET = 5
+AUDITS_BUDGET = 6
+# Token version (users is not read), the collection version for the ETag and the list query
+API_PARTS_BUDGET = 3
+API_MACHINES_BUDGET = 3
+# A poll with a matching If-None-Match stops after the version lookup
+API_PARTS_NOT_MODIFIED_BUDGET = 2
+
+def api_headers(app):
+    admin = User.query.filter_by(username_hash=hash_value('admin')).first()
+    from api_endpoints import create_token
+    return {'Authorization': f'Bearer {create_token(admin)}'}
+
+def test_dashboard_query_budget(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    response = query_budget.request(client, '/dashboard', DASHBOARD_BUDGET)
+    assert response.status_code == 200
+    assert str(Part.query.count()).encode() in response.data
+
+def test_audits_query_budget(client, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    response = query_budget.request(client, '/audits', AUDITS_BUDGET)
+    assert response.status_code == 200
+    assert b'Audit 1 @ site' in response.data
+
+def test_api_parts_query_budget(app, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    # A client without the admin's session cookie, like the desktop app
+    client = app.test_client()
+    headers = api_headers(app)
+    response = query_budget.request(client, '/api/parts', API_PARTS_BUDGET, headers=headers)
+    assert response.status_code == 200
+    seeded = [p for p in response.get_json() if p['id'] >= seeded_fleet['id_base']]
+    assert len(seeded) == seeded_fleet['parts']
+    assert {'overdue', 'due_soon', 'ok'} <= {p['status'] for p in seeded}
+
+def test_api_machines_query_budget(app, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    client = app.test_client()
+    headers = api_headers(app)
+    response = query_budget.request(client, '/api/machines', API_MACHINES_BUDGET, headers=headers)
+    assert response.status_code == 200
+    seeded = [m for m in response.get_json() if m['id'] >= seeded_fleet['id_base']]
+    assert len(seeded) == seeded_fleet['machines']
+    assert all(m['site_name'] != 'Unknown Site' for m in seeded)
+
+def test_api_parts_not_modified_budget(app, login_admin, seeded_fleet, query_budget):
+    login_admin()
+    client = app.test_client()
+    headers = api_headers(app)
+    etag = client.get('/api/parts', headers=headers).headers['ETag']
+    response = query_budget.request(client, '/api/parts', API_PARTS_NOT_MODIFIED_BUDGET,
+                                    headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
@@ -0,0 +1,46 @@
+import logging
+
+def test_query_headers_added(client):
+    response = client.get('/reset-password/not-a-token')
+    assert int(response.headers['X-DB-Queries']) >= 1
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+
+def test_listener_receives_request_stats(app, client):
+    instrumentation = app.extensions['query_instrumentation']
+    seen = []
+    listener = lambda endpoint, path, stats: seen.append((endpoint, stats.count))
+    instrumentation.add_listener(listener)
+    try:
+        client.get('/reset-password/not-a-token')
+    finally:
+        instrumentation.remove_listener(listener)
+    assert seen and seen[0][0] == 'reset_password'
+    assert seen[0][1] >= 1
+
+def test_slow_query_logged_with_route(app, client, caplog):
+    instrumentation = app.extensions['query_instrumentation']
+    threshold = instrumentation.slow_query_ms
+    instrumentation.slow_query_ms = 0
+    try:
+        with caplog.at_level(logging.WARNING, logger='query_instrumentation'):
+            client.get('/reset-password/not-a-token')
+    finally:
+        instrumentation.slow_query_ms = threshold
+    assert any('[SLOW_QUERY]' in r.message and '/reset-password/not-a-token' in r.message for r in caplog.records)
+
+def test_failed_statement_is_timed_on_its_own(app, db):
+    import time
+    import pytest
+    from sqlalchemy import text
+    instrumentation = app.extensions['query_instrumentation']
+    with app.test_request_context('/'):
+        instrumentation._start_request()
+        with db.engine.connect() as conn:
+            with pytest.raises(Exception):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            time.sleep(0.2)
+            conn.execute(text('SELECT 1'))
+        stats = instrumentation.current_stats()
+    # Both statements counted; the pause between them is not charged to either
+    assert stats.count == 2
+    assert stats.total_ms < 150
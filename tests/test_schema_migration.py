@@ -1,10 +1,136 @@
+import os
+
 import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
 from app import ensure_db_schema
+from schema_migrations import MIGRATIONS, SCHEMA_VERSION, run_migrations, get_schema_version, rebuild_derived_data
 
 def test_auto_migration_adds_columns(app, db):
-    from sqlalchemy import inspect
     ensure_db_schema()
     inspector = inspect(db.engine)
     # Example: Check that 'created_at' column exists in 'users' table
     columns = [col['name'] for col in inspector.get_columns('users')]
     assert 'created_at' in columns
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE sites (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL)",
+    "CREATE TABLE machines (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, site_id INTEGER NOT NULL)",
+    "CREATE TABLE parts (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, machine_id INTEGER NOT NULL, "
+    "maintenance_frequency INTEGER, last_maintenance TIMESTAMP, next_maintenance TIMESTAMP)",
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT NOT NULL, email TEXT NOT NULL, "
+    "password_hash VARCHAR(255) NOT NULL, role_id INTEGER)",
+    "CREATE TABLE maintenance_records (id INTEGER PRIMARY KEY, part_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+    "date TIMESTAMP, comments TEXT)",
+    "CREATE TABLE audit_tasks (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, description TEXT, site_id INTEGER NOT NULL)",
+    "INSERT INTO sites (id, name) VALUES (1, 'Legacy Site')",
+    "INSERT INTO machines (id, name, site_id) VALUES (7, 'Legacy Machine', 1)",
+    "INSERT INTO parts (id, name, machine_id) VALUES (3, 'Legacy Part', 7)",
+    "INSERT INTO users (id, username, email, password_hash) VALUES (1, 'u', 'e', 'x')",
+    "INSERT INTO maintenance_records (id, part_id, user_id, comments) VALUES (1, 3, 1, 'old record')",
+]
+
+def _columns(engine, table):
+    return {col['name'] for col in inspect(engine).get_columns(table)}
+
+def test_migrations_on_empty_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    applied = run_migrations(engine)
+    assert applied == [m.version for m in MIGRATIONS]
+    assert get_schema_version(engine) == SCHEMA_VERSION
+    tables = set(inspect(engine).get_table_names())
+    assert {'users', 'sites', 'machines', 'parts', 'maintenance_records', 'audit_tasks'} <= tables
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    run_migrations(engine)
+    assert {'username_hash', 'email_hash', 'reset_token', 'created_at', 'updated_at'} <= _columns(engine, 'users')
+    assert {'interval', 'custom_interval_days', 'color'} <= _columns(engine, 'audit_tasks')
+    assert {'maintenance_unit', 'maintenance_days'} <= _columns(engine, 'parts')
+    assert {'machine_id', 'client_id', 'status'} <= _columns(engine, 'maintenance_records')
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT machine_id, created_at FROM maintenance_records WHERE id = 1")).one()
+    assert row.machine_id == 7
+    assert row.created_at is not None
+
+def test_duplicate_client_ids_deduplicated(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dupes.db'}")
+    run_migrations(engine, target=11)
+    with engine.begin() as conn:
+        for record_id in (1, 2, 3):
+            conn.execute(text("INSERT INTO maintenance_records (id, part_id, user_id, client_id) "
+                              "VALUES (:id, 1, 1, 'retried')"), {'id': record_id})
+    run_migrations(engine)
+    with engine.connect() as conn:
+        client_ids = dict(conn.execute(text("SELECT id, client_id FROM maintenance_records")).all())
+    assert client_ids[1] == 'retried' and len(set(client_ids.values())) == 3
+    indexes = {index['name']: index for index in inspect(engine).get_indexes('maintenance_records')}
+    assert indexes['ux_maintenance_records_client_id']['unique']
+
+def test_stats_rebuilt_after_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("UPDATE maintenance_records SET date = '2024-01-05 00:00:00'"))
+    applied = run_migrations(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM maintenance_stats")).scalar() == 0
+    rebuild_derived_data(engine, applied)
+    with engine.connect() as conn:
+        counts = dict(conn.execute(text("SELECT entity_type, record_count FROM maintenance_stats")).all())
+    assert counts == {'site': 1, 'machine': 1, 'part': 1}
+
+@pytest.mark.parametrize('target, table, columns', [
+    (9, 'import_jobs', {'id', 'filename', 'file_path', 'status', 'batch_size', 'current_sheet', 'rows_processed',
+                        'total_rows_processed', 'stats', 'error', 'created_by', 'started_at', 'finished_at',
+                        'created_at', 'updated_at'}),
+    (11, 'maintenance_stats', {'entity_type', 'entity_id', 'record_count', 'on_time_count', 'first_date',
+                               'last_date', 'updated_at'}),
+    (14, 'change_log', {'seq', 'entity', 'entity_id', 'op', 'version', 'changed_at'}),
+    (16, 'token_versions', {'user_id', 'version', 'updated_at'}),
+])
+def test_intermediate_target_creates_shipped_tables(tmp_path, target, table, columns):
+    engine = create_engine(f"sqlite:///{tmp_path / 'partial.db'}")
+    assert run_migrations(engine, target=target)[-1] == target
+    assert get_schema_version(engine) == target
+    assert _columns(engine, table) == columns
+    if table == 'change_log':
+        # ix_change_log_entity_seq only arrives with migration 15
+        assert {index['name'] for index in inspect(engine).get_indexes(table)} == \
+            {'ix_change_log_entity_version', 'ix_change_log_op_seq'}
+
+def test_migrations_are_frozen(app, tmp_path):
+    from models import db
+    engine = create_engine(f"sqlite:///{tmp_path / 'frozen.db'}")
+    run_migrations(engine, target=1)
+    # The baseline has none of the indexes added by later migrations
+    assert not [index for index in inspect(engine).get_indexes('maintenance_records')]
+    run_migrations(engine)
+
+    models = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    db.metadata.create_all(models)
+    migrated, expected = inspect(engine), inspect(models)
+    assert set(migrated.get_table_names()) - {'schema_version'} == set(expected.get_table_names())
+    for table in expected.get_table_names():
+        assert _columns(engine, table) == _columns(models, table), table
+        assert {(index['name'], bool(index['unique'])) for index in migrated.get_indexes(table)} == \
+            {(index['name'], bool(index['unique'])) for index in expected.get_indexes(table)}, table
+
+def test_current_database_rerun_is_single_query(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'current.db'}")
+    run_migrations(engine)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    assert run_migrations(engine) == []
+    assert len(statements) == 1
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason='TEST_POSTGRES_URL not set')
+def test_migrations_on_postgres():
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    run_migrations(engine)
+    assert get_schema_version(engine) == SCHEMA_VERSION
+    assert run_migrations(engine) == []
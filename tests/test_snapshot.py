@@ -0,0 +1,90 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from delta_sync import ENTITIES
+from models import Part
+
+
+@pytest.fixture
+def fleet_spec():
+    now = datetime.utcnow()
+    return {'name': 'Snapshot', 'parts': 7, 'part': {'next_maintenance': datetime(2030, 1, 1)},
+            'records': [{'date': now - timedelta(days=10)}, {'date': now - timedelta(days=800)}]}
+
+
+@pytest.fixture(autouse=True)
+def batch_size(app):
+    app.config['SNAPSHOT_BATCH_SIZE'] = 3
+    yield
+    app.config.pop('SNAPSHOT_BATCH_SIZE')
+
+
+def _lines(response):
+    assert response.status_code == 200, response.data
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def _rows(lines, entity):
+    return [line['data'] for line in lines if line.get('entity') == entity]
+
+
+def test_snapshot_streams_every_entity(app, fleet):
+    client = app.test_client()
+    response = client.get('/api/snapshot', headers=fleet['headers'])
+    assert response.is_streamed
+    lines = _lines(response)
+
+    assert [line.get('entity') for line in lines if 'entity' in line] == sorted(
+        (line['entity'] for line in lines if 'entity' in line), key=list(ENTITIES).index)
+    parts = _rows(lines, 'parts')
+    assert {part.id for part in fleet['parts']} <= {part['id'] for part in parts}
+    assert all('site_id' in part for part in parts)
+    # Only the recent history
+    records = {record['id'] for record in _rows(lines, 'maintenance_records')}
+    recent, old = fleet['records']
+    assert recent.id in records and old.id not in records
+    done = lines[-1]
+    assert done['done'] and done['counts']['parts'] == len(parts)
+    # Batches of three rows are each followed by a cursor line
+    assert any('cursor' in line for line in lines[:4])
+
+
+def test_snapshot_resumes_from_cursor(app, fleet):
+    client = app.test_client()
+    lines = _lines(client.get('/api/snapshot', headers=fleet['headers']))
+    # Drop the connection after the first cursor inside the parts
+    index = next(i for i, line in enumerate(lines)
+                 if 'cursor' in line and i > 0 and lines[i - 1].get('entity') == 'parts')
+    received = lines[:index + 1]
+
+    resumed = _lines(client.get(f"/api/snapshot?cursor={lines[index]['cursor']}", headers=fleet['headers']))
+    combined = [line for line in received + resumed if 'entity' in line]
+    full = [line for line in lines if 'entity' in line]
+    assert combined == full
+    assert client.get('/api/snapshot?cursor=bogus', headers=fleet['headers']).status_code == 400
+
+
+def test_snapshot_hands_over_to_delta_sync(client, db, fleet):
+    done = _lines(client.get('/api/snapshot', headers=fleet['headers']))[-1]
+    part = db.session.get(Part, fleet['parts'][3].id)
+    part.name = 'Renamed after snapshot'
+    db.session.commit()
+
+    response = client.post('/api/sync/data', json={'type': 'pull', 'entity_type': 'parts',
+                                                   'last_sync': done['sync_cursor']})
+    assert response.status_code == 200, response.get_json()
+    page = response.get_json()
+    assert [row['name'] for row in page['data']['parts']] == ['Renamed after snapshot']
+
+
+def test_snapshot_gzip_stream(app, fleet):
+    client = app.test_client()
+    plain = client.get('/api/snapshot', headers=fleet['headers']).data
+    response = client.get('/api/snapshot', headers={**fleet['headers'], 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = lambda body: [line for line in body.decode().splitlines() if line.startswith('{"entity"')]
+    assert rows(gzip.decompress(response.data)) == rows(plain)
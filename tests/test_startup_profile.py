@@ -0,0 +1,31 @@
+import json
+from sqlalchemy import create_engine, text
+from startup_profile import StartupTimeline, profiling_requested
+
+def test_timeline_records_phases_and_queries(tmp_path):
+    timeline = StartupTimeline()
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    timeline.mark('first')
+    timeline.mark('second')
+    output = tmp_path / 'startup.json'
+    result = timeline.finish(output_path=str(output))
+    assert [p['name'] for p in result['phases']] == ['first', 'second']
+    assert result['phases'][0]['queries'] == 1
+    assert result['phases'][1]['queries'] == 0
+    assert result['total_ms'] is not None
+    assert json.loads(output.read_text())['phases'] == result['phases']
+    # Listener is removed once finished
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert timeline.query_count == 1
+
+def test_profile_flag_detection(monkeypatch):
+    monkeypatch.delenv('PROFILE_STARTUP', raising=False)
+    assert profiling_requested(['app.py', '--profile-startup'])
+    assert not profiling_requested(['app.py'])
+
+def test_startup_diagnostics_requires_login(client):
+    response = client.get('/admin/diagnostics/startup')
+    assert response.status_code == 302
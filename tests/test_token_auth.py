@@ -0,0 +1,126 @@
+import datetime as dt
+
+import jwt
+import pytest
+from models import User, Role, Site, TokenVersion, user_site
+from token_auth import TokenVersionCache, bump_token_versions, version_cache
+
+
+@pytest.fixture
+def field_user(db):
+    role = Role(name='Field Tech', permissions='maintenance.record')
+    site, other = Site(name='Token Site'), Site(name='Token Other Site')
+    db.session.add_all([role, site, other])
+    db.session.commit()
+    user = User(username='fieldtech', email='fieldtech@example.com', full_name='Field Tech', password_hash='x',
+                role=role, sites=[site])
+    db.session.add(user)
+    db.session.commit()
+    ids = (user.id, role.id, site.id, other.id)
+    yield {'user': user, 'role': role, 'site': site, 'other': other}
+    db.session.rollback()
+    db.session.execute(user_site.delete().where(user_site.c.user_id == ids[0]))
+    User.query.filter_by(id=ids[0]).delete()
+    Role.query.filter_by(id=ids[1]).delete()
+    Site.query.filter(Site.id.in_(ids[2:])).delete()
+    TokenVersion.query.filter_by(user_id=ids[0]).delete()
+    db.session.commit()
+    version_cache.invalidate()
+
+
+def _headers(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _token(user):
+    from api_endpoints import create_token
+    return create_token(user)
+
+
+def test_token_carries_claims(app, field_user):
+    from api_endpoints import JWT_SECRET_KEY
+    claims = jwt.decode(_token(field_user['user']), JWT_SECRET_KEY, algorithms=['HS256'])
+    assert (claims['name'], claims['admin'], claims['sites']) == ('Field Tech', False, [field_user['site'].id])
+
+    client = app.test_client()
+    sites = client.get('/api/sites', headers=_headers(_token(field_user['user']))).get_json()
+    assert [site['id'] for site in sites] == [field_user['site'].id]
+
+
+def test_claims_path_does_not_read_users(app, field_user, query_budget):
+    token = _token(field_user['user'])
+    client = app.test_client()
+    query_budget.request(client, '/api/sites', 3, headers=_headers(token))
+    path, stats = query_budget.requests[-1]
+    assert not any('FROM users' in statement for statement in stats.statements)
+    # The token version is cached; the next call only reads the ETag version and the sites
+    query_budget.request(client, '/api/sites', 2, headers=_headers(token))
+
+
+def test_access_changes_revoke_tokens(app, db, field_user):
+    client = app.test_client()
+    user = field_user['user']
+    token = _token(user)
+    assert client.get('/api/sites', headers=_headers(token)).status_code == 200
+
+    user.sites.append(field_user['other'])
+    db.session.commit()
+    response = client.get('/api/sites', headers=_headers(token))
+    assert (response.status_code, response.get_json()['error']) == (401, 'Token has been revoked')
+    token = _token(user)
+    assert len(client.get('/api/sites', headers=_headers(token)).get_json()) == 2
+
+    # Changing the role's permissions revokes its members' tokens
+    field_user['role'].permissions = 'maintenance.record,sites.view'
+    db.session.commit()
+    assert client.get('/api/sites', headers=_headers(token)).status_code == 401
+    token = _token(user)
+
+    # Unrelated updates do not
+    user.last_login = dt.datetime.utcnow()
+    db.session.commit()
+    assert client.get('/api/sites', headers=_headers(token)).status_code == 200
+
+    db.session.delete(user)
+    db.session.commit()
+    assert client.get('/api/sites', headers=_headers(token)).status_code == 401
+
+
+def test_tokens_without_claims_still_accepted(app, field_user):
+    from api_endpoints import JWT_SECRET_KEY
+    token = jwt.encode({'user_id': field_user['user'].id, 'exp': dt.datetime.utcnow() + dt.timedelta(minutes=5)},
+                       JWT_SECRET_KEY)
+    sites = app.test_client().get('/api/sites', headers=_headers(token)).get_json()
+    assert [site['id'] for site in sites] == [field_user['site'].id]
+
+
+def test_version_cache_expires(db, field_user):
+    user_id = field_user['user'].id
+    cache = TokenVersionCache(ttl=60)
+    start = cache.get(db.session, user_id)
+    # A bump made elsewhere (here: through the process-wide cache) is not seen until the entry expires
+    bump_token_versions(db.session.connection(), [user_id])
+    assert cache.get(db.session, user_id) == start
+    cache.ttl = 0
+    cache.invalidate()
+    assert cache.get(db.session, user_id) == start + 1
+
+
+def test_bump_upserts_and_invalidates_on_commit(db, field_user):
+    user = field_user['user']
+    user_id = user.id
+    TokenVersion.query.filter_by(user_id=user_id).delete()
+    db.session.commit()
+    # Bumping a user with no row twice in one transaction inserts, then increments
+    bump_token_versions(db.session.connection(), [user_id])
+    bump_token_versions(db.session.connection(), [user_id])
+    db.session.commit()
+    version_cache.invalidate()
+    assert version_cache.get(db.session, user_id) == 2
+
+    user.full_name = 'Renamed Tech'
+    db.session.flush()
+    # Flushed but not committed: other sessions still see 2, so the cache keeps it
+    assert version_cache.get(db.session, user_id) == 2
+    db.session.commit()
+    assert version_cache.get(db.session, user_id) == 3
@@ -0,0 +1,203 @@
+"""
+Stateless API token authentication.
+
+API tokens carry what the endpoints need to know about their caller as
+claims: user id, display name, admin flag, accessible site ids and the
+user's token version (``ver``). ``token_required`` builds a ``TokenUser``
+from those claims instead of loading the user (which joins roles and runs
+the sites subquery), so an authenticated call does not touch ``users``.
+
+Revocation is by version: ``token_versions`` holds each user's current
+version, and a token whose ``ver`` differs is rejected. The version is
+bumped by an ``after_flush`` hook (``install_token_version_hook``) whenever
+a change could make the claims wrong - username, full name, password, role,
+site assignments, the user's deletion, or a change to their role's name or
+permissions. Versions are read through a per-process TTL cache
+(``version_cache``), so a revocation reaches other workers within
+``TOKEN_VERSION_TTL`` seconds and costs one primary-key lookup per user
+per TTL. This process's cache entries are dropped once the bump commits.
+"""
+
+import time
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import User, Role, Site, TokenVersion
+
+# Seconds a cached token version is trusted
+TOKEN_VERSION_TTL = 30
+# Cached users per process before the cache is cleared
+TOKEN_VERSION_CACHE_SIZE = 10000
+
+# User attributes the claims are derived from
+CLAIM_USER_FIELDS = ('_username', 'full_name', 'password_hash', 'role_id', 'role', 'sites')
+CLAIM_ROLE_FIELDS = ('name', 'permissions')
+
+
+class TokenUser:
+    """The API caller, as described by its token's claims."""
+
+    is_authenticated = True
+
+    def __init__(self, claims):
+        self.id = claims['user_id']
+        self.display_name = claims.get('name')
+        self.is_admin = bool(claims.get('admin'))
+        self.site_ids = list(claims.get('sites') or [])
+
+    @classmethod
+    def from_user(cls, user, version=0):
+        return cls(user_claims(user, version))
+
+    def __repr__(self):
+        return f'<TokenUser {self.id}>'
+
+
+def user_claims(user, version):
+    """Claims describing ``user`` at token ``version``."""
+    return {
+        'user_id': user.id,
+        'ver': version,
+        'name': user.full_name or user.username,
+        'admin': bool(user.is_admin),
+        'sites': sorted(site.id for site in user.sites),
+    }
+
+
+class TokenVersionCache:
+    """Per-process TTL cache of users' token versions."""
+
+    def __init__(self, ttl=TOKEN_VERSION_TTL, max_entries=TOKEN_VERSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, session, user_id):
+        """Current token version of ``user_id`` (0 if never bumped)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            generation = self._generation
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        version = session.execute(
+            select(TokenVersion.version).where(TokenVersion.user_id == user_id)
+        ).scalar() or 0
+        with self._lock:
+            # Not cached if invalidated while reading: the read may predate the bump
+            if generation == self._generation:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[user_id] = (version, now + self.ttl)
+        return version
+
+    def invalidate(self, user_ids=None):
+        with self._lock:
+            self._generation += 1
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+
+version_cache = TokenVersionCache()
+
+
+def _upsert(conn):
+    """INSERT ... ON CONFLICT (user_id) DO UPDATE bumping the version, where supported."""
+    table = TokenVersion.__table__
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(table)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+    else:
+        return None
+    return stmt.on_conflict_do_update(index_elements=['user_id'], set_={
+        'version': table.c.version + 1,
+        'updated_at': stmt.excluded.updated_at,
+    })
+
+
+def bump_token_versions(conn, user_ids):
+    """Revoke the issued tokens of ``user_ids`` by moving them to a new version.
+
+    Cached versions are not dropped here; the session hook does that once
+    the bump commits (or call ``version_cache.invalidate`` after committing).
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return user_ids
+    table = TokenVersion.__table__
+    now = datetime.utcnow()
+    params = [{'user_id': user_id, 'version': 1, 'updated_at': now} for user_id in sorted(user_ids)]
+    stmt = _upsert(conn)
+    if stmt is not None:
+        conn.execute(stmt, params)
+        return user_ids
+    existing = set(conn.execute(select(table.c.user_id).where(table.c.user_id.in_(user_ids))).scalars())
+    if existing:
+        conn.execute(table.update().where(table.c.user_id.in_(existing))
+                     .values(version=table.c.version + 1, updated_at=now))
+    if user_ids - existing:
+        conn.execute(table.insert(), [row for row in params if row['user_id'] not in existing])
+    return user_ids
+
+
+def _changed(obj, names):
+    attrs = inspect(obj).attrs
+    return any(attrs[name].history.has_changes() for name in names)
+
+
+def _affected_users(session):
+    """(user ids, role ids) whose tokens the flushed changes invalidate."""
+    user_ids, role_ids = set(), set()
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, CLAIM_USER_FIELDS):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Role) and _changed(obj, CLAIM_ROLE_FIELDS):
+            role_ids.add(obj.id)
+        elif isinstance(obj, Site):
+            history = inspect(obj).attrs.users.history
+            user_ids.update(user.id for user in list(history.added or ()) + list(history.deleted or ()))
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Role):
+            role_ids.add(obj.id)
+    return user_ids, role_ids
+
+
+def _after_flush(session, flush_context):
+    user_ids, role_ids = _affected_users(session)
+    if role_ids:
+        user_ids.update(session.connection().execute(
+            select(User.id).where(User.role_id.in_(role_ids))).scalars())
+    bumped = bump_token_versions(session.connection(), user_ids)
+    if bumped:
+        session.info.setdefault('token_versions_bumped', set()).update(bumped)
+
+
+def _after_commit(session):
+    # Only now can a fresh read see the new versions
+    bumped = session.info.pop('token_versions_bumped', None)
+    if bumped:
+        version_cache.invalidate(bumped)
+
+
+def _after_rollback(session):
+    session.info.pop('token_versions_bumped', None)
+
+
+def install_token_version_hook(session):
+    """Bump token versions for changes flushed through ``session`` that invalidate claims."""
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
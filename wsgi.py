@@ -27,17 +27,11 @@ except Exception as e:
 logger.info(f"FLASK_APP: {os.environ.get('FLASK_APP', 'Not set')}")
 logger.info(f"DATA_DIR: {os.environ.get('DATA_DIR', '/var/data')}")
 
-from auto_migrate import run_auto_migration
-run_auto_migration()
-
-# Import the Flask app from render_app.py (which imports from app.py)
+# Import the Flask app from render_app.py (which imports from app.py).
+# Schema migrations are no longer run here: app.py checks the schema_version
+# marker on import and `flask db-prepare` performs the one-shot migrations.
 from render_app import app
 
-# Ensure all tables are created before serving requests
-from models import db, AuditTask, AuditTaskCompletion, User, Role, Site, Machine, Part, MaintenanceRecord
-with app.app_context():
-    db.create_all()
-
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)